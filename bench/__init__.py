@@ -0,0 +1,13 @@
+"""
+Benchmarks for the API. The app never imports this package, it imports the app: run it
+from the repository root against whatever database DATABASE_URL points to, so seed it first.
+$ python -m bench --help
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+# The app and its api package live in src/, as for the flask command
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
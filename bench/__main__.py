@@ -0,0 +1,180 @@
+"""
+Performance benchmarks, run against the database in DATABASE_URL (see docs/PERFORMANCE.md):
+$ python -m bench indexes --output bench.json
+$ python -m bench search --output search.json
+$ python -m bench rankings --output rankings.json
+$ python -m bench http --duration 30 --concurrency 16 --output http.json
+$ python -m bench reactions --reactions 2000 --batch-size 100 --output reactions.json
+$ python -m bench contention --threads 16 --requests 50
+$ python -m bench hot-post --duration 10 --concurrency 16 --output hot_post.json
+$ python -m bench hashing --output hashing.json
+$ python -m bench servers --concurrency 64 --db-latency-ms 5 --output servers.json
+$ python -m bench json --posts 1000 --output json.json
+$ python -m bench startup --runs 5 --output startup.json
+$ python -m bench auth --requests 5000 --db-latency-ms 1 --output auth.json
+$ python -m bench availability --checks 20000 --output availability.json
+"""
+import click
+from flask.cli import load_dotenv
+
+# .env, as the flask command reads it: the app takes its settings from the environment on import
+load_dotenv()
+from app import app
+from bench.benchmarks import (
+    run_index_benchmark, run_search_benchmark, run_rankings_benchmark, run_http_benchmark, DEFAULT_MIX,
+    run_reactions_benchmark, run_contention_benchmark, run_hot_post_benchmark, run_hashing_benchmark,
+    DEFAULT_HASH_METHODS, run_servers_benchmark, READ_MIX, run_json_benchmark, run_startup_benchmark,
+    run_auth_benchmark, run_availability_benchmark,
+)
+
+
+@click.group()
+@click.pass_context
+def cli(context):
+    context.with_resource(app.app_context())
+
+
+@cli.command("indexes")
+@click.option("--repeat", default=20, help="Timed runs per query")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_indexes(repeat, output):
+    run_index_benchmark(repeat=repeat, output=output)
+
+
+@cli.command("search")
+@click.option("--repeat", default=20, help="Timed runs per query")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_search(repeat, output):
+    run_search_benchmark(repeat=repeat, output=output)
+
+
+@cli.command("rankings")
+@click.option("--repeat", default=10, help="Timed runs per query")
+@click.option("--changed", default=1000, help="Posts liked before timing the ranking job")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_rankings(repeat, changed, output):
+    run_rankings_benchmark(repeat=repeat, changed=changed, output=output)
+
+
+@cli.command("http")
+@click.option("--duration", default=10.0, help="Seconds to run")
+@click.option("--concurrency", default=8, help="Concurrent client threads")
+@click.option("--mix", default=None, help="Weighted scenarios, e.g. feed:40,post:20,comments:20,login:5,like:10,comment:5")
+@click.option("--url", default=None, help="Benchmark an already running server instead of an in-process one")
+@click.option("--seed", default=0, help="Random seed for the clients")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_http(duration, concurrency, mix, url, seed, output):
+    run_http_benchmark(
+        app, url=url, duration=duration, concurrency=concurrency,
+        mix=mix or DEFAULT_MIX, seed=seed, output=output
+    )
+
+
+@cli.command("reactions")
+@click.option("--reactions", default=2000, help="Reactions to send through each path")
+@click.option("--batch-size", default=100, help="Reactions per batch request")
+@click.option("--concurrency", default=4, help="Concurrent client threads")
+@click.option("--seed", default=0, help="Random seed for the reactions")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_reactions(reactions, batch_size, concurrency, seed, output):
+    run_reactions_benchmark(
+        app, reactions=reactions, batch_size=batch_size,
+        concurrency=concurrency, seed=seed, output=output
+    )
+
+
+@cli.command("contention")
+@click.option("--threads", default=16, help="Threads toggling likes at the same time")
+@click.option("--requests", default=50, help="Toggles per thread")
+@click.option("--users", default=4, help="Distinct users, fewer means more same-user races")
+@click.option("--post-id", default=None, type=int, help="Post to hammer, the newest one by default")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_contention(threads, requests, users, post_id, output):
+    results = run_contention_benchmark(
+        app, threads=threads, requests=requests, users=users,
+        post_id=post_id, output=output
+    )
+    if not results["consistent"] or results["summary"]["errors"]:
+        raise SystemExit(1)
+
+
+@cli.command("hot-post")
+@click.option("--duration", default=10.0, help="Seconds to run each mode")
+@click.option("--concurrency", default=16, help="Concurrent client threads")
+@click.option("--users", default=1000, help="Distinct users toggling likes")
+@click.option("--post-id", default=None, type=int, help="Post to hammer, the newest one by default")
+@click.option("--db-latency-ms", default=0.0, help="Delay added to every SQL statement, as a networked database would")
+@click.option("--seed", default=0, help="Random seed for the clients")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_hot_post(duration, concurrency, users, post_id, db_latency_ms, seed, output):
+    results = run_hot_post_benchmark(
+        app, duration=duration, concurrency=concurrency, users=users,
+        post_id=post_id, db_latency_ms=db_latency_ms, seed=seed, output=output
+    )
+    if not all(summary["consistent"] for summary in results["modes"].values()):
+        raise SystemExit(1)
+
+
+@cli.command("hashing")
+@click.option("--methods", default=None, help="Comma separated PASSWORD_HASH_METHOD values to compare")
+@click.option("--duration", default=3.0, help="Seconds to spend on each method")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_hashing(methods, duration, output):
+    run_hashing_benchmark(methods=methods or DEFAULT_HASH_METHODS, duration=duration, output=output)
+
+
+@cli.command("servers")
+@click.option("--duration", default=10.0, help="Seconds to run against each server")
+@click.option("--concurrency", default=64, help="Concurrent client threads")
+@click.option("--threads", default=4, help="Threads of the gunicorn worker, and of the ASGI worker's pool")
+@click.option("--mix", default=None, help="Weighted scenarios, the read routes by default")
+@click.option("--db-latency-ms", default=5.0, help="Delay added to every SQL statement, as a networked database would")
+@click.option("--seed", default=0, help="Random seed for the clients")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_servers(duration, concurrency, threads, mix, db_latency_ms, seed, output):
+    run_servers_benchmark(
+        app, duration=duration, concurrency=concurrency, threads=threads,
+        mix=mix or READ_MIX, db_latency_ms=db_latency_ms, seed=seed, output=output
+    )
+
+
+@cli.command("json")
+@click.option("--posts", default=1000, help="Feed posts to encode")
+@click.option("--repeat", default=20, help="Timed runs per step")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_json(posts, repeat, output):
+    run_json_benchmark(app, posts=posts, repeat=repeat, output=output)
+
+
+@cli.command("startup")
+@click.option("--runs", default=5, help="Fresh interpreters booted per process role")
+@click.option("--roles", default="web,all", help="Comma separated APP_ROLE values to compare")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_startup(runs, roles, output):
+    run_startup_benchmark(runs=runs, roles=roles.split(","), output=output)
+
+
+@cli.command("auth")
+@click.option("--requests", default=5000, help="Requests authenticated per mode")
+@click.option("--users", default=100, help="Distinct users sending them")
+@click.option("--db-latency-ms", default=0.0, help="Delay added to every SQL statement, as a networked database would")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_auth(requests, users, db_latency_ms, output):
+    run_auth_benchmark(
+        app, requests=requests, users=users, db_latency_ms=db_latency_ms, output=output
+    )
+
+
+@cli.command("availability")
+@click.option("--checks", default=20000, help="Availability checks timed per mode")
+@click.option("--db-latency-ms", default=0.0, help="Delay added to every SQL statement, as a networked database would")
+@click.option("--seed", default=0, help="Random seed of the typed names")
+@click.option("--output", default=None, help="Save the results as JSON to this file")
+def bench_availability(checks, db_latency_ms, seed, output):
+    run_availability_benchmark(
+        app, checks=checks, db_latency_ms=db_latency_ms, seed=seed, output=output
+    )
+
+
+if __name__ == "__main__":
+    cli(prog_name="python -m bench")
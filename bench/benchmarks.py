@@ -0,0 +1,1144 @@
+"""
+The benchmarks behind "python -m bench" (see bench/__main__.py). Results are printed and
+can be saved as JSON to compare runs across commits.
+"""
+import asyncio
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from sqlalchemy import event
+from sqlalchemy.util import await_only
+from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.serving import make_server, WSGIRequestHandler
+from flask import request
+from flask_jwt_extended import create_access_token, verify_jwt_in_request
+from api.models import db, User, BlogPost, PostLike, Comment, CommentLike, COMMENT_WEIGHT, normalize_identifier
+from api.rankings import rank_posts
+from api.instrumentation import instrumentation
+from api.security import password_hasher, parse_method
+from api.search import search
+from api.serialization import IsoJSONProvider, OrjsonProvider, orjson
+from api.compression import compress, brotli
+from api.write_behind import reaction_buffer, MemoryBuffer
+from api.auth import authentication, current_user_id, UserCache
+from api.availability import availability_filter
+from bench import ROOT, SRC
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(durations_ms):
+    return {
+        "runs": len(durations_ms),
+        "median_ms": round(statistics.median(durations_ms), 3),
+        "p95_ms": round(percentile(durations_ms, 95), 3),
+    }
+
+def save_results(results, output):
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {output}")
+
+
+# ----------------------------- query plans -----------------------------
+
+def capture_statements(run):
+    """Run `run()` and return every (statement, parameters) it sent to the database."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        run()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    return statements
+
+def explain(statement, parameters):
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    elif dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+    # SQLite returns (id, parent, notused, detail), Postgres a single text column
+    return [row[-1] for row in rows]
+
+def index_queries():
+    """The lookups the indexes from the "add foreign key and listing indexes" migration serve."""
+    hot_post_id = db.session.query(BlogPost.id).order_by(BlogPost.comments_count.desc()).limit(1).scalar()
+    middle_post = BlogPost.query.order_by(BlogPost.created_at.desc(), BlogPost.id.desc()).offset(
+        BlogPost.query.count() // 2
+    ).first()
+    like = PostLike.query.filter_by(post_id=hot_post_id).first()
+    comment_id = db.session.query(Comment.id).order_by(Comment.likes_count.desc()).limit(1).scalar()
+    author_id = db.session.query(User.id).order_by(User.id).limit(1).scalar()
+
+    return {
+        "feed_first_page": lambda: BlogPost.with_author(BlogPost.query).order_by(
+            BlogPost.created_at.desc(), BlogPost.id.desc()
+        ).limit(21).all(),
+        "feed_deep_page": lambda: BlogPost.with_author(BlogPost.query).filter(
+            db.tuple_(BlogPost.created_at, BlogPost.id) < (middle_post.created_at, middle_post.id)
+        ).order_by(BlogPost.created_at.desc(), BlogPost.id.desc()).limit(21).all(),
+        "comments_of_post": lambda: Comment.with_author(Comment.query).filter_by(
+            post_id=hot_post_id
+        ).order_by(Comment.created_at, Comment.id).all(),
+        "like_lookup": lambda: PostLike.query.filter_by(
+            user_id=like.user_id if like else 0, post_id=hot_post_id
+        ).first(),
+        "likes_of_post": lambda: PostLike.query.filter_by(post_id=hot_post_id).all(),
+        "likes_of_comment": lambda: CommentLike.query.filter_by(comment_id=comment_id).all(),
+        "posts_of_author": lambda: BlogPost.query.filter_by(author_id=author_id).all(),
+    }
+
+def run_index_benchmark(repeat=20, output=None):
+    results = {"dialect": db.engine.dialect.name, "rows": {}, "queries": {}}
+    for model in (User, BlogPost, Comment, PostLike, CommentLike):
+        results["rows"][model.__tablename__] = model.query.count()
+    print("Dataset:", ", ".join(f"{table}={count}" for table, count in results["rows"].items()))
+    if not results["rows"]["blog_posts"]:
+        print("The database has no blog posts, seed it before benchmarking.")
+        return results
+
+    for name, run in index_queries().items():
+        statement, parameters = capture_statements(run)[-1]
+        durations = []
+        for _ in range(repeat):
+            db.session.expunge_all()
+            start = time.perf_counter()
+            run()
+            durations.append((time.perf_counter() - start) * 1000)
+
+        plan = explain(statement, parameters)
+        results["queries"][name] = {**summarize(durations), "plan": plan}
+        print(f"\n{name}: median {results['queries'][name]['median_ms']} ms, p95 {results['queries'][name]['p95_ms']} ms")
+        for line in plan:
+            print("    " + line)
+
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- ranked feeds -----------------------------
+
+def ranking_queries():
+    """A page of each feed, from the stored scores and computed per query as it would be without them."""
+    def page(query):
+        return BlogPost.with_author(query).limit(21).all()
+    middle = BlogPost.query.order_by(BlogPost.hot_score.desc(), BlogPost.id.desc()).offset(
+        BlogPost.query.count() // 2
+    ).first()
+    counters_score = BlogPost.likes_count - BlogPost.dislikes_count + COMMENT_WEIGHT * BlogPost.comments_count
+    likes_score = (
+        db.select(db.func.coalesce(db.func.sum(db.case((PostLike.is_like.is_(True), 1), else_=-1)), 0))
+        .where(PostLike.post_id == BlogPost.id)
+        .scalar_subquery()
+    )
+    return {
+        "new_first_page": lambda: page(BlogPost.query.order_by(BlogPost.created_at.desc(), BlogPost.id.desc())),
+        "hot_first_page": lambda: page(BlogPost.query.order_by(BlogPost.hot_score.desc(), BlogPost.id.desc())),
+        "hot_deep_page": lambda: page(BlogPost.query.filter(
+            db.tuple_(BlogPost.hot_score, BlogPost.id) < (middle.hot_score, middle.id)
+        ).order_by(BlogPost.hot_score.desc(), BlogPost.id.desc())),
+        "top_first_page": lambda: page(BlogPost.query.order_by(BlogPost.top_score.desc(), BlogPost.id.desc())),
+        # Without the stored scores: sorting every post by its counters...
+        "top_from_counters": lambda: page(BlogPost.query.order_by(counters_score.desc(), BlogPost.id.desc())),
+        # ...or, without the counters either, by its likes
+        "top_from_likes": lambda: page(BlogPost.query.order_by(likes_score.desc(), BlogPost.id.desc())),
+    }
+
+def run_rankings_benchmark(repeat=10, changed=1000, output=None):
+    """
+    Time a page of the new, hot and top feeds read through their indexes against ranking the
+    posts per query, then the ranking job after `changed` posts got a like.
+    """
+    posts = BlogPost.query.count()
+    if not posts:
+        raise ValueError("The database needs posts, run 'flask seed' first")
+    rank_posts()
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "dialect": db.engine.dialect.name,
+        "config": {"posts": posts, "repeat": repeat, "changed": changed},
+        "queries": {},
+    }
+    print(f"{posts} posts")
+    for name, run in ranking_queries().items():
+        statement, parameters = capture_statements(run)[-1]
+        durations = []
+        for _ in range(repeat):
+            db.session.expunge_all()
+            start = time.perf_counter()
+            run()
+            durations.append((time.perf_counter() - start) * 1000)
+        plan = explain(statement, parameters)
+        results["queries"][name] = {**summarize(durations), "plan": plan}
+        print(f"\n{name}: median {results['queries'][name]['median_ms']} ms, p95 {results['queries'][name]['p95_ms']} ms")
+        for line in plan:
+            print("    " + line)
+
+    # The job after a burst of activity: `changed` posts liked, then the likes taken back
+    ids = [row.id for row in db.session.query(BlogPost.id).order_by(db.func.random()).limit(changed)]
+    runs = []
+    for delta in (1, -1):
+        db.session.query(BlogPost).filter(BlogPost.id.in_(ids)).update(
+            {BlogPost.likes_count: BlogPost.likes_count + delta}, synchronize_session=False
+        )
+        db.session.commit()
+        start = time.perf_counter()
+        counts = rank_posts()
+        runs.append({**counts, "ms": round((time.perf_counter() - start) * 1000, 3)})
+    results["ranking_job"] = runs
+    print(f"\nrank-posts after {len(ids)} posts changed: " + ", ".join(
+        f"{run['scanned']} scanned, {run['rescored']} rescored in {run['ms']} ms" for run in runs
+    ))
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- HTTP load -----------------------------
+
+DEFAULT_MIX = "feed:40,post:20,comments:20,login:5,like:10,comment:5"
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition(":")
+        if name.strip() not in HTTP_SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}', choose from {', '.join(HTTP_SCENARIOS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+def load_targets(max_posts=1000, max_users=100):
+    """Ids and credentials the scenarios pick from, read once before the run."""
+    post_ids = [row.id for row in db.session.query(BlogPost.id).order_by(BlogPost.id.desc()).limit(max_posts)]
+    comment_ids = [row.id for row in db.session.query(Comment.id).filter(Comment.post_id.in_(post_ids[:100]))]
+    # Seeded users all share the password "password" (see api/seed.py)
+    users = [
+        (row.id, row.username)
+        for row in db.session.query(User.id, User.username).filter(User.username.like("seed%")).limit(max_users)
+    ]
+    if not post_ids or not users:
+        raise ValueError("The database needs seeded users and posts, run 'flask seed' first")
+    return {
+        "post_ids": post_ids,
+        "comment_ids": comment_ids or [0],
+        "users": users,
+        "headers": auth_headers(user_id for user_id, _ in users),
+    }
+
+def auth_headers(user_ids, expires_delta=timedelta(hours=1)):
+    """An Authorization header for each user, with a token made before the run."""
+    return {
+        user_id: {"Authorization": f"Bearer {create_access_token(identity=str(user_id), expires_delta=expires_delta)}"}
+        for user_id in user_ids
+    }
+
+def scenario_feed(rng, targets):
+    return "GET", "/api/blog_posts?fields=summary", None, {}
+
+def scenario_post(rng, targets):
+    return "GET", f"/api/blog_posts/{rng.choice(targets['post_ids'])}", None, {}
+
+def scenario_comments(rng, targets):
+    return "GET", f"/api/blog_posts/{rng.choice(targets['post_ids'])}/comments", None, {}
+
+def scenario_detail(rng, targets):
+    # The post page as a logged in user sees it, in a single request
+    user_id, username = rng.choice(targets["users"])
+    return "GET", f"/api/blog_posts/{rng.choice(targets['post_ids'])}/detail", None, targets["headers"][user_id]
+
+def scenario_login(rng, targets):
+    user_id, username = rng.choice(targets["users"])
+    return "POST", "/api/login", {"loginIdentifier": username, "password": "password"}, {}
+
+def scenario_like(rng, targets):
+    user_id, username = rng.choice(targets["users"])
+    body = {"is_like": rng.random() < 0.8}
+    if rng.random() < 0.5:
+        return "POST", f"/api/comments/{rng.choice(targets['comment_ids'])}/like", body, targets["headers"][user_id]
+    return "POST", f"/api/blog_posts/{rng.choice(targets['post_ids'])}/like", body, targets["headers"][user_id]
+
+def scenario_comment(rng, targets):
+    user_id, username = rng.choice(targets["users"])
+    post_id = rng.choice(targets["post_ids"])
+    return "POST", f"/api/blog_posts/{post_id}/comments", {"content": "Benchmark comment"}, targets["headers"][user_id]
+
+
+HTTP_SCENARIOS = {
+    "feed": scenario_feed,
+    "post": scenario_post,
+    "comments": scenario_comments,
+    "detail": scenario_detail,
+    "login": scenario_login,
+    "like": scenario_like,
+    "comment": scenario_comment,
+}
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # One access log line per request would dominate the benchmark's output and time
+    def log_request(self, *args, **kwargs):
+        pass
+
+def send(host, port, method, path, body, headers):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    try:
+        payload = json.dumps(body) if body is not None else None
+        headers = {**headers, "Content-Type": "application/json"} if payload else headers
+        start = time.perf_counter()
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        elapsed = (time.perf_counter() - start) * 1000
+        return response.status, elapsed, response.getheader("X-Query-Count")
+    finally:
+        conn.close()
+
+def run_http_benchmark(app, url=None, duration=10.0, concurrency=8, mix=DEFAULT_MIX, seed=0, output=None):
+    """
+    Drive the API with `concurrency` client threads for `duration` seconds, each picking
+    a scenario from `mix` by weight. Without `url` the app is served in-process by
+    werkzeug's threaded server on a free local port.
+    """
+    weights = parse_mix(mix)
+    targets = load_targets()
+    db.session.remove()
+
+    server = None
+    if url:
+        parsed = urlparse(url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        # Per-request query counts come from the X-Query-Count header it adds;
+        # its per-request log lines would drown the report, keep only the warnings
+        instrumentation.enable(app)
+        logging.getLogger("api.sql").setLevel(logging.WARNING)
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler)
+        host, port = "127.0.0.1", server.server_port
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Benchmarking http://{host}:{port} with {concurrency} clients for {duration}s, mix {mix}")
+
+    samples = {name: [] for name in weights}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        names, scenario_weights = list(weights), list(weights.values())
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=scenario_weights)[0]
+            method, path, body, headers = HTTP_SCENARIOS[name](rng, targets)
+            try:
+                status, elapsed, queries = send(host, port, method, path, body, headers)
+            except OSError:
+                status, elapsed, queries = None, None, None
+            with lock:
+                samples[name].append((status, elapsed, queries))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if server:
+        server.shutdown()
+
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "dialect": db.engine.dialect.name,
+        "config": {"duration": duration, "concurrency": concurrency, "mix": mix, "seed": seed, "url": url},
+        "scenarios": {},
+    }
+    everything = []
+    for name, rows in samples.items():
+        results["scenarios"][name] = http_summary(rows, elapsed)
+        everything.extend(rows)
+    results["total"] = http_summary(everything, elapsed)
+
+    print(f"\n{'scenario':<10} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    for name, summary in list(results["scenarios"].items()) + [("total", results["total"])]:
+        print(
+            f"{name:<10} {summary['requests']:>8} {summary['throughput']:>8} {summary['p50_ms']:>8} "
+            f"{summary['p95_ms']:>8} {summary['p99_ms']:>8} {summary['queries_per_request']!s:>8} {summary['errors']:>7}"
+        )
+    save_results(results, output)
+    return results
+
+def http_summary(rows, elapsed):
+    latencies = [row[1] for row in rows if row[1] is not None]
+    queries = [int(row[2]) for row in rows if row[2] is not None]
+    errors = sum(1 for row in rows if row[0] is None or row[0] >= 500)
+    return {
+        "requests": len(rows),
+        "errors": errors,
+        "statuses": dict(Counter(str(row[0]) for row in rows)),
+        "throughput": round(len(rows) / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+        "queries_per_request": round(statistics.mean(queries), 2) if queries else None,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------- full-text search -----------------------------
+
+SEARCH_TERMS = ("orchid", "orchid fern", "repot monstera humidity", "nothingmatches")
+
+def run_search_benchmark(repeat=20, output=None):
+    """
+    Time GET /api/search's query for a few terms, rare and common, against the
+    ILIKE '%term%' scan the admin used to run for the same posts.
+    """
+    results = {"dialect": db.engine.dialect.name, "rows": {}, "queries": {}}
+    for model in (BlogPost, Comment):
+        results["rows"][model.__tablename__] = model.query.count()
+    print("Dataset:", ", ".join(f"{table}={count}" for table, count in results["rows"].items()))
+
+    def like_scan(term):
+        pattern = f"%{term}%"
+        return BlogPost.query.filter(db.or_(BlogPost.title.ilike(pattern), BlogPost.content.ilike(pattern))).limit(21).all()
+
+    print(f"\n{'query':<40} {'median ms':>10} {'p95 ms':>8}")
+    for term in SEARCH_TERMS:
+        for name, run in (
+            (f"posts: {term}", lambda: search("posts", term, 21)),
+            (f"comments: {term}", lambda: search("comments", term, 21)),
+            (f"posts ILIKE: {term}", lambda: like_scan(term)),
+        ):
+            durations = []
+            for _ in range(repeat):
+                db.session.expunge_all()
+                start = time.perf_counter()
+                run()
+                durations.append((time.perf_counter() - start) * 1000)
+            results["queries"][name] = summarize(durations)
+            print(f"{name:<40} {results['queries'][name]['median_ms']:>10} {results['queries'][name]['p95_ms']:>8}")
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- batched reactions -----------------------------
+
+def reaction_batches(rng, targets, reactions, batch_size):
+    """Random likes/dislikes, grouped in batches of `batch_size` reactions from one user."""
+    batches = []
+    for _ in range(max(1, reactions // batch_size)):
+        user_id, username = rng.choice(targets["users"])
+        items = []
+        for _ in range(batch_size):
+            if rng.random() < 0.5:
+                items.append({"type": "comment", "id": rng.choice(targets["comment_ids"]), "is_like": rng.random() < 0.8})
+            else:
+                items.append({"type": "post", "id": rng.choice(targets["post_ids"]), "is_like": rng.random() < 0.8})
+        batches.append((user_id, items))
+    return batches
+
+def reaction_requests(mode, batches, tokens):
+    requests = []
+    for user_id, items in batches:
+        headers = tokens[user_id]
+        if mode == "batch":
+            requests.append(("POST", "/api/reactions/batch", {"reactions": items}, headers))
+            continue
+        for item in items:
+            path = f"/api/blog_posts/{item['id']}/like" if item["type"] == "post" else f"/api/comments/{item['id']}/like"
+            requests.append(("POST", path, {"is_like": item["is_like"]}, headers))
+    return requests
+
+def run_reactions_benchmark(app, reactions=2000, batch_size=100, concurrency=4, seed=0, output=None):
+    """
+    Send the same number of random reactions through the single like routes (one request
+    and transaction each) and through POST /api/reactions/batch, served in-process.
+    """
+    targets = load_targets()
+    db.session.remove()
+    instrumentation.enable(app)
+    logging.getLogger("api.sql").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Sending {reactions} reactions per mode with {concurrency} clients, batches of {batch_size}")
+
+    rng = random.Random(seed)
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "dialect": db.engine.dialect.name,
+        "config": {"reactions": reactions, "batch_size": batch_size, "concurrency": concurrency, "seed": seed},
+        "modes": {},
+    }
+    for mode in ("single", "batch"):
+        batches = reaction_batches(rng, targets, reactions, batch_size)
+        requests = reaction_requests(mode, batches, targets["headers"])
+        rows = []
+        lock = threading.Lock()
+
+        def client(index):
+            for request in requests[index::concurrency]:
+                try:
+                    row = send("127.0.0.1", server.server_port, *request)
+                except OSError:
+                    row = (None, None, None)
+                with lock:
+                    rows.append(row)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        sent = sum(len(items) for _, items in batches)
+        statements = sum(int(row[2]) for row in rows if row[2] is not None)
+        results["modes"][mode] = {
+            **http_summary(rows, elapsed),
+            "reactions": sent,
+            "reactions_per_second": round(sent / elapsed, 1),
+            "statements_per_reaction": round(statements / sent, 2),
+        }
+    server.shutdown()
+
+    print(f"\n{'mode':<8} {'requests':>8} {'reactions/s':>12} {'p50 ms':>8} {'p95 ms':>8} {'statements/reaction':>20} {'errors':>7}")
+    for mode, summary in results["modes"].items():
+        print(
+            f"{mode:<8} {summary['requests']:>8} {summary['reactions_per_second']:>12} {summary['p50_ms']:>8} "
+            f"{summary['p95_ms']:>8} {summary['statements_per_reaction']:>20} {summary['errors']:>7}"
+        )
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- like contention -----------------------------
+
+def run_contention_benchmark(app, threads=16, requests=50, users=4, post_id=None, output=None):
+    """
+    Hammer one post's like route from `threads` threads at once, with only `users` distinct
+    users so the same user's toggles race each other. Afterwards the post's counters must
+    still match its like rows and no request may have failed.
+    """
+    post_id = post_id or db.session.query(db.func.max(BlogPost.id)).scalar()
+    user_ids = [row.id for row in db.session.query(User.id).order_by(User.id).limit(users)]
+    if not post_id or not user_ids:
+        raise ValueError("The database needs users and posts, run 'flask seed' first")
+    tokens = auth_headers(user_ids)
+    db.session.remove()
+    instrumentation.enable(app)
+    # Statements waiting on each other's locks are expected here, do not log them as slow
+    logging.getLogger("api.sql").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"{threads} threads x {requests} toggles on post {post_id} from {len(user_ids)} users")
+
+    rows = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def client(index):
+        rng = random.Random(index)
+        barrier.wait()
+        for _ in range(requests):
+            headers = tokens[rng.choice(user_ids)]
+            try:
+                row = send("127.0.0.1", server.server_port, "POST", f"/api/blog_posts/{post_id}/like",
+                           {"is_like": rng.random() < 0.5}, headers)
+            except OSError:
+                row = (None, None, None)
+            with lock:
+                rows.append(row)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=client, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    db.session.remove()
+    post = db.session.get(BlogPost, post_id)
+    actual = dict(
+        db.session.query(PostLike.is_like, db.func.count()).filter(PostLike.post_id == post_id).group_by(PostLike.is_like).all()
+    )
+    counters = {
+        "likes_count": {"stored": post.likes_count, "actual": actual.get(True, 0)},
+        "dislikes_count": {"stored": post.dislikes_count, "actual": actual.get(False, 0)},
+    }
+    results = {
+        "commit": git_commit(),
+        "dialect": db.engine.dialect.name,
+        "config": {"threads": threads, "requests": requests, "users": len(user_ids), "post_id": post_id},
+        "summary": http_summary(rows, elapsed),
+        "counters": counters,
+        "consistent": all(counter["stored"] == counter["actual"] for counter in counters.values()),
+    }
+    summary = results["summary"]
+    print(f"{summary['requests']} requests, {summary['throughput']} req/s, p95 {summary['p95_ms']} ms, statuses {summary['statuses']}")
+    for name, counter in counters.items():
+        print(f"{name}: stored {counter['stored']}, actual {counter['actual']}")
+    print("OK" if results["consistent"] and not summary["errors"] else "FAILED: errors or counter drift")
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- hot post -----------------------------
+
+def post_counters(post_id):
+    """Stored and actual like/dislike counts of a post."""
+    db.session.remove()
+    post = db.session.get(BlogPost, post_id)
+    actual = dict(
+        db.session.query(PostLike.is_like, db.func.count()).filter(PostLike.post_id == post_id).group_by(PostLike.is_like).all()
+    )
+    return {
+        "likes_count": {"stored": post.likes_count, "actual": actual.get(True, 0)},
+        "dislikes_count": {"stored": post.dislikes_count, "actual": actual.get(False, 0)},
+    }
+
+def run_hot_post_benchmark(app, duration=10.0, concurrency=16, users=1000, post_id=None, db_latency_ms=0.0, seed=0, output=None):
+    """
+    Toggle likes on one post from `users` users, `concurrency` clients at a time for
+    `duration` seconds: first written directly by the like route, then through the
+    write-behind buffer (api/write_behind.py). Reports the reactions accepted per second,
+    and whether the counters still match the like rows once the buffer is flushed.
+    """
+    post_id = post_id or db.session.query(db.func.max(BlogPost.id)).scalar()
+    user_ids = [row.id for row in db.session.query(User.id).order_by(User.id).limit(users)]
+    if not post_id or not user_ids:
+        raise ValueError("The database needs users and posts, run 'flask seed' first")
+    if db_latency_ms:
+        add_db_latency(db.engines.values(), db_latency_ms / 1000)
+    tokens = auth_headers(user_ids)
+    db.session.remove()
+    logging.getLogger("api.sql").setLevel(logging.ERROR)
+    configured = reaction_buffer.buffer
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "dialect": db.engine.dialect.name,
+        "config": {
+            "duration": duration, "concurrency": concurrency, "users": len(user_ids), "post_id": post_id,
+            "db_latency_ms": db_latency_ms, "flush_interval": reaction_buffer.flush_interval, "seed": seed,
+        },
+        "modes": {},
+    }
+    print(f"{concurrency} clients toggling likes on post {post_id} from {len(user_ids)} users for {duration}s each")
+
+    for mode in ("direct", "write_behind"):
+        reaction_buffer.buffer = MemoryBuffer() if mode == "write_behind" else None
+        flushes, written = reaction_buffer.counts["flushes"], reaction_buffer.counts["written"]
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        rows = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def client(index):
+            rng = random.Random(seed * 1000 + index)
+            while time.perf_counter() < deadline:
+                headers = tokens[rng.choice(user_ids)]
+                try:
+                    row = send("127.0.0.1", server.server_port, "POST", f"/api/blog_posts/{post_id}/like",
+                               {"is_like": rng.random() < 0.5}, headers)
+                except OSError:
+                    row = (None, None, None)
+                with lock:
+                    rows.append(row)
+
+        started = time.perf_counter()
+        clients = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        server.shutdown()
+        # What is still buffered is written before the counters are checked
+        start = time.perf_counter()
+        reaction_buffer.flush()
+        drain_ms = round((time.perf_counter() - start) * 1000, 1)
+
+        summary = http_summary(rows, elapsed)
+        counters = post_counters(post_id)
+        summary.update({
+            "reactions_per_second": round(sum(1 for row in rows if row[0] in (200, 202)) / elapsed, 1),
+            "flushes": reaction_buffer.counts["flushes"] - flushes,
+            "rows_written": reaction_buffer.counts["written"] - written,
+            "final_flush_ms": drain_ms,
+            "counters": counters,
+            "consistent": all(counter["stored"] == counter["actual"] for counter in counters.values()),
+        })
+        results["modes"][mode] = summary
+    reaction_buffer.buffer = configured
+
+    print(f"\n{'mode':<13} {'requests':>8} {'reactions/s':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'flushes':>8} {'rows':>6} {'errors':>7} consistent")
+    for mode, summary in results["modes"].items():
+        print(
+            f"{mode:<13} {summary['requests']:>8} {summary['reactions_per_second']:>12} {summary['p50_ms']:>8} "
+            f"{summary['p95_ms']:>8} {summary['p99_ms']:>8} {summary['flushes']:>8} {summary['rows_written']:>6} "
+            f"{summary['errors']:>7} {summary['consistent']}"
+        )
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- password hashing -----------------------------
+
+DEFAULT_HASH_METHODS = "scrypt:32768:8:1,scrypt:16384:8:1,pbkdf2:sha256:600000,pbkdf2:sha256:260000"
+
+def run_hashing_benchmark(methods=DEFAULT_HASH_METHODS, duration=3.0, output=None):
+    """Time check_password_hash on a single thread, i.e. the logins per second one core can verify."""
+    results = {"commit": git_commit(), "configured": password_hasher.method, "methods": {}}
+    print(f"Verifying passwords on one thread for {duration}s per method")
+    print(f"\n{'method':<24} {'runs':>6} {'median ms':>10} {'p95 ms':>8} {'logins/s':>9}")
+    for method in methods.split(","):
+        stored = generate_password_hash("password", method=parse_method(method))
+        durations = []
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline or len(durations) < 3:
+            start = time.perf_counter()
+            check_password_hash(stored, "password")
+            durations.append((time.perf_counter() - start) * 1000)
+
+        summary = {**summarize(durations), "logins_per_second": round(1000 / statistics.mean(durations), 1)}
+        results["methods"][method] = summary
+        marker = " (configured)" if method == password_hasher.method else ""
+        print(
+            f"{method:<24} {summary['runs']:>6} {summary['median_ms']:>10} {summary['p95_ms']:>8} "
+            f"{summary['logins_per_second']:>9}{marker}"
+        )
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- WSGI vs ASGI -----------------------------
+
+READ_MIX = "feed:30,post:20,comments:20,detail:30"
+
+def add_db_latency(engines, seconds):
+    """
+    Make every statement wait `seconds` first, like a database across a network. On async
+    engines the wait hands the event loop back, as a real network round trip would.
+    """
+    def wait(conn, cursor, statement, parameters, context, executemany):
+        if conn.engine.dialect.is_async:
+            await_only(asyncio.sleep(seconds))
+        else:
+            time.sleep(seconds)
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", wait)
+
+def latency_wsgi_app():
+    # gunicorn factory used by run_servers_benchmark
+    from app import app
+    with app.app_context():
+        add_db_latency(db.engines.values(), float(os.getenv("BENCH_DB_LATENCY_MS", 0)) / 1000)
+    return app
+
+def latency_asgi_app():
+    # uvicorn factory used by run_servers_benchmark
+    from asgi import application
+    add_db_latency(
+        [*application.engines, *application.engines.values()], float(os.getenv("BENCH_DB_LATENCY_MS", 0)) / 1000
+    )
+    return application
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(mode, port, threads, db_latency_ms):
+    if mode == "wsgi":
+        command = [
+            sys.executable, "-m", "gunicorn", "bench.benchmarks:latency_wsgi_app()", "--chdir", SRC,
+            "--workers", "1", "--threads", str(threads), "--bind", f"127.0.0.1:{port}",
+        ]
+    else:
+        command = [
+            sys.executable, "-m", "uvicorn", "bench.benchmarks:latency_asgi_app", "--factory", "--app-dir", SRC,
+            "--workers", "1", "--port", str(port), "--log-level", "warning", "--no-access-log",
+        ]
+    env = {
+        **os.environ, "APP_ROLE": "web", "BENCH_DB_LATENCY_MS": str(db_latency_ms), "ASGI_THREADS": str(threads),
+        # Polled below to know when the server is up
+        "METRICS_ENABLED": "1",
+        # The servers import the factories from this package
+        "PYTHONPATH": os.pathsep.join([ROOT, SRC, os.environ.get("PYTHONPATH", "")]),
+    }
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        try:
+            if send("127.0.0.1", port, "GET", "/api/metrics", None, {})[0] == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"The {mode} server did not start, run '{' '.join(command)}' to see why")
+
+def run_servers_benchmark(app, duration=10.0, concurrency=64, threads=4, mix=READ_MIX, db_latency_ms=5.0, seed=0, output=None):
+    """
+    Serve the app with one gunicorn worker (--threads `threads`) and then with one uvicorn
+    worker (src/asgi.py), and drive each with the same HTTP load. `db_latency_ms` is added
+    to every statement so the run shows what a networked database costs each mode.
+    """
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "dialect": db.engine.dialect.name,
+        "config": {
+            "duration": duration, "concurrency": concurrency, "threads": threads, "mix": mix,
+            "db_latency_ms": db_latency_ms, "seed": seed,
+        },
+        "modes": {},
+    }
+    for mode in ("wsgi", "asgi"):
+        port = free_port()
+        process = start_server(mode, port, threads, db_latency_ms)
+        try:
+            run = run_http_benchmark(
+                app, url=f"http://127.0.0.1:{port}", duration=duration, concurrency=concurrency, mix=mix, seed=seed
+            )
+        finally:
+            process.terminate()
+            process.wait()
+        results["modes"][mode] = run["total"]
+
+    print(f"\n{'mode':<6} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, summary in results["modes"].items():
+        print(
+            f"{mode:<6} {summary['requests']:>8} {summary['throughput']:>8} {summary['p50_ms']:>8} "
+            f"{summary['p95_ms']:>8} {summary['p99_ms']:>8} {summary['errors']:>7}"
+        )
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- JSON encoding -----------------------------
+
+def run_json_benchmark(app, posts=1000, repeat=20, output=None):
+    """
+    Time turning `posts` feed posts into a response body: serialize(), encoding with the
+    standard library provider and with orjson, then gzip and brotli on the result.
+    """
+    rows = BlogPost.with_author(BlogPost.query).order_by(BlogPost.id.desc()).limit(posts).all()
+    if not rows:
+        raise ValueError("The database needs posts, run 'flask seed' first")
+    dicts = [post.serialize() for post in rows]
+
+    steps = [
+        ("serialize()", lambda: [post.serialize() for post in rows]),
+        ("json (stdlib)", lambda: IsoJSONProvider(app).dumps(dicts, separators=(",", ":"))),
+    ]
+    if orjson is not None:
+        steps.append(("orjson", lambda: OrjsonProvider(app).dumps(dicts)))
+    body = app.json.dumps(dicts).encode()
+    steps.append(("gzip", lambda: compress(body, "gzip")))
+    if brotli is not None:
+        steps.append(("brotli", lambda: compress(body, "br")))
+
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "config": {"posts": len(rows), "repeat": repeat},
+        "body_bytes": {"identity": len(body)},
+        "steps": {},
+    }
+    print(f"{len(rows)} posts, {len(body)} bytes of JSON\n")
+    print(f"{'step':<16} {'median ms':>10} {'p95 ms':>8} {'ms/1000 posts':>14} {'bytes':>9}")
+    for name, run in steps:
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = run()
+            durations.append((time.perf_counter() - start) * 1000)
+        summary = summarize(durations)
+        summary["ms_per_1000_posts"] = round(summary["median_ms"] * 1000 / len(rows), 3)
+        results["steps"][name] = summary
+        size = len(result) if name in ("gzip", "brotli") else ""
+        if size:
+            results["body_bytes"][name] = size
+        print(f"{name:<16} {summary['median_ms']:>10} {summary['p95_ms']:>8} {summary['ms_per_1000_posts']:>14} {size!s:>9}")
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- startup -----------------------------
+
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+print(json.dumps({"import_app_ms": (time.perf_counter() - start) * 1000, "steps": app.startup.steps}))
+"""
+
+def parse_importtime(stderr, module="app"):
+    """
+    Cumulative import time (ms) of each module `module` imports directly, from the
+    output of python -X importtime. Modules already imported before are not listed.
+    """
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 0 and name == module:
+            return imports
+        if depth == 0:
+            imports = {}
+        elif depth == 1 and cumulative.strip().isdigit():
+            imports[name] = int(cumulative) / 1000
+    raise ValueError(f"No import of {module} in the importtime output")
+
+def boot(role):
+    """Import the app in a new interpreter: wall time, import times and setup step times."""
+    env = {**os.environ, "APP_ROLE": role}
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT], cwd=SRC, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing the app failed:\n{process.stderr[-2000:]}")
+    run = json.loads(process.stdout.strip().splitlines()[-1])
+    run["wall_ms"] = wall_ms
+    run["imports"] = parse_importtime(process.stderr)
+    return run
+
+def run_startup_benchmark(runs=5, roles=("web", "all"), output=None):
+    """
+    Boot the app `runs` times in fresh interpreters for each APP_ROLE and report the
+    medians: process wall time, the import of app.py, each module it imports and each
+    setup step it times (api/startup.py).
+    """
+    def median(values):
+        return round(statistics.median(values), 1)
+
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "config": {"runs": runs, "roles": list(roles)},
+        "roles": {},
+    }
+    for role in roles:
+        boots = [boot(role) for _ in range(runs)]
+        imports = {name: median([run["imports"].get(name, 0) for run in boots]) for name in boots[0]["imports"]}
+        steps = {name: median([run["steps"].get(name, 0) for run in boots]) for name in boots[0]["steps"]}
+        results["roles"][role] = summary = {
+            "wall_ms": median([run["wall_ms"] for run in boots]),
+            "import_app_ms": median([run["import_app_ms"] for run in boots]),
+            "imports": dict(sorted(imports.items(), key=lambda item: -item[1])),
+            "steps": steps,
+        }
+        print(f"\nAPP_ROLE={role}: {summary['wall_ms']} ms process, {summary['import_app_ms']} ms importing app.py")
+        print(f"  {'imported by app.py':<28} {'ms':>8}")
+        for name, ms in list(summary["imports"].items())[:10]:
+            print(f"  {name:<28} {ms:>8}")
+        print(f"  {'setup step':<28} {'ms':>8}")
+        for name, ms in summary["steps"].items():
+            print(f"  {name:<28} {ms:>8}")
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- authentication -----------------------------
+
+def run_auth_benchmark(app, requests=5000, users=100, db_latency_ms=0.0, output=None):
+    """
+    Time authenticating one request, inside a request context with the headers a client
+    sends: trusting a userId header as the routes used to, and verifying a token
+    (api/auth.py) with the user loaded from the database on every request, then from the
+    user cache. `db_latency_ms` is added to every statement, as with a networked database.
+    """
+    user_ids = [row.id for row in db.session.query(User.id).order_by(User.id).limit(users)]
+    if not user_ids:
+        raise ValueError("The database needs users, run 'flask seed' first")
+    if db_latency_ms:
+        add_db_latency(db.engines.values(), db_latency_ms / 1000)
+    tokens = auth_headers(user_ids)
+
+    def header_user():
+        return request.headers.get("userId", type=int)
+
+    def token_user():
+        verify_jwt_in_request()
+        return current_user_id()
+
+    modes = {
+        "userId header": (lambda user_id: {"userId": str(user_id)}, header_user, None),
+        "token, user from db": (tokens.get, token_user, UserCache(max_entries=0)),
+        "token, cached user": (tokens.get, token_user, UserCache(max_entries=len(user_ids), ttl=3600)),
+    }
+    configured = authentication.users
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "dialect": db.engine.dialect.name,
+        "config": {
+            "requests": requests, "users": len(user_ids), "db_latency_ms": db_latency_ms,
+            "revocations": type(authentication.revocations).__name__,
+        },
+        "modes": {},
+    }
+    rng = random.Random(0)
+    order = [rng.choice(user_ids) for _ in range(requests)]
+    print(f"Authenticating {requests} requests from {len(user_ids)} users\n")
+    print(f"{'mode':<22} {'median us':>10} {'p95 us':>8} {'p99 us':>8} {'statements/request':>19}")
+    for mode, (headers_for, authenticate, users_cache) in modes.items():
+        if users_cache is not None:
+            authentication.users = users_cache
+        durations = []
+
+        def run():
+            for user_id in order:
+                with app.test_request_context(headers=headers_for(user_id)):
+                    start = time.perf_counter()
+                    authenticated = authenticate()
+                    durations.append((time.perf_counter() - start) * 1_000_000)
+                if authenticated != user_id:
+                    raise RuntimeError(f"{mode}: request of user {user_id} authenticated as {authenticated}")
+
+        statements = capture_statements(run)
+        results["modes"][mode] = summary = {
+            "median_us": round(statistics.median(durations), 1),
+            "p95_us": round(percentile(durations, 95), 1),
+            "p99_us": round(percentile(durations, 99), 1),
+            "statements_per_request": round(len(statements) / requests, 3),
+        }
+        print(
+            f"{mode:<22} {summary['median_us']:>10} {summary['p95_us']:>8} {summary['p99_us']:>8} "
+            f"{summary['statements_per_request']:>19}"
+        )
+    authentication.users = configured
+    save_results(results, output)
+    return results
+
+
+# ----------------------------- availability checks -----------------------------
+
+def availability_checks(rng, count, taken):
+    """
+    What the signup form sends while someone types: every prefix (from 3 characters) of new
+    usernames and emails, and now and then a name that is taken.
+    """
+    checks = []
+    while len(checks) < count:
+        if rng.random() < 0.05:
+            checks.append(rng.choice(taken))
+            continue
+        name = f"plant_{rng.choice(('fan', 'lover', 'nerd', 'grower'))}{rng.randrange(10 ** 6)}"
+        field, value = ("email", f"{name}@example.com") if rng.random() < 0.5 else ("username", name)
+        checks.extend((field, value[:length]) for length in range(3, len(value) + 1))
+    return checks[:count]
+
+def run_availability_benchmark(app, checks=20000, db_latency_ms=0.0, seed=0, output=None):
+    """
+    Time the signup form's availability checks, in a request context: the previous lookup
+    of the users row by its raw column, the normalized index, and the Bloom filter in front
+    of it (api/availability.py). `db_latency_ms` is added to every statement.
+    """
+    taken = [
+        (field, getattr(row, field))
+        for row in db.session.query(User.email, User.username).order_by(User.id.desc()).limit(1000)
+        for field in ("email", "username")
+    ]
+    if not taken:
+        raise ValueError("The database needs users, run 'flask seed' first")
+    if db_latency_ms:
+        add_db_latency(db.engines.values(), db_latency_ms / 1000)
+    rng = random.Random(seed)
+    workload = availability_checks(rng, checks, taken)
+
+    def users_row(field, value):
+        return User.query.filter(getattr(User, field) == value).first() is None
+
+    def normalized_index(field, value):
+        return availability_filter.is_available(field, normalize_identifier(value))
+
+    configured = availability_filter.enabled
+    availability_filter.enabled = True
+    start = time.perf_counter()
+    availability_filter.rebuild()
+    build_ms = round((time.perf_counter() - start) * 1000, 1)
+    built = availability_filter.stats()
+    modes = {"users row (before)": (users_row, False), "normalized index": (normalized_index, False), "bloom filter": (normalized_index, True)}
+
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "dialect": db.engine.dialect.name,
+        "config": {"checks": len(workload), "db_latency_ms": db_latency_ms, "seed": seed},
+        "filter": {"build_ms": build_ms, "names": built["added"], "bytes": built["bytes"], "hashes": built["hashes"]},
+        "modes": {},
+    }
+    print(f"{len(workload)} checks, filter of {built['added']} names built in {build_ms} ms ({built['bytes']} bytes)\n")
+    print(f"{'mode':<20} {'checks/s':>9} {'median us':>10} {'p95 us':>8} {'statements/check':>17} {'available':>10}")
+    for mode, (check, use_filter) in modes.items():
+        availability_filter.enabled = use_filter
+        saved = availability_filter.filter
+        if not use_filter:
+            availability_filter.filter = None
+        durations, answers = [], []
+
+        def run():
+            for field, value in workload:
+                with app.test_request_context():
+                    start = time.perf_counter()
+                    answers.append(check(field, value))
+                    durations.append((time.perf_counter() - start) * 1_000_000)
+
+        statements = capture_statements(run)
+        availability_filter.filter = saved
+        results["modes"][mode] = summary = {
+            "checks_per_second": round(len(durations) / (sum(durations) / 1_000_000), 1),
+            "median_us": round(statistics.median(durations), 1),
+            "p95_us": round(percentile(durations, 95), 1),
+            "statements_per_check": round(len(statements) / len(workload), 3),
+            "available": sum(answers),
+        }
+        print(
+            f"{mode:<20} {summary['checks_per_second']:>9} {summary['median_us']:>10} {summary['p95_us']:>8} "
+            f"{summary['statements_per_check']:>17} {summary['available']:>10}"
+        )
+    availability_filter.enabled = configured
+    save_results(results, output)
+    return results
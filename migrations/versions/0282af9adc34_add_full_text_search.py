@@ -0,0 +1,79 @@
+"""add full text search
+
+Revision ID: 0282af9adc34
+Revises: 97aff68bef84
+Create Date: 2026-10-18 07:14:02.481260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0282af9adc34'
+down_revision = '97aff68bef84'
+branch_labels = None
+depends_on = None
+
+# The search index is dialect specific and has no model counterpart (see src/api/search.py);
+# migrations/env.py keeps autogenerate from dropping it.
+
+# (table, FTS5 columns, bm25 weights per column)
+SQLITE_INDEXES = (
+    ('blog_posts', ('title', 'content'), '10.0, 1.0'),
+    ('comments', ('content',), '1.0'),
+)
+
+POSTGRES_VECTORS = {
+    'blog_posts': "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+                  "setweight(to_tsvector('english', coalesce(content, '')), 'B')",
+    'comments': "to_tsvector('english', coalesce(content, ''))",
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table, vector in POSTGRES_VECTORS.items():
+            op.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED")
+            op.execute(f"CREATE INDEX ix_{table}_search_vector ON {table} USING GIN (search_vector)")
+
+    elif dialect == 'sqlite':
+        for table, columns, weights in SQLITE_INDEXES:
+            names = ', '.join(columns)
+            new_values = ', '.join(f'new.{column}' for column in columns)
+            old_values = ', '.join(f'old.{column}' for column in columns)
+            op.execute(
+                f"CREATE VIRTUAL TABLE {table}_fts USING fts5({names}, content='{table}', "
+                f"content_rowid='id', tokenize='porter unicode61')"
+            )
+            op.execute(f"INSERT INTO {table}_fts({table}_fts, rank) VALUES ('rank', 'bm25({weights})')")
+            op.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+            op.execute(
+                f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {table}_fts(rowid, {names}) VALUES (new.id, {new_values}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values}); END"
+            )
+            # Only text changes touch the index, not the counter updates every like makes
+            op.execute(
+                f"CREATE TRIGGER {table}_fts_update AFTER UPDATE OF {names} ON {table} BEGIN "
+                f"INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {table}_fts(rowid, {names}) VALUES (new.id, {new_values}); END"
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in POSTGRES_VECTORS:
+            op.execute(f"DROP INDEX ix_{table}_search_vector")
+            op.execute(f"ALTER TABLE {table} DROP COLUMN search_vector")
+
+    elif dialect == 'sqlite':
+        for table, columns, weights in SQLITE_INDEXES:
+            for trigger in ('insert', 'delete', 'update'):
+                op.execute(f"DROP TRIGGER {table}_fts_{trigger}")
+            op.execute(f"DROP TABLE {table}_fts")
@@ -0,0 +1,68 @@
+"""normalize user emails and usernames
+
+Revision ID: 9dcccad98f6a
+Revises: d54139b32883
+Create Date: 2026-10-18 07:56:19.979194
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9dcccad98f6a'
+down_revision = 'd54139b32883'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('email_normalized', sa.String(length=120), nullable=True))
+        batch_op.add_column(sa.Column('username_normalized', sa.String(length=250), nullable=True))
+
+    # Filled in Python with the models' normalize_identifier (strip + str.lower): SQL lower()
+    # only folds ASCII on some databases
+    users = sa.table(
+        'users', sa.column('id'), sa.column('email'), sa.column('username'),
+        sa.column('email_normalized'), sa.column('username_normalized'),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(users.c.id, users.c.email, users.c.username)).fetchall()
+    values = [
+        {"user_id": row.id, "email_value": row.email.strip().lower(), "username_value": row.username.strip().lower()}
+        for row in rows
+    ]
+    for field in ("email", "username"):
+        taken = {}
+        for value in values:
+            taken.setdefault(value[f"{field}_value"], []).append(value["user_id"])
+        clashes = {name: ids for name, ids in taken.items() if len(ids) > 1}
+        if clashes:
+            raise RuntimeError(
+                f"Users whose {field} differs only by case or spaces must be renamed first: {clashes}"
+            )
+    if values:
+        connection.execute(
+            users.update().where(users.c.id == sa.bindparam('user_id')).values(
+                email_normalized=sa.bindparam('email_value'), username_normalized=sa.bindparam('username_value')
+            ),
+            values,
+        )
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('email_normalized', existing_type=sa.String(length=120), nullable=False)
+        batch_op.alter_column('username_normalized', existing_type=sa.String(length=250), nullable=False)
+        batch_op.create_index('ix_users_email_normalized', ['email_normalized'], unique=True)
+        batch_op.create_index('ix_users_username_normalized', ['username_normalized'], unique=True)
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_username_normalized')
+        batch_op.drop_index('ix_users_email_normalized')
+        batch_op.drop_column('username_normalized')
+        batch_op.drop_column('email_normalized')
+
+    # ### end Alembic commands ###
@@ -7,4 +7,7 @@ npm run build
 
 pipenv install
 
+# .br/.gz copies of the build, served by src/api/static_files.py
+pipenv run precompress
+
 pipenv run upgrade
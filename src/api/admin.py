@@ -1,11 +1,24 @@
   
 import os
+from flask import Flask
 from flask_admin import Admin
 from .models import db, User, BlogPost, PostLike, Comment, CommentLike
+from .search import matching_ids
 from flask_admin.contrib.sqla import ModelView
 
 
-class BlogPostModelView(ModelView):
+class FullTextSearchMixin:
+    # The search box goes through the full-text index (see search.py) instead of
+    # Flask-Admin's ILIKE '%term%' scan over every column in column_searchable_list
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        ids = db.select(matching_ids(self.model, search).c.id)
+        query = query.filter(self.model.id.in_(ids))
+        if count_query is not None:
+            count_query = count_query.filter(self.model.id.in_(ids))
+        return query, count_query, joins, count_joins
+
+
+class BlogPostModelView(FullTextSearchMixin, ModelView):
     column_list = (
         'author.email', 
         'author.username', 
@@ -26,14 +39,15 @@ class BlogPostModelView(ModelView):
         'comments_count': 'Comments'
     }
     
-    column_searchable_list = ('title', 'content', 'author.email', 'author.username')
+    # Searched through the full-text index, filter by author with column_filters
+    column_searchable_list = ('title', 'content')
     column_filters = ('created_at', 'author.email')
     
-    column_formatters = {
-        'likes_count': lambda v, c, m, n: sum(1 for like in m.likes if like.is_like),
-        'dislikes_count': lambda v, c, m, n: sum(1 for like in m.likes if not like.is_like),
-        'comments_count': lambda v, c, m, n: len(m.comments)
-    }
+    # The counters are maintained by the API and the scores by the ranking job (updated_at
+    # tells it which posts to score again), never edited by hand
+    form_excluded_columns = (
+        'likes_count', 'dislikes_count', 'comments_count', 'hot_score', 'top_score', 'updated_at'
+    )
     
     can_create = True
     can_edit = True
@@ -42,7 +56,7 @@ class BlogPostModelView(ModelView):
     create_modal = True
     edit_modal = True
 
-class CommentModelView(ModelView):
+class CommentModelView(FullTextSearchMixin, ModelView):
     column_list = (
         'post.title',
         'user.username',
@@ -59,13 +73,10 @@ class CommentModelView(ModelView):
         'dislikes_count': 'Dislikes'
     }
     
-    column_searchable_list = ('content', 'user.username', 'post.title')
+    column_searchable_list = ('content',)
     column_filters = ('created_at', 'user.username', 'post.title')
     
-    column_formatters = {
-        'likes_count': lambda v, c, m, n: sum(1 for like in m.likes if like.is_like),
-        'dislikes_count': lambda v, c, m, n: sum(1 for like in m.likes if not like.is_like)
-    }
+    form_excluded_columns = ('likes_count', 'dislikes_count')
     
     can_create = True
     can_edit = True
@@ -74,6 +85,10 @@ class CommentModelView(ModelView):
     create_modal = True
     edit_modal = True
 
+class UserModelView(ModelView):
+    # Set from the email and username by the model, see User.normalize
+    form_excluded_columns = ('email_normalized', 'username_normalized')
+
 class PostLikeModelView(ModelView):
     column_list = (
         'post.title', 
@@ -119,11 +134,23 @@ def setup_admin(app):
 
     
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
+    admin.add_view(UserModelView(User, db.session))
     admin.add_view(BlogPostModelView(BlogPost, db.session))
     admin.add_view(PostLikeModelView(PostLike, db.session))
     admin.add_view(CommentModelView(Comment, db.session))
     admin.add_view(CommentLikeModelView(CommentLike, db.session))
 
     # You can duplicate that line to add mew models
-    # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
+    # admin.add_view(ModelView(YourModelName, db.session))
+
+
+def create_admin_app(config):
+    """
+    A Flask app holding only the admin, with the API app's `config`. app.py mounts it
+    under /admin and builds it on the first request there (see api/startup.py).
+    """
+    app = Flask(__name__, static_folder=None)
+    app.config.update(config)
+    db.init_app(app)
+    setup_admin(app)
+    return app
@@ -0,0 +1,167 @@
+"""
+Serving the API from an ASGI server (uvicorn), see src/asgi.py.
+
+The same Flask app answers every request, with its blueprint, hooks, error handlers,
+response cache and admin. What changes is where a request waits:
+
+- The read-only views (@read_replica: the feed, a post, its comments, the post page and
+  search) run on the event loop, their queries through an async driver (asyncpg,
+  aiosqlite). The view code is unchanged: SQLAlchemy runs it in a greenlet that hands the
+  loop back while a query is in flight, so one process keeps serving other requests while
+  it waits on the database.
+- Every other request runs in a thread pool of ASGI_THREADS threads (default 8), like a
+  gunicorn --threads worker. Logins (password hashing), writes and the admin stay there.
+
+The async engines mirror the app's engines (primary and replicas) with the same pool
+settings. They need the async driver of the database: "pipenv install uvicorn asyncpg" for
+Postgres, "pipenv install uvicorn aiosqlite" for SQLite.
+
+Request and response bodies are buffered, nothing is streamed. With RESPONSE_CACHE_URL set
+to Redis, cache lookups of the read views block the loop for their round trip.
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util import greenlet_spawn
+from werkzeug.exceptions import HTTPException
+from api.database import ASYNC_ENGINES, pool_options
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for the {backend} database")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def create_async_engines(engines):
+    """An async engine for each of the app's engines, keyed by the app's engine."""
+    async_engines = {}
+    for engine in engines.values():
+        # The async engines bring their own asyncio-aware pool
+        options = {name: value for name, value in pool_options(engine.url).items() if name != "poolclass"}
+        if engine.dialect.name == "sqlite":
+            # aiosqlite runs every connection on its own thread, opening one per query (the
+            # default for SQLite files under SQLAlchemy 1.4) costs more than the query
+            options["poolclass"] = AsyncAdaptedQueuePool
+        async_engines[engine] = create_async_engine(async_url(engine.url), **options)
+    return async_engines
+
+
+def runs_on_event_loop(view):
+    # Read-only views only ever wait on the database
+    return getattr(view, "read_replica", False)
+
+
+def wsgi_environ(scope, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+def call_wsgi(app, environ):
+    """Run the WSGI app to completion: (status, headers, body)."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = status, headers
+        return lambda data: chunks.append(data)
+
+    chunks = []
+    result = app(environ, start_response)
+    try:
+        chunks.extend(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started["status"], started["headers"], b"".join(chunks)
+
+
+class AsyncAPI:
+    """ASGI application serving the Flask `app`."""
+
+    def __init__(self, app):
+        self.app = app
+        with app.app_context():
+            self.async_engines = create_async_engines(app.extensions["sqlalchemy"].engines)
+        # What RoutingSession.get_bind needs: the engine to use instead of each of the app's
+        self.engines = {engine: async_engine.sync_engine for engine, async_engine in self.async_engines.items()}
+        self.executor = ThreadPoolExecutor(max_workers=int(os.getenv("ASGI_THREADS", 8)), thread_name_prefix="asgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            raise NotImplementedError(f"Unsupported ASGI scope {scope['type']}")
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        environ = wsgi_environ(scope, body)
+        if self.on_event_loop(environ):
+            # RoutingSession swaps in the async engines, see api/database.py
+            environ[ASYNC_ENGINES] = self.engines
+            status, headers, body = await greenlet_spawn(call_wsgi, self.app, environ)
+        else:
+            loop = asyncio.get_running_loop()
+            status, headers, body = await loop.run_in_executor(self.executor, call_wsgi, self.app, environ)
+
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def on_event_loop(self, environ):
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return False
+        return runs_on_event_loop(self.app.view_functions.get(endpoint))
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for engine in self.async_engines.values():
+                    await engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
@@ -0,0 +1,192 @@
+"""
+Authentication of API requests by the access token login_user issues.
+
+Routes that act for a user are decorated with @jwt_required() and take the user's id from
+the token (current_user_id()). The public reads that add the viewer's own reactions use
+request_user_id() instead, which answers as for an anonymous request when the token has
+expired or was revoked. Clients send "Authorization: Bearer <token>".
+
+Checking a token is a signature check plus two lookups, neither of which normally reaches
+the database:
+- the user, so tokens of deleted users stop working: user records are kept in a per-worker
+  LRU of AUTH_USER_CACHE_SIZE entries (default 10000) for AUTH_USER_CACHE_TTL seconds
+  (default 60). A miss costs one SELECT, which the routes' query budgets allow for. A user
+  deleted meanwhile is only noticed when their entry expires.
+- the revocation list, which POST /api/logout adds the token to until it expires.
+  TOKEN_REVOCATION_URL:
+  - "memory" (default): a list per worker process. A logout only revokes the token in
+    the worker that served it, so run a single worker or use Redis.
+  - a redis:// URL: one list shared by every worker, a key per revoked token that expires
+    with it. Needs the `redis` package. Costs a Redis round-trip per request.
+
+"python -m bench auth" measures what authenticating a request costs, see docs/PERFORMANCE.md.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import g
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+
+CachedUser = namedtuple("CachedUser", "id username email is_active")
+
+
+def current_user_id():
+    """The id of the user the request's token was issued to, None without a (verified) token."""
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        # Routes without @jwt_required never look at the token
+        return None
+    return int(identity) if identity is not None else None
+
+
+def request_user_id():
+    """
+    current_user_id() on any route: the token of a route without @jwt_required is verified
+    here. None without a token, or with one that does not verify (the route is public).
+    """
+    user_id = current_user_id()
+    if user_id is None and not g.get("token_rejected"):
+        try:
+            verify_jwt_in_request(optional=True)
+        except (JWTExtendedException, PyJWTError):
+            # Once per request: the cache key, the ETag and the view all ask
+            g.token_rejected = True
+            return None
+        user_id = current_user_id()
+    return user_id
+
+
+class UserCache:
+    """LRU of user records with a TTL, per worker process."""
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """The user's record, loaded from the database on a miss. None if there is no such user."""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[1] >= time.monotonic():
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Imported here: the models import api.database, which imports this module
+        from api.models import db, User
+        # Always from the primary: a user who just signed up may not have reached the replicas,
+        # and a read route's replica must be chosen knowing the user (their read-your-writes pin)
+        statement = db.select(User.id, User.username, User.email, User.is_active).filter_by(id=user_id)
+        row = db.session.execute(statement, bind_arguments={"bind": db.engine}).first()
+        user = CachedUser(*row) if row is not None else None
+        if user is not None:
+            with self.lock:
+                self.entries[user_id] = (user, time.monotonic() + self.ttl)
+                self.entries.move_to_end(user_id)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return user
+
+    def forget(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
+
+
+class MemoryRevocations:
+    def __init__(self):
+        # jti -> the token's expiry (a unix timestamp)
+        self.revoked = {}
+        self.lock = threading.Lock()
+
+    def revoke(self, jti, expires_at):
+        now = time.time()
+        with self.lock:
+            self.revoked[jti] = expires_at
+            # Expired tokens are rejected anyway, their entries can go
+            for expired in [token for token, expiry in self.revoked.items() if expiry < now]:
+                del self.revoked[expired]
+
+    def is_revoked(self, jti):
+        return jti in self.revoked
+
+    def size(self):
+        return len(self.revoked)
+
+
+class RedisRevocations:
+    """One revocation list for every worker. Needs the `redis` package."""
+    PREFIX = "revoked:"
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def revoke(self, jti, expires_at):
+        self.client.set(self.PREFIX + jti, 1, exat=int(expires_at) + 1)
+
+    def is_revoked(self, jti):
+        return self.client.exists(self.PREFIX + jti) > 0
+
+    def size(self):
+        # Not counted: it would mean scanning the keyspace
+        return None
+
+
+class Authentication:
+    def __init__(self):
+        self.users = UserCache()
+        self.revocations = MemoryRevocations()
+
+    def init_app(self, app, jwt):
+        """Register the user and revocation lookups on the app's JWTManager."""
+        self.users = UserCache(
+            max_entries=int(os.getenv("AUTH_USER_CACHE_SIZE", 10000)),
+            ttl=float(os.getenv("AUTH_USER_CACHE_TTL", 60)),
+        )
+        url = os.getenv("TOKEN_REVOCATION_URL", "memory")
+        self.revocations = MemoryRevocations() if url == "memory" else RedisRevocations(url)
+        jwt.user_lookup_loader(self.load_user)
+        jwt.token_in_blocklist_loader(self.is_revoked)
+        app.extensions["authentication"] = self
+
+    def load_user(self, jwt_header, jwt_data):
+        return self.users.get(int(jwt_data["sub"]))
+
+    def is_revoked(self, jwt_header, jwt_data):
+        return self.revocations.is_revoked(jwt_data["jti"])
+
+    def revoke(self, jwt_data):
+        """Reject the token from now until it expires."""
+        self.revocations.revoke(jwt_data["jti"], jwt_data["exp"])
+
+    def stats(self):
+        return {
+            "user_cache": self.users.stats(),
+            "revocations": type(self.revocations).__name__,
+            "revoked": self.revocations.size(),
+        }
+
+
+authentication = Authentication()
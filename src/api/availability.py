@@ -0,0 +1,180 @@
+"""
+Email/username availability checks (POST /api/check-availability) without a query per keystroke.
+
+Emails and usernames are unique whatever their case and surrounding spaces: users also store
+them normalized (normalize_identifier in models.py) under unique indexes, which logins and
+checks look up. Signup is a single INSERT that lets those indexes reject a taken name.
+
+The signup form checks on every keystroke, and almost every name it asks about is free. A
+Bloom filter per worker holds every normalized email and username. A name that is not in the
+filter is definitely available, answered without the database. Any other name is looked up in
+the index: the ones taken, and AVAILABILITY_FILTER_ERROR_RATE (default 1%) of the free ones.
+
+The filter is built on the first check in each worker rather than in init_app ("flask db
+upgrade" imports the app before the columns exist). A check that arrives while it is being
+built asks the database. The filter then:
+- adds the users of the signups its worker serves,
+- adds users created by other workers, by id, at most every AVAILABILITY_FILTER_SYNC seconds
+  (default 5). Until then it can call their names available, and the signup is refused by
+  the unique index.
+- is rebuilt every AVAILABILITY_FILTER_REBUILD seconds (default 600), or once it holds more
+  names than it was sized for. That is when it picks up emails and usernames edited in the
+  admin. Deleted users' names stay in it, which only costs a lookup.
+
+AVAILABILITY_FILTER=off checks every name in the database.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from api.models import db, User
+
+# A filter is sized for GROWTH times the names it is built with, and at least MIN_CAPACITY
+MIN_CAPACITY = 10000
+GROWTH = 2
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        # Setting a bit reads and writes its byte, two threads adding at once could lose one
+        self.lock = threading.Lock()
+
+    def positions(self, key):
+        # Double hashing: the k positions come from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        positions = self.positions(key)
+        with self.lock:
+            for position in positions:
+                self.bits[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+def key(field, value):
+    return f"{field}:{value}"
+
+
+class AvailabilityFilter:
+    FIELDS = ("email", "username")
+
+    def __init__(self):
+        self.enabled = False
+        self.error_rate = 0.01
+        self.sync_seconds = 5.0
+        self.rebuild_seconds = 600.0
+        self.filter = None
+        self.last_id = 0
+        self.built_at = None
+        self.synced_at = None
+        self.build_ms = None
+        self.lock = threading.Lock()
+        self.counts_lock = threading.Lock()
+        self.counts = {"checks": 0, "filtered": 0, "queried": 0, "false_positives": 0}
+
+    def init_app(self, app):
+        self.enabled = os.getenv("AVAILABILITY_FILTER", "on") != "off"
+        self.error_rate = float(os.getenv("AVAILABILITY_FILTER_ERROR_RATE", 0.01))
+        self.sync_seconds = float(os.getenv("AVAILABILITY_FILTER_SYNC", 5))
+        self.rebuild_seconds = float(os.getenv("AVAILABILITY_FILTER_REBUILD", 600))
+        app.extensions["availability_filter"] = self
+
+    def is_available(self, field, value):
+        """Whether no user has the normalized `value` as their `field` ("email" or "username")."""
+        self.refresh()
+        current = self.filter
+        self.count("checks")
+        if current is not None and key(field, value) not in current:
+            self.count("filtered")
+            return True
+        column = getattr(User, f"{field}_normalized")
+        taken = db.session.query(db.exists().where(column == value)).scalar()
+        self.count("queried")
+        if current is not None and not taken:
+            self.count("false_positives")
+        return not taken
+
+    def count(self, name):
+        with self.counts_lock:
+            self.counts[name] += 1
+
+    def added(self, email_normalized, username_normalized):
+        """A user this worker just created."""
+        current = self.filter
+        if current is not None:
+            current.add(key("email", email_normalized))
+            current.add(key("username", username_normalized))
+
+    # ----------------------------- building -----------------------------
+
+    def refresh(self):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        current = self.filter
+        stale = current is None or now - self.built_at > self.rebuild_seconds or current.count > current.capacity
+        if not stale and now - self.synced_at < self.sync_seconds:
+            return
+        # One thread builds or syncs, the others keep answering with what there is
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            if stale:
+                self.rebuild()
+            else:
+                self.last_id = self.load(current, self.last_id)
+                self.synced_at = time.monotonic()
+        finally:
+            self.lock.release()
+
+    def rebuild(self):
+        start = time.perf_counter()
+        users = db.session.query(db.func.count(User.id)).scalar()
+        rebuilt = BloomFilter(max(MIN_CAPACITY, GROWTH * len(self.FIELDS) * users), self.error_rate)
+        last_id = self.load(rebuilt, 0)
+        self.filter, self.last_id = rebuilt, last_id
+        self.built_at = self.synced_at = time.monotonic()
+        self.build_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    def load(self, target, after_id):
+        """Add the users with an id above `after_id` to `target`. Returns the last id seen."""
+        query = (
+            db.session.query(User.id, User.email_normalized, User.username_normalized)
+            .filter(User.id > after_id)
+            .order_by(User.id)
+            .yield_per(10000)
+        )
+        for user_id, email, username in query:
+            target.add(key("email", email))
+            target.add(key("username", username))
+            after_id = user_id
+        return after_id
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        current = self.filter
+        return {
+            "enabled": True,
+            "added": current.count if current else None,
+            "capacity": current.capacity if current else None,
+            "bytes": len(current.bits) if current else None,
+            "hashes": current.hashes if current else None,
+            "build_ms": self.build_ms,
+            **self.counts,
+        }
+
+
+availability_filter = AvailabilityFilter()
@@ -0,0 +1,278 @@
+"""
+Response cache for the public read endpoints.
+
+Cached bodies are grouped in namespaces ("feed", "post:<id>", "comments:<post_id>").
+Every namespace has a version number that is part of the cache key, so invalidating a
+namespace is a single counter increment: entries for the old version are never read
+again and simply age out. Routes that write call response_cache.invalidate(...) with
+the namespaces they touched, after their commit.
+
+The default backend is an in-process LRU with a TTL. Each gunicorn worker has its own
+copy, so after a write other workers can serve the old body for up to RESPONSE_CACHE_TTL
+seconds; point RESPONSE_CACHE_URL at a Redis-compatible server to share one cache.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import g, request, make_response, current_app
+from api.auth import request_user_id
+
+
+class CacheBackend:
+    """
+    What the response cache needs from a store. Counters (incr) hold the namespace
+    versions and must never go back to a version they already had, otherwise entries
+    cached under it could be served again.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def incr(self, key):
+        raise NotImplementedError
+
+    def counter(self, key):
+        raise NotImplementedError
+
+    def mark(self, key, ttl):
+        raise NotImplementedError
+
+    def marked(self, keys):
+        """Whether any of `keys` was marked less than its ttl ago."""
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # An LRU of as many counters as entries, a namespace is created per post. A namespace
+        # without a counter reads the highest version ever evicted, so no namespace goes back
+        # to a version it had (at worst entries of uncounted namespaces are missed once more).
+        self.counters = OrderedDict()
+        self.counter_floor = 0
+        # Marks expire on their own and are not entries: they take no LRU slot and no hit or miss
+        self.marks = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def incr(self, key):
+        with self.lock:
+            value = self.counters.pop(key, self.counter_floor) + 1
+            self.counters[key] = value
+            while len(self.counters) > self.max_entries:
+                _, evicted = self.counters.popitem(last=False)
+                self.counter_floor = max(self.counter_floor, evicted)
+            return value
+
+    def counter(self, key):
+        with self.lock:
+            value = self.counters.get(key)
+            if value is None:
+                return self.counter_floor
+            self.counters.move_to_end(key)
+            return value
+
+    def mark(self, key, ttl):
+        now = time.monotonic()
+        with self.lock:
+            if len(self.marks) > self.max_entries:
+                self.marks = {name: until for name, until in self.marks.items() if until > now}
+            self.marks[key] = now + ttl
+
+    def marked(self, keys):
+        now = time.monotonic()
+        return any(self.marks.get(key, 0) > now for key in keys)
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "counters": len(self.counters),
+        }
+
+
+class RedisBackend(CacheBackend):
+    """
+    Shared cache for every worker. Needs the `redis` package (pipenv install redis).
+    Hit/miss counters are per worker; evictions are reported by the server (INFO stats).
+    """
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.client.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def counter(self, key):
+        return int(self.client.get(key) or 0)
+
+    def mark(self, key, ttl):
+        self.client.set(key, 1, px=max(1, int(ttl * 1000)))
+
+    def marked(self, keys):
+        return bool(keys) and self.client.exists(*keys) > 0
+
+    def stats(self):
+        server = self.client.info("stats")
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": server.get("evicted_keys"),
+            "expirations": server.get("expired_keys"),
+        }
+
+
+class ResponseCache:
+    def __init__(self):
+        self.backend = None
+        self.ttl = 30
+        # Seconds a read replica can be behind the primary, set by api/database.py when
+        # there are replicas. For that long after an invalidation, bodies read from a replica
+        # may predate the write and are not stored under the new version.
+        self.replica_lag_seconds = 0
+
+    def init_app(self, app):
+        url = os.getenv("RESPONSE_CACHE_URL", "memory")
+        self.ttl = float(os.getenv("RESPONSE_CACHE_TTL", 30))
+        if url == "off":
+            self.backend = None
+        elif url == "memory":
+            self.backend = MemoryBackend(max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", 1024)))
+        else:
+            self.backend = RedisBackend(url)
+        app.extensions["response_cache"] = self
+
+    def key(self, namespaces, vary_headers=(), vary_user=False):
+        # Bumping the version of any namespace the response depends on changes its key
+        versions = "+".join(f"{namespace}:v{self.backend.counter('version:' + namespace)}" for namespace in namespaces)
+        # The query string is part of the key: every page / field selection is its own entry.
+        # Encoded again, so that an escaped "&" or "=" in a value cannot pass for another argument
+        args = urlencode(sorted(request.args.items(multi=True)))
+        key = f"response:{versions}:{request.path}?{args}"
+        if vary_headers:
+            key += "|" + urlencode([(name, request.headers.get(name, "")) for name in vary_headers])
+        if vary_user:
+            key += f"|user={request_user_id() or ''}"
+        return key
+
+    def invalidate(self, *namespaces):
+        if self.backend is None:
+            return
+        for namespace in namespaces:
+            # Marked before the new version exists, so every request that can use it sees the mark
+            if self.replica_lag_seconds:
+                self.backend.mark("invalidated:" + namespace, self.replica_lag_seconds)
+            self.backend.incr("version:" + namespace)
+
+    def storable(self, namespaces):
+        # g.replica_bind is the replica api/database.py picked for the request, None for the primary
+        if not self.replica_lag_seconds or not g.get("replica_bind"):
+            return True
+        return not self.backend.marked(["invalidated:" + namespace for namespace in namespaces])
+
+    def stats(self):
+        if self.backend is None:
+            return {"backend": None}
+        return {**self.backend.stats(), "ttl": self.ttl}
+
+    # Validators stored with the body, so cache hits can still answer 304
+    STORED_HEADERS = ("ETag", "Last-Modified", "Cache-Control", "Vary")
+
+    def pack(self, response):
+        headers = {name: response.headers[name] for name in self.STORED_HEADERS if name in response.headers}
+        return json.dumps(headers).encode() + b"\n" + response.get_data()
+
+    def unpack(self, value):
+        headers, body = value.split(b"\n", 1)
+        headers = json.loads(headers)
+        response = current_app.response_class(body, status=200, mimetype="application/json", headers=headers)
+        return response.make_conditional(request)
+
+    def cached(self, *namespaces, vary_headers=(), vary_user=False):
+        """
+        Cache the JSON body of a GET view. Namespaces are formatted with the view's
+        arguments, e.g. "post:{id}"; invalidating any of them drops the entry. Views
+        whose body depends on a request header list it in `vary_headers` to get one
+        entry per value, and views whose body depends on the user (request_user_id())
+        set `vary_user`. Only 200 responses are stored, and not those read from a
+        replica right after one of their namespaces was invalidated.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return view(*args, **kwargs)
+
+                formatted = [namespace.format(**kwargs) for namespace in namespaces]
+                key = self.key(formatted, vary_headers, vary_user)
+                value = self.backend.get(key)
+                if value is not None:
+                    return self.unpack(value)
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and self.storable(formatted):
+                    self.backend.set(key, self.pack(response), self.ttl)
+                return response
+            return wrapper
+        return decorator
+
+
+response_cache = ResponseCache()
@@ -1,12 +1,41 @@
 
+import time
 import click
-from api.models import db, User
+from api.models import db, User, BlogPost, PostLike, Comment, CommentLike
+from api.security import password_hasher
 
 """
 In this file, you can add as many commands as you want using the @app.cli.command decorator
 Flask commands are usefull to run cronjobs or tasks outside of the API but sill in integration 
 with youy database, for example: Import the price of bitcoin every night as 12am
 """
+def count_of(column, *criteria):
+    return db.select(db.func.count(column)).where(*criteria).scalar_subquery()
+
+def reconcile_counters():
+    """
+    Recompute the denormalized like/dislike/comment counters from the source tables.
+    Only rows that drifted are rewritten; returns how many rows were fixed per table.
+    """
+    post_counts = {
+        BlogPost.likes_count: count_of(PostLike.id, PostLike.post_id == BlogPost.id, PostLike.is_like.is_(True)),
+        BlogPost.dislikes_count: count_of(PostLike.id, PostLike.post_id == BlogPost.id, PostLike.is_like.is_(False)),
+        BlogPost.comments_count: count_of(Comment.id, Comment.post_id == BlogPost.id),
+    }
+    comment_counts = {
+        Comment.likes_count: count_of(CommentLike.id, CommentLike.comment_id == Comment.id, CommentLike.is_like.is_(True)),
+        Comment.dislikes_count: count_of(CommentLike.id, CommentLike.comment_id == Comment.id, CommentLike.is_like.is_(False)),
+    }
+
+    fixed = {}
+    for model, counts in ((BlogPost, post_counts), (Comment, comment_counts)):
+        drifted = db.or_(*[column != expected for column, expected in counts.items()])
+        fixed[model.__tablename__] = db.session.query(model).filter(drifted).update(
+            counts, synchronize_session=False
+        )
+    db.session.commit()
+    return fixed
+
 def setup_commands(app):
     
     """ 
@@ -18,17 +47,93 @@ def setup_commands(app):
     @click.argument("count") # argument of out command
     def insert_test_users(count):
         print("Creating test users")
+        password = password_hasher.hash("123456")
+        users = []
         for x in range(1, int(count) + 1):
             user = User()
             user.email = "test_user" + str(x) + "@test.com"
-            user.password = "123456"
+            user.username = "test_user" + str(x)
+            user.password = password
             user.is_active = True
-            db.session.add(user)
-            db.session.commit()
+            users.append(user)
+        db.session.add_all(users)
+        db.session.commit()
+        for user in users:
             print("User: ", user.email, " created.")
 
         print("All test users created")
 
     @app.cli.command("insert-test-data")
     def insert_test_data():
-        pass
\ No newline at end of file
+        from api.seed import Seeder
+        Seeder(users=10, posts=30, comments=100, post_likes=120, comment_likes=150).run()
+        print("Test data created, every seeded user's password is 'password'")
+
+    """
+    Generates a large, deterministic dataset for load testing, for example:
+    $ flask seed --users 10000 --posts 1000000 --comments 3000000 --post-likes 5000000 --comment-likes 2000000
+    Likes go to distinct users, so a post never gets more likes than there are users.
+    """
+    @app.cli.command("seed")
+    @click.option("--users", default=1000, help="Users to create")
+    @click.option("--posts", default=10000, help="Blog posts to create")
+    @click.option("--comments", default=50000, help="Comments to create")
+    @click.option("--post-likes", default=100000, help="Post likes/dislikes to create (upper bound)")
+    @click.option("--comment-likes", default=50000, help="Comment likes/dislikes to create (upper bound)")
+    @click.option("--seed", default=0, help="Random seed, the same seed produces the same data")
+    @click.option("--batch-size", default=5000, help="Rows per INSERT batch / transaction")
+    @click.option("--skew", default=1.1, help="Power-law exponent for post and author popularity")
+    def seed(users, posts, comments, post_likes, comment_likes, seed, batch_size, skew):
+        from api.seed import Seeder
+        start = time.perf_counter()
+        Seeder(
+            users=users, posts=posts, comments=comments, post_likes=post_likes,
+            comment_likes=comment_likes, seed=seed, batch_size=batch_size, skew=skew
+        ).run()
+        print(f"Done in {time.perf_counter() - start:.1f}s, every seeded user's password is 'password'")
+
+    """
+    Repairs the likes/dislikes/comments counters on blog_posts and comments if they
+    ever drift from the underlying rows (manual SQL, admin edits, crashed requests):
+    $ flask reconcile-counters
+    """
+    @app.cli.command("reconcile-counters")
+    def reconcile_counters_command():
+        fixed = reconcile_counters()
+        for table, count in fixed.items():
+            print(f"{table}: {count} row(s) corrected")
+
+    """
+    Scores the posts updated since the last run for the hot and top feeds (see api/rankings.py),
+    once or every N seconds as a worker process:
+    $ flask rank-posts
+    $ flask rank-posts --every 60
+    """
+    @app.cli.command("rank-posts")
+    @click.option("--every", default=None, type=float, help="Keep running, every this many seconds")
+    @click.option("--full", is_flag=True, help="Score every post, not only the updated ones")
+    @click.option("--batch-size", default=5000, help="Posts per transaction")
+    @click.option("--allow-stale-cache", is_flag=True, help="Run with the per-process memory response cache")
+    def rank_posts_command(every, full, batch_size, allow_stale_cache):
+        from api.rankings import rank_posts, run_ranker, check_shared_cache
+        if not allow_stale_cache:
+            try:
+                check_shared_cache()
+            except RuntimeError as error:
+                raise click.ClickException(str(error))
+        if every:
+            run_ranker(every, full=full, batch_size=batch_size)
+            return
+        start = time.perf_counter()
+        counts = rank_posts(full=full, batch_size=batch_size)
+        print(f"{counts['scanned']} posts scanned, {counts['rescored']} rescored in {time.perf_counter() - start:.2f}s")
+
+    """
+    Writes .br/.gz copies of the front end build for the static file server, run after "npm run build":
+    $ flask precompress-static
+    """
+    @app.cli.command("precompress-static")
+    def precompress_static_command():
+        from api.static_files import precompress, static_files
+        written = precompress(static_files.directory)
+        print(f"{len(written)} precompressed file(s) written")
@@ -0,0 +1,84 @@
+"""
+Compression of the API's JSON responses.
+
+JSON bodies of at least RESPONSE_COMPRESSION_MIN_SIZE bytes (default 1024) are compressed
+with the best encoding the client accepts among RESPONSE_COMPRESSION, "br,gzip" by default
+("off" disables it). Brotli comes from the `brotli` package, which the Pipfile installs;
+without it (an install that left it out) only gzip is used. Both run at a low level: the bodies are made per request (or per cache
+hit), so compression speed matters more than the last few percent of size.
+
+A compressed body gets a weak ETag (W/"..."), as its bytes differ from the uncompressed
+one's. If-None-Match compares ETags weakly, so revalidation keeps answering 304.
+"""
+import gzip
+import os
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+class ResponseCompression:
+    def __init__(self):
+        self.encodings = []
+        self.min_size = 1024
+
+    def init_app(self, app):
+        setting = os.getenv("RESPONSE_COMPRESSION", "br,gzip")
+        if setting == "off":
+            return
+        self.encodings = [
+            encoding.strip() for encoding in setting.split(",")
+            if encoding.strip() == "gzip" or (encoding.strip() == "br" and brotli is not None)
+        ]
+        self.min_size = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", 1024))
+        if self.encodings:
+            app.after_request(self.compress_response)
+        app.extensions["response_compression"] = self
+
+    def compress_response(self, response):
+        if response.status_code == 304:
+            # Answers a revalidation of a body that may have been sent compressed
+            if request.accept_encodings.best_match(self.encodings):
+                weaken_etag(response)
+            return response
+        if any((
+            response.status_code != 200,
+            response.mimetype != "application/json",
+            response.direct_passthrough,
+            response.is_streamed,
+            "Content-Encoding" in response.headers,
+        )):
+            return response
+
+        # Shared caches must keep one copy per encoding, even of bodies sent uncompressed
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(self.encodings)
+        data = response.get_data()
+        if encoding is None or len(data) < self.min_size:
+            return response
+
+        response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        weaken_etag(response)
+        return response
+
+
+def weaken_etag(response):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+response_compression = ResponseCompression()
@@ -0,0 +1,50 @@
+"""
+Conditional GET support (ETag / Last-Modified and 304 Not Modified).
+
+A response's version is computed from the (id, updated_at) pairs of the rows it is built
+from, plus the request's path and query string (and the user, for bodies that show their
+reactions), so it can be checked with a narrow query before anything is loaded or serialized.
+"""
+import hashlib
+from flask import request, current_app
+from api.auth import request_user_id
+
+
+class ResourceVersion:
+    def __init__(self, rows, single=False, vary_user=False):
+        digest = hashlib.sha1(request.full_path.encode())
+        # Bodies that show the user's own reactions: one user's ETag must not be fresh for another
+        self.vary_user = vary_user
+        if vary_user:
+            digest.update(f"|user:{request_user_id() or ''}".encode())
+        last_modified = None
+        for row_id, updated_at in rows:
+            digest.update(f"|{row_id}:{updated_at.isoformat() if updated_at else ''}".encode())
+            if updated_at and (last_modified is None or updated_at > last_modified):
+                last_modified = updated_at
+        self.etag = digest.hexdigest()
+        self.last_modified = last_modified
+        # A list's newest updated_at does not change when one of its rows is deleted,
+        # so only single resources get a Last-Modified date
+        self.single = single
+
+    def is_fresh(self):
+        if request.if_none_match:
+            # Weak comparison: compressed responses carry the weak form, see api/compression.py
+            return request.if_none_match.contains_weak(self.etag)
+        if self.single and request.if_modified_since and self.last_modified:
+            return self.last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+        return False
+
+    def stamp(self, response):
+        response.set_etag(self.etag)
+        if self.single and self.last_modified:
+            response.last_modified = self.last_modified
+        # Let browsers keep the body but revalidate it on every use
+        response.cache_control.no_cache = True
+        if self.vary_user:
+            response.vary.add("Authorization")
+        return response
+
+    def not_modified(self):
+        return self.stamp(current_app.response_class(status=304))
@@ -0,0 +1,358 @@
+"""
+Database engines: connection pool settings, read replicas and pool metrics.
+
+Pool settings come from the environment and apply to the server databases (Postgres).
+SQLite files open a connection per checkout and ignore them.
+
+- DB_POOL_SIZE: connections kept open per process (default 5). With gunicorn this is per
+  worker, so it should be at least the worker's --threads.
+- DB_MAX_OVERFLOW: extra connections opened under load and closed again when returned
+  (default 5).
+- DB_POOL_TIMEOUT: seconds a request waits for a free connection before failing (default 10).
+- DB_POOL_RECYCLE: seconds after which a connection is replaced before its next use, to stay
+  under the server's or a proxy's idle timeout (default 1800).
+- DB_POOL_PRE_PING: test every connection on checkout and reconnect if it was dropped,
+  e.g. by a database restart or failover (default 1).
+
+workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) must stay below the server's max_connections,
+minus what migrations, the admin and other clients need.
+
+DATABASE_REPLICA_URL adds read replicas, one URL or several separated by commas. Routes
+decorated with @read_replica run their queries on one of them, everything else (and any
+flush) uses the primary. Each request picks a replica round-robin among the healthy ones;
+the primary answers instead when:
+
+- no replica is healthy: a background thread checks every REPLICA_CHECK_INTERVAL seconds
+  (default 2) that each replica answers and is less than REPLICA_MAX_LAG seconds (default 2)
+  behind the primary.
+- the client wrote recently (read-your-writes): for REPLICA_PIN_SECONDS (default 5) after a
+  request commits, reads by the same user (the identity in their token, verified here on
+  routes that do not require one) stay on the primary. Pins are per user, not per cache
+  namespace: every like invalidates the feed, so pinning namespaces would keep the busiest
+  reads off the replicas for good. Another client's read right after a write can still come
+  from a replica that is behind. The response cache does not store such a body: for
+  REPLICA_PIN_SECONDS after a namespace is invalidated it only keeps bodies read from the
+  primary (see ResponseCache.storable), so a pinned user's cache hits include their write.
+
+Pins live in the response cache's Redis when it has one, so they hold across workers, and
+in each process otherwise. REPLICA_PIN_SECONDS should stay above REPLICA_MAX_LAG plus
+REPLICA_CHECK_INTERVAL, the longest a healthy replica can be behind.
+
+Pool metrics (size, checked out, overflow, time spent waiting for a connection) and the
+replicas' state are part of GET /api/metrics.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from flask import g, request, has_request_context, current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from api.cache import response_cache, RedisBackend
+from api.auth import current_user_id, request_user_id
+
+logger = logging.getLogger("api.database")
+
+# WSGI environ key set by api/async_mode.py: {app engine: async engine to use instead}
+ASYNC_ENGINES = "api.async_engines"
+
+
+def database_url(url):
+    # Heroku/Render style URLs still use the scheme SQLAlchemy dropped
+    return url.replace("postgres://", "postgresql://", 1)
+
+
+def pool_options(url):
+    """Engine options for `url`, the pool settings only for server databases."""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 5)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    }
+
+
+def configure_database(app):
+    """Set the SQLAlchemy config of `app` from DATABASE_URL and DATABASE_REPLICA_URL."""
+    url = database_url(os.getenv("DATABASE_URL", "sqlite:////tmp/test.db"))
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = pool_options(url)
+
+    replica_urls = [database_url(url.strip()) for url in os.getenv("DATABASE_REPLICA_URL", "").split(",") if url.strip()]
+    if replica_urls:
+        app.config["SQLALCHEMY_BINDS"] = {
+            f"replica{index}": {"url": url, **pool_options(url)} for index, url in enumerate(replica_urls)
+        }
+
+
+# ----------------------------- replica routing -----------------------------
+
+
+def read_replica(view):
+    """The decorated view only reads, its queries may run on a read replica."""
+    view.read_replica = True
+    return view
+
+
+def reads_from_replica():
+    if not has_request_context():
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, "read_replica", False)
+
+
+class RoutingSession(Session):
+    """
+    db.session: queries of @read_replica views go to the replica the router picked for the
+    request, everything else to the engine Flask-SQLAlchemy picks.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = None
+        if bind is None and not self._flushing and reads_from_replica():
+            engine = replica_router.engine_for_request()
+        if engine is None:
+            engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        # Under the ASGI server, views running on the event loop use the async engines
+        async_engines = request.environ.get(ASYNC_ENGINES) if has_request_context() else None
+        return async_engines.get(engine, engine) if async_engines else engine
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def remember_commit(session):
+    if has_request_context():
+        g.db_committed = True
+
+
+class MemoryPins:
+    PRUNE_ABOVE = 10000
+
+    def __init__(self):
+        self.expires_at = {}
+        self.lock = threading.Lock()
+
+    def pin(self, names, seconds):
+        now = time.monotonic()
+        with self.lock:
+            if len(self.expires_at) > self.PRUNE_ABOVE:
+                self.expires_at = {name: until for name, until in self.expires_at.items() if until > now}
+            for name in names:
+                self.expires_at[name] = now + seconds
+
+    def pinned(self, names):
+        now = time.monotonic()
+        return any(self.expires_at.get(name, 0) > now for name in names)
+
+
+class RedisPins:
+    def __init__(self, client):
+        self.client = client
+
+    def pin(self, names, seconds):
+        pipeline = self.client.pipeline()
+        for name in names:
+            pipeline.set(name, 1, px=int(seconds * 1000))
+        pipeline.execute()
+
+    def pinned(self, names):
+        return bool(names) and self.client.exists(*names) > 0
+
+
+class Replica:
+    def __init__(self, bind_key):
+        self.bind_key = bind_key
+        # None until the first health check
+        self.healthy = None
+        self.lag = None
+        self.error = None
+
+    def stats(self):
+        return {"healthy": self.healthy, "lag_seconds": self.lag, "error": self.error}
+
+
+# Seconds the replica is behind. Unknown dialects (and SQLite, which has no replication)
+# only prove the replica answers and has the schema.
+LAG_QUERIES = {
+    "postgresql": (
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+    ),
+}
+DEFAULT_LAG_QUERY = "SELECT 0 FROM alembic_version"
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.app = None
+        self.replicas = []
+        self.pins = None
+        self.pin_seconds = 5.0
+        self.max_lag = 2.0
+        self.check_interval = 2.0
+        self.rotation = itertools.count()
+        self.monitor_pid = None
+        self.lock = threading.Lock()
+        self.counts = {"replica": 0, "pinned": 0, "fallback": 0}
+
+    def init_app(self, app):
+        self.app = app
+        self.replicas = [Replica(key) for key in app.config.get("SQLALCHEMY_BINDS", {}) if key.startswith("replica")]
+        self.pin_seconds = float(os.getenv("REPLICA_PIN_SECONDS", 5))
+        self.max_lag = float(os.getenv("REPLICA_MAX_LAG", 2))
+        self.check_interval = float(os.getenv("REPLICA_CHECK_INTERVAL", 2))
+        backend = response_cache.backend
+        self.pins = RedisPins(backend.client) if isinstance(backend, RedisBackend) else MemoryPins()
+        if self.replicas:
+            app.after_request(self.pin_writer)
+            response_cache.replica_lag_seconds = self.pin_seconds
+        app.extensions["replica_router"] = self
+
+    # ----------------------------- selection -----------------------------
+
+    def engine_for_request(self):
+        # One choice per request, so all of a view's queries see the same snapshot
+        if "replica_bind" not in g:
+            g.replica_bind = self.choose()
+        if g.replica_bind is None:
+            return None
+        return current_app.extensions["sqlalchemy"].engines[g.replica_bind]
+
+    def choose(self):
+        if not self.replicas:
+            return None
+        self.ensure_monitor()
+        user_id = request_user_id()
+        if user_id and self.pins.pinned([f"pin:user:{user_id}"]):
+            self.count("pinned")
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            self.count("fallback")
+            return None
+        self.count("replica")
+        return healthy[next(self.rotation) % len(healthy)].bind_key
+
+    def count(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    # ----------------------------- read-your-writes -----------------------------
+
+    def pin_writer(self, response):
+        user_id = current_user_id()
+        if g.pop("db_committed", False) and user_id:
+            self.pins.pin([f"pin:user:{user_id}"], self.pin_seconds)
+        return response
+
+    # ----------------------------- health checks -----------------------------
+
+    def ensure_monitor(self):
+        # Started on first use rather than in init_app, so that every gunicorn worker
+        # (forked after the app was imported) runs its own
+        if self.monitor_pid == os.getpid():
+            return
+        with self.lock:
+            if self.monitor_pid == os.getpid():
+                return
+            self.monitor_pid = os.getpid()
+            threading.Thread(target=self.monitor, name="replica-monitor", daemon=True).start()
+
+    def monitor(self):
+        with self.app.app_context():
+            engines = current_app.extensions["sqlalchemy"].engines
+            while True:
+                for replica in self.replicas:
+                    self.check(replica, engines[replica.bind_key])
+                time.sleep(self.check_interval)
+
+    def check(self, replica, engine):
+        query = LAG_QUERIES.get(engine.dialect.name, DEFAULT_LAG_QUERY)
+        was_healthy = replica.healthy
+        try:
+            with engine.connect() as connection:
+                lag = float(connection.execute(text(query)).scalar() or 0)
+        except Exception as error:
+            replica.healthy, replica.lag, replica.error = False, None, str(error).splitlines()[0]
+        else:
+            replica.healthy, replica.lag, replica.error = lag <= self.max_lag, round(lag, 3), None
+        if replica.healthy == was_healthy:
+            return
+        if replica.healthy:
+            logger.warning("Replica %s in rotation", replica.bind_key)
+        else:
+            logger.warning("Replica %s out of rotation: lag %s, error %s", replica.bind_key, replica.lag, replica.error)
+
+    def stats(self):
+        return {
+            "requests": dict(self.counts),
+            **{replica.bind_key: replica.stats() for replica in self.replicas},
+        }
+
+
+replica_router = ReplicaRouter()
+
+
+# ----------------------------- pool metrics -----------------------------
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self.lock:
+                self.timeouts += 1
+            raise
+        finally:
+            # Includes opening a new connection when the pool had none idle
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self.lock:
+                self.checkouts += 1
+                self.wait_ms += elapsed_ms
+                self.max_wait_ms = max(self.max_wait_ms, elapsed_ms)
+
+
+def pool_stats(pool):
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        with pool.lock:
+            stats.update({
+                "checkouts": pool.checkouts,
+                "timeouts": pool.timeouts,
+                "wait_ms_avg": round(pool.wait_ms / pool.checkouts, 3) if pool.checkouts else 0.0,
+                "wait_ms_max": round(pool.max_wait_ms, 3),
+            })
+    return stats
+
+
+def database_stats(db):
+    """Pool statistics of every engine and the replicas' state, for GET /api/metrics."""
+    return {
+        "pools": {"primary" if key is None else key: pool_stats(engine.pool) for key, engine in db.engines.items()},
+        "replicas": replica_router.stats(),
+    }
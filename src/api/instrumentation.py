@@ -0,0 +1,141 @@
+"""
+Opt-in per-request SQL instrumentation.
+
+When enabled (SQL_INSTRUMENTATION=1), every request records how many statements it ran,
+the total time spent in the database and its slowest statements. They are reported in a
+Server-Timing header (visible in the browser's network tab), an X-Query-Count header and a
+structured log line on the "api.sql" logger.
+
+Routes can declare a query budget with @query_budget(n); SQL_QUERY_BUDGET sets a default for
+every route. Going over budget logs a warning, or raises QueryBudgetExceeded when
+SQL_QUERY_BUDGET_STRICT=1 (or the app is in testing mode) so a test can fail on it.
+
+When disabled nothing is registered: no engine listeners and no request hooks.
+"""
+import json
+import logging
+import os
+import time
+from flask import g, request, has_request_context, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("api.sql")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """Maximum number of SQL statements the decorated view may run per request."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class RequestQueries:
+    SLOWEST = 3
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest = []
+
+    def record(self, statement, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.slowest.append((elapsed_ms, statement))
+        self.slowest.sort(key=lambda item: item[0], reverse=True)
+        del self.slowest[self.SLOWEST:]
+
+
+class QueryInstrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = 100.0
+        self.default_budget = None
+        self.strict = False
+
+    def init_app(self, app):
+        if os.getenv("SQL_INSTRUMENTATION") == "1":
+            self.enable(app)
+
+    def enable(self, app):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.slow_query_ms = float(os.getenv("SQL_SLOW_QUERY_MS", 100))
+        budget = os.getenv("SQL_QUERY_BUDGET")
+        self.default_budget = int(budget) if budget else None
+        self.strict = os.getenv("SQL_QUERY_BUDGET_STRICT") == "1" or app.testing
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+        # Listening on the Engine class covers every engine, including replicas
+        event.listen(Engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self.after_cursor_execute)
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    # ----------------------------- engine events -----------------------------
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        if not has_request_context() or "sql_queries" not in g:
+            return
+        g.sql_queries.record(statement, elapsed_ms)
+        if elapsed_ms >= self.slow_query_ms:
+            logger.warning(json.dumps({
+                "event": "slow_query",
+                "path": request.path,
+                "ms": round(elapsed_ms, 2),
+                "statement": statement,
+            }))
+
+    # ----------------------------- request hooks -----------------------------
+
+    def start_request(self):
+        g.sql_queries = RequestQueries()
+
+    def budget_for(self, endpoint):
+        view = current_app.view_functions.get(endpoint)
+        return getattr(view, "query_budget", self.default_budget)
+
+    def finish_request(self, response):
+        queries = g.pop("sql_queries", None)
+        if queries is None:
+            return response
+
+        response.headers["X-Query-Count"] = str(queries.count)
+        response.headers.add(
+            "Server-Timing", f'db;dur={queries.total_ms:.2f};desc="{queries.count} queries"'
+        )
+        logger.info(json.dumps({
+            "event": "request",
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "queries": queries.count,
+            "db_ms": round(queries.total_ms, 2),
+            "slowest": [{"ms": round(ms, 2), "statement": statement[:300]} for ms, statement in queries.slowest],
+        }))
+
+        budget = self.budget_for(request.endpoint)
+        if budget is not None and queries.count > budget:
+            message = f"{request.endpoint} ran {queries.count} queries, its budget is {budget}"
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(json.dumps({"event": "query_budget_exceeded", "message": message}))
+        return response
+
+
+instrumentation = QueryInstrumentation()
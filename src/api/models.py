@@ -1,6 +1,81 @@
+import math
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from api.database import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession sends the queries of read-only routes to the replica, see api/database.py
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+def counter_column():
+    return db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+def reaction_deltas(old, new):
+    # Counter changes for a like/dislike going from `old` to `new` (True, False or None)
+    deltas = {"likes_count": 0, "dislikes_count": 0}
+    if old is not None:
+        deltas["likes_count" if old else "dislikes_count"] -= 1
+    if new is not None:
+        deltas["likes_count" if new else "dislikes_count"] += 1
+    return deltas
+
+def reaction_status(is_like):
+    # The frontend's name for a stored reaction: "like", "dislike" or None
+    if is_like is None:
+        return None
+    return "like" if is_like else "dislike"
+
+
+# Feed rankings (GET /api/blog_posts?sort=hot|top), stored on the posts by "flask rank-posts"
+COMMENT_WEIGHT = 2
+HOT_EPOCH = datetime(2024, 1, 1)
+# A post needs 10x the score of a post this much newer to rank above it in the hot feed
+HOT_DECAY_SECONDS = 45000
+
+def top_score(likes, dislikes, comments):
+    return likes - dislikes + COMMENT_WEIGHT * comments
+
+def hot_score(likes, dislikes, comments, created_at):
+    # The logarithm of the score plus the post's age: newer posts outrank older ones with
+    # the same score, so the score decays over time without ever being recomputed for it
+    score = top_score(likes, dislikes, comments)
+    sign = (score > 0) - (score < 0)
+    return round(sign * math.log10(max(abs(score), 1)) + (created_at - HOT_EPOCH).total_seconds() / HOT_DECAY_SECONDS, 7)
+
+def initial_hot_score(context):
+    # A new post's, before any reaction. Flask-Admin calls column defaults without a
+    # context to fill in its create form.
+    created_at = context.get_current_parameters().get("created_at") if context is not None else None
+    return hot_score(0, 0, 0, created_at or datetime.utcnow())
+
+def adjust_counters(model, row_id, **deltas):
+    """Apply counter deltas with a single UPDATE ... SET x = x + n so concurrent
+    writers never overwrite each other's increments."""
+    values = {getattr(model, name): getattr(model, name) + delta for name, delta in deltas.items() if delta}
+    if values:
+        db.session.query(model).filter(model.id == row_id).update(values, synchronize_session=False)
+
+def adjust_counters_many(model, deltas_by_id):
+    """adjust_counters for many rows at once, {row_id: {"likes_count": 1, ...}}, as a single
+    UPDATE ... SET x = x + CASE id WHEN ... END."""
+    ids = [row_id for row_id, deltas in deltas_by_id.items() if any(deltas.values())]
+    if not ids:
+        return
+    values = {}
+    for name in {name for row_id in ids for name, delta in deltas_by_id[row_id].items() if delta}:
+        column = getattr(model, name)
+        whens = {row_id: deltas_by_id[row_id][name] for row_id in ids if deltas_by_id[row_id].get(name)}
+        values[column] = column + db.case(whens, value=model.id, else_=0)
+    db.session.query(model).filter(model.id.in_(ids)).update(values, synchronize_session=False)
+
+def normalize_identifier(value):
+    # Emails and usernames are unique, and match at login, whatever their case and surrounding spaces
+    return value.strip().lower()
+
+def normalized_default(column):
+    # For inserts that bypass the ORM (the seeder's), the ORM sets them through User.normalize
+    def default(context):
+        return normalize_identifier(context.get_current_parameters()[column])
+    return default
 
 class User(db.Model):
     __tablename__ = "users"
@@ -9,12 +84,25 @@ class User(db.Model):
     password = db.Column(db.String(256), unique=False, nullable=False)
     is_active = db.Column(db.Boolean(), unique=False, nullable=False)
     username = db.Column(db.String(250), unique=True, nullable=False)
+    # What uniqueness, logins and availability checks compare, see api/availability.py
+    email_normalized = db.Column(db.String(120), nullable=False, default=normalized_default("email"))
+    username_normalized = db.Column(db.String(250), nullable=False, default=normalized_default("username"))
+
+    __table_args__ = (
+        db.Index("ix_users_email_normalized", "email_normalized", unique=True),
+        db.Index("ix_users_username_normalized", "username_normalized", unique=True),
+    )
 
     blog_posts = db.relationship("BlogPost", back_populates="author")
     post_likes = db.relationship("PostLike", back_populates="user")
     comments = db.relationship("Comment", back_populates="user")
     comment_likes = db.relationship("CommentLike", back_populates="user")
 
+    @db.validates("email", "username")
+    def normalize(self, key, value):
+        setattr(self, f"{key}_normalized", normalize_identifier(value) if value is not None else None)
+        return value
+
     def __repr__(self):
         return f'<User {self.email}>'
     
@@ -32,29 +120,109 @@ class BlogPost(db.Model):
     title = db.Column(db.String(255), nullable=False)
     content = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.String, nullable=True)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    author_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    # Set in Python so every row carries microseconds: SQLite compares DateTime as text,
+    # and mixing CURRENT_TIMESTAMP's format with bound parameters breaks the keyset cursor
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped by every write to the row, including counter updates; drives the ETags
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    author_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+
+    # Denormalized counters, kept in step by the like/comment routes
+    # (see reconcile-counters in commands.py to repair drift)
+    likes_count = counter_column()
+    dislikes_count = counter_column()
+    comments_count = counter_column()
+
+    # Rankings of the hot and top feeds, computed from the counters by "flask rank-posts"
+    # (api/rankings.py) for every post updated since its last run
+    hot_score = db.Column(db.Float, nullable=False, default=initial_hot_score, server_default="0")
+    top_score = counter_column()
+
+    __table_args__ = (
+        # Serves the feed's ORDER BY created_at DESC, id DESC and its keyset cursor
+        db.Index("ix_blog_posts_created_at_id", "created_at", "id"),
+        # The same for the hot and top feeds
+        db.Index("ix_blog_posts_hot_score_id", "hot_score", "id"),
+        db.Index("ix_blog_posts_top_score_id", "top_score", "id"),
+        # The posts the ranking job has to score again
+        db.Index("ix_blog_posts_updated_at_id", "updated_at", "id"),
+    )
+
+    # Only the first EXCERPT_LENGTH characters of the body, computed by the database
+    # so list views never have to transfer the full content
+    EXCERPT_LENGTH = 150
+    excerpt_source = db.column_property(db.func.substr(content, 1, EXCERPT_LENGTH + 1), deferred=True)
 
     author = db.relationship("User", back_populates="blog_posts")
     comments = db.relationship("Comment", back_populates="post", cascade="all, delete-orphan")
     likes = db.relationship("PostLike", back_populates="post", cascade="all, delete-orphan")
 
-    def serialize(self):
-        likes_count = sum(1 for like in self.likes if like.is_like)
-        dislikes_count = sum(1 for like in self.likes if not like.is_like)
+    # Filled in by BlogPost.with_author(), None when the post was loaded without it
+    author_username = db.query_expression()
+    # Filled in by BlogPost.with_viewer_reaction(): the viewer's is_like, None if they did not react
+    viewer_reaction = db.query_expression()
 
-        return {
-            "id": self.id,
-            "title": self.title,
-            "content": self.content,
-            "image_url": self.image_url,
-            "created_at": self.created_at.isoformat(),
-            "author_id": self.author_id,
-            "author": self.author.username,
-            "likes_count": likes_count,
-            "dislikes_count": dislikes_count,
-            "comments_count": len(self.comments)
+    FIELDS = (
+        "id", "title", "content", "excerpt", "image_url", "created_at", "author_id",
+        "author", "likes_count", "dislikes_count", "comments_count",
+    )
+    DEFAULT_FIELDS = tuple(field for field in FIELDS if field != "excerpt")
+    SUMMARY_FIELDS = tuple(field for field in FIELDS if field != "content")
+
+    @classmethod
+    def with_author(cls, query):
+        """Load the author's username in the same statement as the posts, so
+        serializing a page of posts costs no extra queries."""
+        return query.options(
+            db.with_expression(
+                cls.author_username,
+                db.select(User.username).where(User.id == cls.author_id).scalar_subquery()
+            )
+        )
+
+    @classmethod
+    def with_viewer_reaction(cls, query, user_id):
+        """Load `user_id`'s like/dislike of each post in the same statement as the posts."""
+        return query.options(
+            db.with_expression(
+                cls.viewer_reaction,
+                db.select(PostLike.is_like)
+                .where(PostLike.post_id == cls.id, PostLike.user_id == user_id)
+                .scalar_subquery()
+            )
+        )
+
+    @property
+    def author_name(self):
+        if self.author_username is not None:
+            return self.author_username
+        return self.author.username
+
+    @property
+    def excerpt(self):
+        text = self.excerpt_source
+        if len(text) > self.EXCERPT_LENGTH:
+            return text[:self.EXCERPT_LENGTH] + "..."
+        return text
+
+    def serialize(self, fields=None):
+        fields = fields or self.DEFAULT_FIELDS
+        getters = {
+            "id": lambda: self.id,
+            "title": lambda: self.title,
+            "content": lambda: self.content,
+            "excerpt": lambda: self.excerpt,
+            "image_url": lambda: self.image_url,
+            "created_at": lambda: self.created_at,
+            "author_id": lambda: self.author_id,
+            "author": lambda: self.author_name,
+            "likes_count": lambda: self.likes_count,
+            "dislikes_count": lambda: self.dislikes_count,
+            "comments_count": lambda: self.comments_count,
         }
+        # Only the requested fields are evaluated, so deferred columns and
+        # relationships that were not asked for are never loaded
+        return {field: getters[field]() for field in fields}
 
 class PostLike(db.Model):
     __tablename__ = "post_likes"
@@ -62,7 +230,8 @@ class PostLike(db.Model):
     is_like = db.Column(db.Boolean, nullable=False)  # True for like, False for dislike
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey("blog_posts.id"), nullable=False)
+    # The unique (user_id, post_id) index below cannot serve lookups by post alone
+    post_id = db.Column(db.Integer, db.ForeignKey("blog_posts.id"), nullable=False, index=True)
     
     user = db.relationship("User", back_populates="post_likes")
     post = db.relationship("BlogPost", back_populates="likes")
@@ -74,27 +243,69 @@ class Comment(db.Model):
     __tablename__ = "comments"
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    # Set in Python, like BlogPost.created_at, for the keyset cursor of the comment pages
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey("blog_posts.id"), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    likes_count = counter_column()
+    dislikes_count = counter_column()
+
+    # Comments are always read per post, so post_id leads: this one index covers
+    # lookups by post (including cascade deletes) and the new/old orderings
+    __table_args__ = (
+        db.Index("ix_comments_post_id_created_at_id", "post_id", "created_at", "id"),
+        # The top ordering, most liked first
+        db.Index("ix_comments_post_id_likes_count_id", "post_id", "likes_count", "id"),
+    )
     
     user = db.relationship("User", back_populates="comments")
     post = db.relationship("BlogPost", back_populates="comments")
     likes = db.relationship("CommentLike", back_populates="comment", cascade="all, delete-orphan")
 
+    # Filled in by Comment.with_author(), None when the comment was loaded without it
+    author_username = db.query_expression()
+    # Filled in by Comment.with_viewer_reaction(): the viewer's is_like, None if they did not react
+    viewer_reaction = db.query_expression()
+
+    @classmethod
+    def with_author(cls, query):
+        """Load the commenter's username in the same statement as the comments."""
+        return query.options(
+            db.with_expression(
+                cls.author_username,
+                db.select(User.username).where(User.id == cls.user_id).scalar_subquery()
+            )
+        )
+
+    @classmethod
+    def with_viewer_reaction(cls, query, user_id):
+        """Load `user_id`'s like/dislike of each comment in the same statement as the comments."""
+        return query.options(
+            db.with_expression(
+                cls.viewer_reaction,
+                db.select(CommentLike.is_like)
+                .where(CommentLike.comment_id == cls.id, CommentLike.user_id == user_id)
+                .scalar_subquery()
+            )
+        )
+
+    @property
+    def author_name(self):
+        if self.author_username is not None:
+            return self.author_username
+        return self.user.username
+
     def serialize(self):
-        likes_count = sum(1 for like in self.likes if like.is_like)
-        dislikes_count = sum(1 for like in self.likes if not like.is_like)
-        
         return {
             "id": self.id,
             "content": self.content,
-            "created_at": self.created_at.isoformat(),
+            "created_at": self.created_at,
             "user_id": self.user_id,
             "post_id": self.post_id,
-            "author": self.user.username,
-            "likes_count": likes_count,
-            "dislikes_count": dislikes_count
+            "author": self.author_name,
+            "likes_count": self.likes_count,
+            "dislikes_count": self.dislikes_count
         }
 
 class CommentLike(db.Model):
@@ -103,10 +314,16 @@ class CommentLike(db.Model):
     is_like = db.Column(db.Boolean, nullable=False)  # True for like, False for dislike
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    comment_id = db.Column(db.Integer, db.ForeignKey("comments.id"), nullable=False)
+    comment_id = db.Column(db.Integer, db.ForeignKey("comments.id"), nullable=False, index=True)
     
     user = db.relationship("User", back_populates="comment_likes")
     comment = db.relationship("Comment", back_populates="likes")
     
     # Ensure one user can only like/dislike a comment once
-    __table_args__ = (db.UniqueConstraint('user_id', 'comment_id', name='unique_user_comment_like'),)
\ No newline at end of file
+    __table_args__ = (db.UniqueConstraint('user_id', 'comment_id', name='unique_user_comment_like'),)
+
+class RankingState(db.Model):
+    """How far "flask rank-posts" got: posts updated after scored_until are scored on its next run."""
+    __tablename__ = "ranking_state"
+    name = db.Column(db.String(50), primary_key=True)
+    scored_until = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,112 @@
+"""
+The hot and top feeds (GET /api/blog_posts?sort=hot|top) read precomputed scores.
+
+Each post stores two scores, computed from its counters by hot_score() and top_score() in
+models.py. Both are indexed with the id, like created_at for the newest-first feed, so a
+ranked page is an index range scan under the keyset cursor whatever the number of posts.
+- top: likes - dislikes + 2 x comments.
+- hot: the log of that score plus the post's age in units of HOT_DECAY_SECONDS. A newer post
+  outranks an older one with the same score, so the ranking decays over time without the
+  scores having to be recomputed as posts age.
+
+A score only changes when a post's counters do, and every counter update bumps the post's
+updated_at. So rank_posts() only has to score the posts updated since its previous run. It
+walks them through the (updated_at, id) index in batches, writes the scores that changed
+without touching updated_at, and remembers where it got to in ranking_state. The first run
+scores every post.
+
+"flask rank-posts" runs it once, "flask rank-posts --every 60" keeps running it (the
+`ranker` process in the Procfile). New posts get their hot score on insert. Likes and
+comments move a post in the ranked feeds at the next run.
+
+Both run in a process of their own, whose invalidation of the cached feed pages only reaches
+the web workers through a shared cache: RESPONSE_CACHE_URL must point to the workers' Redis
+(or be "off" when they cache nothing). With the per-process "memory" cache the command
+refuses to run, unless told that pages up to RESPONSE_CACHE_TTL seconds stale are fine.
+"""
+import time
+from datetime import datetime, timedelta
+from api.models import db, BlogPost, RankingState, hot_score, top_score
+from api.cache import response_cache, MemoryBackend
+
+STATE = "blog_posts"
+# Transactions commit after setting updated_at: rows updated this long before a run
+# started are scored again by the next one, in case they were not visible yet
+OVERLAP = timedelta(seconds=60)
+
+
+def check_shared_cache():
+    """Raise RuntimeError when rank_posts() could not invalidate the web workers' cached feeds."""
+    if isinstance(response_cache.backend, MemoryBackend):
+        raise RuntimeError(
+            "The ranker cannot invalidate the web workers' cached feed pages through the per-process "
+            "memory cache. Set RESPONSE_CACHE_URL to the Redis the workers use (or to off when they "
+            "cache nothing), or pass --allow-stale-cache to accept pages up to RESPONSE_CACHE_TTL "
+            "seconds stale."
+        )
+
+
+def rank_posts(full=False, batch_size=5000, log=None):
+    """Score the posts updated since the previous run (every post with `full`). Returns counts."""
+    started = datetime.utcnow()
+    state = db.session.get(RankingState, STATE)
+    since = None if full or state is None else state.scored_until
+
+    table = BlogPost.__table__
+    update = table.update().where(table.c.id == db.bindparam("post_id")).values(
+        hot_score=db.bindparam("hot"),
+        top_score=db.bindparam("top"),
+        # Keeps updated_at (and the ETags it drives): only the ranking changes
+        updated_at=table.c.updated_at,
+    )
+    counts = {"scanned": 0, "rescored": 0}
+    last = None
+    while True:
+        query = db.session.query(
+            BlogPost.id, BlogPost.updated_at, BlogPost.created_at, BlogPost.likes_count,
+            BlogPost.dislikes_count, BlogPost.comments_count, BlogPost.hot_score, BlogPost.top_score,
+        ).order_by(BlogPost.updated_at, BlogPost.id)
+        if last is not None:
+            query = query.filter(db.tuple_(BlogPost.updated_at, BlogPost.id) > last)
+        elif since is not None:
+            query = query.filter(BlogPost.updated_at > since)
+        rows = query.limit(batch_size).all()
+        if not rows:
+            break
+
+        changes = []
+        for row in rows:
+            scores = {
+                "hot": hot_score(row.likes_count, row.dislikes_count, row.comments_count, row.created_at or started),
+                "top": top_score(row.likes_count, row.dislikes_count, row.comments_count),
+            }
+            if (scores["hot"], scores["top"]) != (row.hot_score, row.top_score):
+                changes.append({"post_id": row.id, **scores})
+        if changes:
+            db.session.execute(update, changes)
+        db.session.commit()
+        counts["scanned"] += len(rows)
+        counts["rescored"] += len(changes)
+        last = (rows[-1].updated_at, rows[-1].id)
+        if log:
+            log(f"{counts['scanned']} posts scanned, {counts['rescored']} rescored")
+
+    if state is None:
+        state = RankingState(name=STATE, scored_until=started)
+        db.session.add(state)
+    state.scored_until = started - OVERLAP
+    db.session.commit()
+    if counts["rescored"]:
+        response_cache.invalidate("feed")
+    return counts
+
+
+def run_ranker(every, full=False, batch_size=5000, log=print):
+    """rank_posts() every `every` seconds, the first run with `full`."""
+    while True:
+        start = time.perf_counter()
+        counts = rank_posts(full=full, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        log(f"{counts['scanned']} posts scanned, {counts['rescored']} rescored in {elapsed:.2f}s")
+        full = False
+        time.sleep(max(0, every - elapsed))
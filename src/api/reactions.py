@@ -0,0 +1,257 @@
+"""
+Likes/dislikes written without read-modify-write races.
+
+toggle_reaction() backs the single like routes. The batch endpoint
+(POST /api/reactions/batch) uses apply_reactions() and add_comments(). With
+REACTION_BUFFER_URL set, the like routes buffer their toggles instead and
+flush_reactions() writes them (see api/write_behind.py).
+
+A batch is applied with a fixed number of statements per target type, whatever its size:
+one SELECT for the targets, one for the user's current reactions, one upsert
+(INSERT ... ON CONFLICT DO UPDATE) for new and changed reactions, one DELETE for removed
+ones and one UPDATE for the counters, all in the caller's transaction.
+
+Batch items *set* a reaction (is_like true/false, or null to remove it) instead of toggling
+it like the single like routes, so a batch can be retried without flipping anything back.
+"""
+from sqlalchemy.dialects import postgresql, sqlite
+from api.models import db, User, BlogPost, PostLike, Comment, CommentLike, reaction_deltas, adjust_counters_many
+
+
+class ReactionTarget:
+    def __init__(self, model, like_model, key):
+        self.model = model
+        self.like_model = like_model
+        self.key = key
+
+    def load_targets(self, ids):
+        """{id: post_id of the target} for the ids that exist, post_id is what cache invalidation needs."""
+        post_id = self.model.id if self.model is BlogPost else self.model.post_id
+        rows = db.session.query(self.model.id, post_id).filter(self.model.id.in_(ids))
+        return {row[0]: row[1] for row in rows}
+
+    def load_reactions(self, user_id, ids):
+        key = getattr(self.like_model, self.key)
+        query = db.session.query(key, self.like_model.is_like).filter(
+            self.like_model.user_id == user_id, key.in_(ids)
+        )
+        # Locks the user's rows on Postgres so a concurrent batch cannot change them
+        # under our counter deltas (SQLite already serializes writers)
+        return dict(query.with_for_update().all())
+
+
+TARGETS = {
+    "post": ReactionTarget(BlogPost, PostLike, "post_id"),
+    "comment": ReactionTarget(Comment, CommentLike, "comment_id"),
+}
+
+
+def dialect_insert(like_model, rows):
+    # Only the Postgres and SQLite INSERTs know ON CONFLICT
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(db.engine.dialect.name)
+    if dialect is None:
+        raise NotImplementedError(f"No upsert for the {db.engine.dialect.name} dialect")
+    return dialect.insert(like_model.__table__).values(rows)
+
+
+def upsert(like_model, key, rows):
+    """INSERT ... ON CONFLICT (user_id, key) DO UPDATE SET is_like, for Postgres and SQLite."""
+    statement = dialect_insert(like_model, rows)
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", key],
+        set_={"is_like": statement.excluded.is_like}
+    )
+
+
+def is_id(value):
+    # JSON true/false are Python bools, which isinstance(value, int) would take for 1 and 0
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+TOGGLE_ATTEMPTS = 3
+
+
+def toggle_reaction(target_type, user_id, target_id, is_like):
+    """
+    Toggle `user_id`'s reaction: none inserts it, the same value removes it and the
+    opposite value flips it. Returns (old, new) is_like values for reaction_deltas().
+
+    There is no SELECT first, but it is not a single statement either: up to three
+    conditional statements run in turn, and the first one that affects a row tells which
+    case applied:
+    1. INSERT ... ON CONFLICT DO NOTHING: a row was inserted, there was no reaction
+    2. DELETE ... WHERE is_like = value: a row was deleted, it had the same value
+    3. UPDATE ... SET is_like = value WHERE is_like <> value: a row was flipped
+    A concurrent request can change the row between two steps so that none of them
+    matches; the sequence is then simply run again. Nothing ever raises IntegrityError.
+    """
+    target = TARGETS[target_type]
+    like_model = target.like_model
+    key = getattr(like_model, target.key)
+    mine = db.session.query(like_model).filter(like_model.user_id == user_id, key == target_id)
+
+    for _ in range(TOGGLE_ATTEMPTS):
+        row = {"user_id": user_id, target.key: target_id, "is_like": is_like}
+        inserted = db.session.execute(
+            dialect_insert(like_model, [row]).on_conflict_do_nothing(index_elements=["user_id", target.key])
+        )
+        if inserted.rowcount:
+            return None, is_like
+        if mine.filter(like_model.is_like == is_like).delete(synchronize_session=False):
+            return is_like, None
+        if mine.filter(like_model.is_like != is_like).update({"is_like": is_like}, synchronize_session=False):
+            return not is_like, is_like
+    raise RuntimeError(f"Reaction of user {user_id} on {target_type} {target_id} kept changing, giving up")
+
+
+def apply_reactions(user_id, items):
+    """
+    Set `user_id`'s reaction on every {"type", "id", "is_like"} item. Returns one result per
+    item, in order, and the cache namespaces to invalidate once the transaction commits.
+    """
+    results = [None] * len(items)
+    # The last item wins when the batch names the same target twice
+    wanted = {name: {} for name in TARGETS}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {"type": None, "id": None, "status": "invalid"}
+            continue
+        target_type, target_id, is_like = item.get("type"), item.get("id"), item.get("is_like")
+        if target_type not in TARGETS or not is_id(target_id) or not (is_like is None or isinstance(is_like, bool)):
+            results[index] = {"type": target_type, "id": target_id, "status": "invalid"}
+            continue
+        if target_id in wanted[target_type]:
+            earlier = wanted[target_type][target_id][0]
+            results[earlier] = {"type": target_type, "id": target_id, "status": "superseded"}
+        wanted[target_type][target_id] = (index, is_like)
+
+    namespaces = set()
+    for target_type, target in TARGETS.items():
+        if not wanted[target_type]:
+            continue
+        ids = list(wanted[target_type])
+        post_ids = target.load_targets(ids)
+        current = target.load_reactions(user_id, ids)
+
+        upserts, removals, deltas = [], [], {}
+        for target_id, (index, new) in wanted[target_type].items():
+            old = current.get(target_id)
+            if target_id not in post_ids:
+                status = "not_found"
+            elif old == new:
+                status = "unchanged"
+            else:
+                status = "removed" if new is None else "created" if old is None else "changed"
+                if new is None:
+                    removals.append(target_id)
+                else:
+                    upserts.append({"user_id": user_id, target.key: target_id, "is_like": new})
+                deltas[target_id] = reaction_deltas(old, new)
+                namespaces.update(invalidated_by(target_type, target_id, post_ids[target_id]))
+            results[index] = {"type": target_type, "id": target_id, "status": status}
+
+        key = getattr(target.like_model, target.key)
+        if upserts:
+            db.session.execute(upsert(target.like_model, target.key, upserts))
+        if removals:
+            db.session.query(target.like_model).filter(
+                target.like_model.user_id == user_id, key.in_(removals)
+            ).delete(synchronize_session=False)
+        adjust_counters_many(target.model, deltas)
+    return results, namespaces
+
+
+def invalidated_by(target_type, target_id, post_id):
+    if target_type == "post":
+        return {"feed", f"post:{post_id}"}
+    return {f"comments:{post_id}"}
+
+
+def flush_reactions(pending):
+    """
+    Write buffered toggles, {(target_type, user_id, target_id): toggles} where `toggles(old)`
+    gives the reaction after them (see api/write_behind.py). The users' current reactions are
+    read and locked, then written like apply_reactions() does, for every user at once.
+    Toggles on targets or by users that no longer exist are dropped. Returns the number of
+    reactions changed and the cache namespaces to invalidate once the transaction commits.
+    """
+    user_ids = {user_id for _, user_id, _ in pending}
+    users = {row.id for row in db.session.query(User.id).filter(User.id.in_(user_ids))} if user_ids else set()
+    changed, namespaces = 0, set()
+    for target_type, target in TARGETS.items():
+        toggles = {
+            (user_id, target_id): toggle for (kind, user_id, target_id), toggle in pending.items()
+            if kind == target_type and user_id in users
+        }
+        if not toggles:
+            continue
+        like_model = target.like_model
+        key = getattr(like_model, target.key)
+        post_ids = target.load_targets({target_id for _, target_id in toggles})
+        current = db.session.query(like_model.user_id, key, like_model.is_like).filter(
+            key.in_(list(post_ids)), like_model.user_id.in_({user_id for user_id, _ in toggles})
+        )
+        current = {(row[0], row[1]): row[2] for row in current.with_for_update()}
+
+        upserts, removals, deltas = [], {}, {}
+        for (user_id, target_id), toggle in toggles.items():
+            if target_id not in post_ids:
+                continue
+            old = current.get((user_id, target_id))
+            new = toggle(old)
+            if old == new:
+                continue
+            if new is None:
+                removals.setdefault(target_id, []).append(user_id)
+            else:
+                upserts.append({"user_id": user_id, target.key: target_id, "is_like": new})
+            target_deltas = deltas.setdefault(target_id, {"likes_count": 0, "dislikes_count": 0})
+            for name, delta in reaction_deltas(old, new).items():
+                target_deltas[name] += delta
+            namespaces.update(invalidated_by(target_type, target_id, post_ids[target_id]))
+            changed += 1
+
+        if upserts:
+            db.session.execute(upsert(like_model, target.key, upserts))
+        for target_id, removed in removals.items():
+            db.session.query(like_model).filter(key == target_id, like_model.user_id.in_(removed)).delete(
+                synchronize_session=False
+            )
+        adjust_counters_many(target.model, deltas)
+    return changed, namespaces
+
+
+def add_comments(user_id, items):
+    """Add every {"post_id", "content"} item as a comment. Same return values as apply_reactions."""
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {"post_id": None, "status": "invalid"}
+            continue
+        post_id, content = item.get("post_id"), item.get("content")
+        if not is_id(post_id) or not isinstance(content, str) or not content.strip():
+            results[index] = {"post_id": post_id, "status": "invalid"}
+        else:
+            valid.append((index, post_id, content))
+
+    existing = {row.id for row in db.session.query(BlogPost.id).filter(BlogPost.id.in_({item[1] for item in valid}))}
+    comments, added = [], {}
+    for index, post_id, content in valid:
+        if post_id not in existing:
+            results[index] = {"post_id": post_id, "status": "not_found"}
+            continue
+        comment = Comment(content=content, user_id=user_id, post_id=post_id)
+        comments.append((index, comment))
+        added[post_id] = added.get(post_id, 0) + 1
+
+    db.session.add_all([comment for _, comment in comments])
+    db.session.flush()
+    for index, comment in comments:
+        results[index] = {"post_id": comment.post_id, "status": "created", "id": comment.id}
+    adjust_counters_many(BlogPost, {post_id: {"comments_count": count} for post_id, count in added.items()})
+
+    namespaces = set()
+    for post_id in added:
+        namespaces.update({"feed", f"post:{post_id}", f"comments:{post_id}"})
+    return results, namespaces
@@ -1,12 +1,22 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
-from flask import Flask, request, jsonify, url_for, Blueprint
-from api.models import db, User, BlogPost, PostLike, Comment, CommentLike
-from api.utils import generate_sitemap, APIException
+from flask import Flask, request, jsonify, url_for, Blueprint, current_app
+from api.models import db, User, BlogPost, Comment, reaction_deltas, reaction_status, adjust_counters, normalize_identifier
+from api.cache import response_cache
+from api.conditional import ResourceVersion
+from api.instrumentation import query_budget
+from api.database import read_replica, database_stats
+from api.security import password_hasher, HashingBusy
+from api.reactions import apply_reactions, add_comments, toggle_reaction
+from api.write_behind import reaction_buffer
+from api.auth import authentication, current_user_id, request_user_id
+from api.availability import availability_filter
+from api.search import search, SEARCHABLE
+from api.utils import generate_sitemap, APIException, encode_cursor, decode_cursor, parse_limit, parse_fields
 from flask_cors import CORS
+from sqlalchemy.exc import IntegrityError
 
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from datetime import datetime, timedelta
 
@@ -16,6 +26,12 @@ api = Blueprint('api', __name__)
 CORS(api)
 
 
+@api.errorhandler(HashingBusy)
+def handle_hashing_busy(error):
+    # Too many logins/signups waiting on password hashing, see api/security.py
+    return jsonify({"message": "Too many login attempts right now, please retry"}), 503, {"Retry-After": "1"}
+
+
 @api.route('/testing', methods=['POST', 'GET'])
 def handle_hello():
 
@@ -30,68 +46,86 @@ def handle_hello():
 # ----------------------------- authentication routes -----------------------------
 # ----------------------------- authentication routes -----------------------------
 @api.route('/check-availability', methods=['POST'])
+@query_budget(3)
 def check_availability():
     field = request.json.get('field')
     value = request.json.get('value')
 
     if field not in ['username', 'email']:
         return jsonify({"error": "Invalid field"}), 400
-    
-    # Use getattr to dynamically access either User.username or User.email depending on which field was passed
-    user = User.query.filter(getattr(User, field) == value).first()
+    if not isinstance(value, str):
+        return jsonify({"error": "Invalid value"}), 400
 
-    # Return true if no user was found (meaning the username/email is available)
-    return jsonify({"isAvailable": user is None}), 200
+    # Most names are answered by the Bloom filter without a query, see api/availability.py.
+    # Its first check in a worker, and its rebuilds, add the statements that build it.
+    return jsonify({"isAvailable": availability_filter.is_available(field, normalize_identifier(value))}), 200
 
 @api.route('/signup', methods=['POST'])
+@query_budget(1)
 def signup_user():
     email = request.json.get('email')
     username = request.json.get('username')
     password = request.json.get('password')
+    if not all(isinstance(value, str) and value.strip() for value in (email, username, password)):
+        return jsonify({"error": "email, username and password are required"}), 400
 
-    existing_user = User.query.filter_by(email = email).one_or_none()
-    if existing_user:
-        return jsonify({'error': 'There is already an account associated with this email address.'}), 400
-    if User.query.filter_by(username=username).first():
-        return jsonify({"error": "Username must be unique, please try another username."}), 400
-    
     new_user = User(
         email=email, 
         username=username,
-        password=generate_password_hash(password), 
+        password=password_hasher.hash(password), 
         is_active=False,
     )
 
     db.session.add(new_user)
-    db.session.commit()
+    try:
+        # A single INSERT: the unique indexes on the normalized email and username refuse taken ones
+        db.session.flush()
+    except IntegrityError as error:
+        db.session.rollback()
+        # The first line names the index (the next ones can quote the values)
+        if "email" in str(error.orig).splitlines()[0]:
+            return jsonify({'error': 'There is already an account associated with this email address.'}), 400
+        return jsonify({"error": "Username must be unique, please try another username."}), 400
 
+    # Serialized before the commit expires the user, which would load it again
     response_body = {
         "message": "User successfully created",
         "user": new_user.serialize() 
     }
+    names = new_user.email_normalized, new_user.username_normalized
+    db.session.commit()
+    availability_filter.added(*names)
 
     return jsonify(response_body), 201
 
 @api.route("/login", methods=["POST"])
+@query_budget(3)
 def login_user():
     login_identifier = request.json.get("loginIdentifier")
     password = request.json.get("password")
 
+    # Case-insensitive, through the indexes on the normalized email and username
+    identifier = normalize_identifier(login_identifier if isinstance(login_identifier, str) else "")
     user = User.query.filter(
         db.or_(
-            User.email == login_identifier,
-            User.username == login_identifier
+            User.email_normalized == identifier,
+            User.username_normalized == identifier
         )
     ).one_or_none()
     if user is None:
         return jsonify({"message": "No account found with this email/username"}), 404
     
-    if not check_password_hash(user.password, password):
+    if not password_hasher.verify(user.password, password):
         return jsonify({"message": "Incorrect password"}), 401
-    
 
+    # Hashes made with older PASSWORD_HASH_METHOD parameters are upgraded while the password is at hand
+    if password_hasher.needs_rehash(user.password):
+        user.password = password_hasher.hash(password)
+        db.session.commit()
+
+    # The token is what authenticates the user's requests from now on, see api/auth.py
     access_token = create_access_token(
-        identity = user.id,
+        identity = str(user.id),
         expires_delta=timedelta(hours=12)
     )
     return jsonify({
@@ -99,25 +133,170 @@ def login_user():
         "userData": user.serialize()
     }), 200
 
+@api.route("/logout", methods=["POST"])
+@jwt_required()
+@query_budget(1)
+def logout_user():
+    # The token is refused from now until it expires
+    authentication.revoke(get_jwt())
+    return jsonify({"message": "Logged out"}), 200
+
 
 # ----------------------------- blog routes -----------------------------
 # ----------------------------- blog routes -----------------------------
 # ----------------------------- blog routes -----------------------------
 # ----------------------------- blog routes -----------------------------
+POSTS_PAGE_SIZE = 20
+POSTS_MAX_PAGE_SIZE = 100
+# The column each feed is ordered by, newest/highest first, with the id to break ties
+FEED_SORTS = {"new": BlogPost.created_at, "hot": BlogPost.hot_score, "top": BlogPost.top_score}
+
 @api.route("/blog_posts", methods=["GET"])
+@read_replica
+@query_budget(2)
+@response_cache.cached("feed")
 def get_all_posts():
-    posts = BlogPost.query.all()
-    return jsonify([post.serialize() for post in posts]), 200
+    # Keyset pagination, newest first: ?limit=20&cursor=<next_cursor from the previous page>
+    # ?sort=hot|top ranks by the scores "flask rank-posts" stores on the posts (see api/rankings.py)
+    sort = request.args.get("sort", "new")
+    if sort not in FEED_SORTS:
+        raise APIException(f"sort must be one of: {', '.join(FEED_SORTS)}", status_code=400)
+    rank = FEED_SORTS[sort]
+    limit = parse_limit(request.args.get("limit"), POSTS_PAGE_SIZE, POSTS_MAX_PAGE_SIZE)
+    # Sparse responses: ?fields=id,title,excerpt or ?fields=summary (everything but the full content)
+    fields = parse_fields(
+        request.args.get("fields"),
+        BlogPost.FIELDS,
+        presets={"summary": BlogPost.SUMMARY_FIELDS}
+    ) or BlogPost.DEFAULT_FIELDS
+
+    query = BlogPost.query.order_by(rank.desc(), BlogPost.id.desc())
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, 2)
+        if isinstance(last_id, bool) or not isinstance(last_id, int):
+            raise APIException("Invalid cursor", status_code=400)
+        if sort == "new":
+            try:
+                last_value = datetime.fromisoformat(last_value)
+            except (TypeError, ValueError):
+                raise APIException("Invalid cursor", status_code=400)
+        elif isinstance(last_value, bool) or not isinstance(last_value, (int, float)):
+            raise APIException("Invalid cursor", status_code=400)
+        query = query.filter(db.tuple_(rank, BlogPost.id) < (last_value, last_id))
+    # Fetch one extra row to know whether there is a next page without counting
+    query = query.limit(limit + 1)
+
+    # Conditional GET: compare the page's row versions before loading the posts themselves
+    version = ResourceVersion(query.with_entities(BlogPost.id, BlogPost.updated_at).all())
+    if version.is_fresh():
+        return version.not_modified()
+
+    query = BlogPost.with_author(query)
+    if "content" not in fields:
+        query = query.options(db.defer(BlogPost.content))
+    if "excerpt" in fields:
+        query = query.options(db.undefer(BlogPost.excerpt_source))
+    posts = query.all()
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        last_value = getattr(posts[-1], rank.key)
+        next_cursor = encode_cursor(last_value.isoformat() if sort == "new" else last_value, posts[-1].id)
+
+    return version.stamp(jsonify({
+        "posts": [post.serialize(fields) for post in posts],
+        "next_cursor": next_cursor
+    })), 200
 
 @api.route("/blog_posts/<int:id>", methods=["GET"])
+@read_replica
+@query_budget(2)
+@response_cache.cached("post:{id}")
 def get_post(id):
-    post = BlogPost.query.get_or_404(id)
-    return jsonify(post.serialize()), 200
+    row = db.session.query(BlogPost.id, BlogPost.updated_at).filter_by(id=id).first_or_404()
+    version = ResourceVersion([row], single=True)
+    if version.is_fresh():
+        return version.not_modified()
+
+    post = BlogPost.with_author(BlogPost.query).filter_by(id=id).first_or_404()
+    return version.stamp(jsonify(post.serialize())), 200
+
+
+DETAIL_COMMENTS_PAGE_SIZE = 20
+DETAIL_COMMENTS_MAX_PAGE_SIZE = 100
+COMMENTS_PAGE_SIZE = 20
+COMMENTS_MAX_PAGE_SIZE = 100
+# The column each comment ordering sorts by, with the id to break ties, and whether it is descending
+COMMENT_SORTS = {
+    "old": (Comment.created_at, False),
+    "new": (Comment.created_at, True),
+    "top": (Comment.likes_count, True),
+}
+
+def comment_page(query, sort, limit, cursor=None):
+    """Order `query` by `sort`, start after `cursor` and fetch one extra row to know whether there is a next page."""
+    column, descending = COMMENT_SORTS[sort]
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, 2)
+        if isinstance(last_id, bool) or not isinstance(last_id, int):
+            raise APIException("Invalid cursor", status_code=400)
+        if column is Comment.created_at:
+            try:
+                last_value = datetime.fromisoformat(last_value)
+            except (TypeError, ValueError):
+                raise APIException("Invalid cursor", status_code=400)
+        elif isinstance(last_value, bool) or not isinstance(last_value, int):
+            raise APIException("Invalid cursor", status_code=400)
+        position = db.tuple_(column, Comment.id)
+        query = query.filter(position < (last_value, last_id) if descending else position > (last_value, last_id))
+    order = (column.desc(), Comment.id.desc()) if descending else (column, Comment.id)
+    return query.order_by(*order).limit(limit + 1)
+
+def comment_cursor(comment, sort):
+    value = getattr(comment, COMMENT_SORTS[sort][0].key)
+    return encode_cursor(value.isoformat() if sort != "top" else value, comment.id)
+
+@api.route("/blog_posts/<int:id>/detail", methods=["GET"])
+@read_replica
+@query_budget(3)
+@response_cache.cached("post:{id}", "comments:{id}", vary_user=True)
+def get_post_detail(id):
+    # Everything the post page needs in one call: the post, its oldest comments and, when a
+    # valid token is sent, that user's own reactions to them. Always two statements, plus the
+    # user lookup when the user cache misses (see api/auth.py).
+    # The next comments come from GET /blog_posts/<id>/comments?cursor=<comments_next_cursor>.
+    limit = parse_limit(request.args.get("comments_limit"), DETAIL_COMMENTS_PAGE_SIZE, DETAIL_COMMENTS_MAX_PAGE_SIZE)
+    viewer_id = request_user_id()
+
+    post_query = BlogPost.with_author(BlogPost.query.filter_by(id=id))
+    comments_query = Comment.with_author(Comment.query.filter_by(post_id=id))
+    if viewer_id:
+        post_query = BlogPost.with_viewer_reaction(post_query, viewer_id)
+        comments_query = Comment.with_viewer_reaction(comments_query, viewer_id)
+
+    post = post_query.first_or_404()
+    comments = comment_page(comments_query, "old", limit).all()
+    has_more = len(comments) > limit
+    comments = comments[:limit]
+
+    return jsonify({
+        "post": {**post.serialize(), "userLikeStatus": reaction_status(post.viewer_reaction)},
+        "comments": [
+            {**comment.serialize(), "userLikeStatus": reaction_status(comment.viewer_reaction)}
+            for comment in comments
+        ],
+        "comments_count": post.comments_count,
+        "has_more_comments": has_more,
+        "comments_next_cursor": comment_cursor(comments[-1], "old") if has_more else None
+    }), 200
 
 @api.route("/blog_posts", methods=["POST"])
+@jwt_required()
 def create_post():
     data = request.json
-    author = User.query.get(data["author_id"])
+    author = User.query.get(current_user_id())
     if not author:
         return jsonify({"error": "Author not found"}), 404
     new_post = BlogPost(
@@ -128,15 +307,14 @@ def create_post():
     )
     db.session.add(new_post)
     db.session.commit()
+    response_cache.invalidate("feed")
     return jsonify(new_post.serialize()), 201
 
 @api.route("/blog_posts/<int:blog_id>/edit", methods=["PUT"])
+@jwt_required()
 def edit_blog(blog_id):
-    # Get the user ID from the request headers
-    user_id = request.headers.get('userId')
-
-    if not user_id:
-        return jsonify({"message": "Unauthorized: Missing userId"}), 401
+    # The user the token was issued to
+    user_id = current_user_id()
 
     try:
         # Find the blog by its ID
@@ -146,7 +324,7 @@ def edit_blog(blog_id):
             return jsonify({"message": "Blog not found"}), 404
 
         # Check if the logged-in user is the author of the blog
-        if blog.author_id != int(user_id):
+        if blog.author_id != user_id:
             return jsonify({"message": "Unauthorized: You are not the author of this blog"}), 403
 
         # Get the data from the request
@@ -162,6 +340,7 @@ def edit_blog(blog_id):
 
         # Save the changes
         db.session.commit()
+        response_cache.invalidate("feed", f"post:{blog_id}")
 
         return jsonify({
             "message": "Blog updated successfully",
@@ -173,12 +352,10 @@ def edit_blog(blog_id):
         return jsonify({"error": str(e)}), 500
 
 @api.route('/delete_blog/<int:blog_id>', methods=['DELETE'])
+@jwt_required()
 def delete_blog(blog_id):
-    # Get the user ID from the request headers or session
-    user_id = request.headers.get('userId')  # This should match `store.userId` in the frontend
-
-    if not user_id:
-        return jsonify({"message": "Unauthorized: Missing userId"}), 401
+    # The user the token was issued to
+    user_id = current_user_id()
 
     try:
         # Find the blog by its ID
@@ -188,12 +365,13 @@ def delete_blog(blog_id):
             return jsonify({"message": "Blog not found"}), 404
 
         # Check if the logged-in user is the author of the blog
-        if blog.author_id != int(user_id):
+        if blog.author_id != user_id:
             return jsonify({"message": "Unauthorized: You are not the author of this blog"}), 403
 
         # If the user is the author, delete the blog
         db.session.delete(blog)
         db.session.commit()
+        response_cache.invalidate("feed", f"post:{blog_id}", f"comments:{blog_id}")
 
         return jsonify({"message": "Blog deleted successfully"}), 200
 
@@ -202,68 +380,107 @@ def delete_blog(blog_id):
         return jsonify({"error": str(e)}), 500
     
 @api.route("/blog_posts/<int:post_id>/like", methods=["POST"])
+@jwt_required()
+@query_budget(6)
 def like_post(post_id):
-    if not request.headers.get('userId'):
-        return jsonify({"error": "Unauthorized"}), 401
-        
-    data = request.json
-    user_id = request.headers.get('userId')
-    
-    existing_like = PostLike.query.filter_by(
-        user_id=user_id,
-        post_id=post_id
-    ).first()
-    
+    user_id = current_user_id()
+    is_like = request.json.get("is_like")
+    if not isinstance(is_like, bool):
+        return jsonify({"error": "is_like must be true or false"}), 400
+
+    # Checked before buffering too: a 202 for a post that does not exist would be a lie
+    if db.session.query(BlogPost.id).filter_by(id=post_id).scalar() is None:
+        return jsonify({"message": "Blog not found"}), 404
+
+    if reaction_buffer.enabled:
+        # Written by the next flush, see api/write_behind.py
+        reaction_buffer.toggle("post", user_id, post_id, is_like)
+        return jsonify({"message": "Accepted"}), 202
+
     try:
-        if existing_like:
-            if existing_like.is_like == data["is_like"]:
-                db.session.delete(existing_like)
-            else:
-                existing_like.is_like = data["is_like"]
-        else:
-            new_like = PostLike(
-                user_id=user_id,
-                post_id=post_id,
-                is_like=data["is_like"]
-            )
-            db.session.add(new_like)
-        
+        # Atomic toggle without a SELECT first, see api/reactions.py
+        old_value, new_value = toggle_reaction("post", user_id, post_id, is_like)
+        # Counters change in the same transaction as the like row itself
+        adjust_counters(BlogPost, post_id, **reaction_deltas(old_value, new_value))
         db.session.commit()
+        response_cache.invalidate("feed", f"post:{post_id}")
         return jsonify({"message": "Success"}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 @api.route("/blog_posts/<int:post_id>/comments", methods=["GET"])
+@read_replica
+@query_budget(4)
+@response_cache.cached("comments:{post_id}", vary_user=True)
 def get_comments(post_id):
-    comments = Comment.query.filter_by(post_id=post_id).all()
-    return jsonify([comment.serialize() for comment in comments]), 200
+    # Keyset pagination: ?sort=old|new|top&limit=20&cursor=<next_cursor from the previous page>
+    # old (the default) and new order by date, top by likes. The total is the post's counter,
+    # and a valid token adds that user's reaction to each comment (an expired one is ignored).
+    sort = request.args.get("sort", "old")
+    if sort not in COMMENT_SORTS:
+        raise APIException(f"sort must be one of: {', '.join(COMMENT_SORTS)}", status_code=400)
+    limit = parse_limit(request.args.get("limit"), COMMENTS_PAGE_SIZE, COMMENTS_MAX_PAGE_SIZE)
+    viewer_id = request_user_id()
+
+    post = db.session.query(BlogPost.comments_count, BlogPost.updated_at).filter_by(id=post_id).first()
+    if post is None:
+        return jsonify({"message": "Blog not found"}), 404
+    query = comment_page(Comment.query.filter_by(post_id=post_id), sort, limit, request.args.get("cursor"))
+
+    # The post's updated_at moves with its comments_count, which the body includes
+    version = ResourceVersion(
+        [(f"post{post_id}", post.updated_at), *query.with_entities(Comment.id, Comment.updated_at)], vary_user=True
+    )
+    if version.is_fresh():
+        return version.not_modified()
+
+    query = Comment.with_author(query)
+    if viewer_id:
+        query = Comment.with_viewer_reaction(query, viewer_id)
+    comments = query.all()
+    next_cursor = comment_cursor(comments[limit - 1], sort) if len(comments) > limit else None
+    return version.stamp(jsonify({
+        "comments": [
+            {**comment.serialize(), "userLikeStatus": reaction_status(comment.viewer_reaction)}
+            for comment in comments[:limit]
+        ],
+        "comments_count": post.comments_count,
+        "next_cursor": next_cursor
+    })), 200
 
 @api.route("/blog_posts/<int:post_id>/comments", methods=["POST"])
+@jwt_required()
+@query_budget(6)
 def add_comment(post_id):
-    if not request.headers.get('userId'):
-        return jsonify({"error": "Unauthorized"}), 401
-        
     data = request.json
-    user_id = request.headers.get('userId')
+    user_id = current_user_id()
+    content = data.get("content") if isinstance(data, dict) else None
+    if not isinstance(content, str) or not content.strip():
+        return jsonify({"error": "content is required"}), 400
+
+    # The counter update below matches no row for a missing post, the comment would be an orphan
+    if db.session.query(BlogPost.id).filter_by(id=post_id).scalar() is None:
+        return jsonify({"message": "Blog not found"}), 404
     
     new_comment = Comment(
-        content=data["content"],
+        content=content,
         user_id=user_id,
         post_id=post_id
     )
     
     db.session.add(new_comment)
+    adjust_counters(BlogPost, post_id, comments_count=1)
     db.session.commit()
+    response_cache.invalidate("feed", f"post:{post_id}", f"comments:{post_id}")
     
     return jsonify(new_comment.serialize()), 201
 
 @api.route("/comments/<int:comment_id>", methods=["DELETE"])
+@jwt_required()
+@query_budget(5)
 def delete_comment(comment_id):
-    user_id = request.headers.get('userId')
-    
-    if not user_id:
-        return jsonify({"message": "Unauthorized: Missing userId"}), 401
+    user_id = current_user_id()
         
     try:
         comment = Comment.query.get(comment_id)
@@ -271,11 +488,14 @@ def delete_comment(comment_id):
         if not comment:
             return jsonify({"message": "Comment not found"}), 404
             
-        if comment.user_id != int(user_id):
+        if comment.user_id != user_id:
             return jsonify({"message": "Unauthorized: You are not the author of this comment"}), 403
             
+        post_id = comment.post_id
         db.session.delete(comment)
+        adjust_counters(BlogPost, post_id, comments_count=-1)
         db.session.commit()
+        response_cache.invalidate("feed", f"post:{post_id}", f"comments:{post_id}")
         
         return jsonify({"message": "Comment deleted successfully"}), 200
         
@@ -284,31 +504,109 @@ def delete_comment(comment_id):
         return jsonify({"error": str(e)}), 500
 
 @api.route("/comments/<int:comment_id>/like", methods=["POST"])
+@jwt_required()
+@query_budget(6)
 def like_comment(comment_id):
-    if not request.headers.get('userId'):
-        return jsonify({"error": "Unauthorized"}), 401
-        
-    data = request.json
-    user_id = request.headers.get('userId')
-    
-    existing_like = CommentLike.query.filter_by(
-        user_id=user_id,
-        comment_id=comment_id
-    ).first()
-    
-    if existing_like:
-        if existing_like.is_like == data["is_like"]:
-            db.session.delete(existing_like)
-        else:
-            existing_like.is_like = data["is_like"]
-    else:
-        new_like = CommentLike(
-            user_id=user_id,
-            comment_id=comment_id,
-            is_like=data["is_like"]
-        )
-        db.session.add(new_like)
-    
-    db.session.commit()
-    return jsonify({"message": "Success"}), 200
+    user_id = current_user_id()
+    is_like = request.json.get("is_like")
+    if not isinstance(is_like, bool):
+        return jsonify({"error": "is_like must be true or false"}), 400
+
+    post_id = db.session.query(Comment.post_id).filter_by(id=comment_id).scalar()
+    if post_id is None:
+        return jsonify({"message": "Comment not found"}), 404
+
+    if reaction_buffer.enabled:
+        reaction_buffer.toggle("comment", user_id, comment_id, is_like)
+        return jsonify({"message": "Accepted"}), 202
+
+    try:
+        old_value, new_value = toggle_reaction("comment", user_id, comment_id, is_like)
+        adjust_counters(Comment, comment_id, **reaction_deltas(old_value, new_value))
+        db.session.commit()
+        response_cache.invalidate(f"comments:{post_id}")
+        return jsonify({"message": "Success"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+REACTIONS_MAX_BATCH = 500
+
+@api.route("/reactions/batch", methods=["POST"])
+@jwt_required()
+def batch_reactions():
+    # Many reactions and comments from one user in a single transaction, see api/reactions.py:
+    # {"reactions": [{"type": "post" | "comment", "id": 1, "is_like": true | false | null}],
+    #  "comments": [{"post_id": 1, "content": "..."}]}
+    user_id = current_user_id()
+
+    data = request.json or {}
+    if not isinstance(data, dict):
+        raise APIException("The body must be an object", status_code=400)
+    reactions = data.get("reactions") or []
+    comments = data.get("comments") or []
+    if not isinstance(reactions, list) or not isinstance(comments, list):
+        raise APIException("reactions and comments must be lists", status_code=400)
+    if len(reactions) + len(comments) > REACTIONS_MAX_BATCH:
+        raise APIException(f"A batch holds at most {REACTIONS_MAX_BATCH} items", status_code=400)
+
+    try:
+        reaction_results, reaction_namespaces = apply_reactions(user_id, reactions)
+        comment_results, comment_namespaces = add_comments(user_id, comments) if comments else ([], set())
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
 
+    response_cache.invalidate(*(reaction_namespaces | comment_namespaces))
+    return jsonify({"reactions": reaction_results, "comments": comment_results}), 200
+
+
+# ----------------------------- search routes -----------------------------
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+
+@api.route("/search", methods=["GET"])
+@read_replica
+@query_budget(1)
+def search_content():
+    # Ranked full-text search: ?q=repot fern&type=posts|comments&limit=20&cursor=<next_cursor>
+    text = (request.args.get("q") or "").strip()
+    if not text:
+        raise APIException("Missing search query q", status_code=400)
+    kind = request.args.get("type", "posts")
+    if kind not in SEARCHABLE:
+        raise APIException(f"type must be one of: {', '.join(SEARCHABLE)}", status_code=400)
+    limit = parse_limit(request.args.get("limit"), SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE)
+    offset = 0
+    cursor = request.args.get("cursor")
+    if cursor:
+        offset, = decode_cursor(cursor, 1)
+        if not isinstance(offset, int) or offset < 0:
+            raise APIException("Invalid cursor", status_code=400)
+
+    # Fetch one extra row to know whether there is a next page
+    results = search(kind, text, limit + 1, offset)
+    next_cursor = encode_cursor(offset + limit) if len(results) > limit else None
+    if kind == "posts":
+        items = [post.serialize(BlogPost.SUMMARY_FIELDS) for post in results[:limit]]
+    else:
+        items = [comment.serialize() for comment in results[:limit]]
+    return jsonify({"results": items, "next_cursor": next_cursor}), 200
+
+# ----------------------------- monitoring routes -----------------------------
+# ----------------------------- monitoring routes -----------------------------
+@api.route("/metrics", methods=["GET"])
+@query_budget(0)
+def get_metrics():
+    # Off unless METRICS_ENABLED=1: the internals are nobody's business on a public deployment
+    if not current_app.config["METRICS_ENABLED"]:
+        return jsonify({"message": "Not found"}), 404
+    return jsonify({
+        "response_cache": response_cache.stats(),
+        "database": database_stats(db),
+        "reaction_buffer": reaction_buffer.stats(),
+        "authentication": authentication.stats(),
+        "availability_filter": availability_filter.stats(),
+    }), 200
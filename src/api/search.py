@@ -0,0 +1,105 @@
+"""
+Full-text search over posts and comments, used by GET /api/search and the admin search boxes.
+
+The index is dialect specific, so it lives outside the models and is created by the
+"add full text search" migration:
+
+- Postgres: a generated `search_vector` tsvector column on blog_posts (title weighted
+  above content) and on comments, each with a GIN index. Queries go through
+  websearch_to_tsquery, so quotes, "or" and "-word" work like in a search engine, and
+  results are ranked with ts_rank.
+- SQLite: FTS5 tables blog_posts_fts and comments_fts over the real tables' rows, kept
+  in step by triggers and ranked with bm25 (title weighted above content). Every word of
+  the query must match.
+
+Ranking needs a score for every row it orders, so only the RANK_WINDOW most recent matches
+are ranked. Without that, a word found in most posts would score every one of them on every
+query. With it, a query costs about the same whether the table holds a thousand posts or a
+million, at the price of very common words only finding their best matches among recent content.
+
+On SQLite, a batch migration that recreates blog_posts or comments also drops the triggers.
+Such a migration has to recreate them and run "INSERT INTO <table>_fts(<table>_fts)
+VALUES ('rebuild')".
+"""
+import re
+from api.models import db, BlogPost, Comment
+
+SEARCHABLE = {"posts": BlogPost, "comments": Comment}
+RANK_WINDOW = 1000
+
+
+def fts5_query(text):
+    # Quoting every word keeps FTS5 operators and punctuation in user input from being parsed
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words)
+
+
+def ranked_ids(model, text, limit, offset):
+    """
+    A page of (id, rank) rows matching `text`, best first, or None when the text has
+    nothing to search for. Only the newest RANK_WINDOW matches are ranked, and the page is
+    cut inside the index query, so only `limit` rows are joined back to the table.
+    """
+    table = model.__tablename__
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        statement = db.text(
+            f"WITH query AS (SELECT websearch_to_tsquery('english', :text) AS query), "
+            f"candidates AS ("
+            f"SELECT id, search_vector FROM {table}, query WHERE search_vector @@ query.query "
+            f"ORDER BY id DESC LIMIT :window) "
+            f"SELECT id, ts_rank(search_vector, query.query) AS rank FROM candidates, query "
+            f"ORDER BY rank DESC, id DESC LIMIT :limit OFFSET :offset"
+        )
+    elif dialect == "sqlite":
+        text = fts5_query(text)
+        if text is None:
+            return None
+        # FTS5 walks its doclists in rowid order, so the window stops early; rank is the
+        # bm25 configured by the migration, computed for the window's rows only, lower is better
+        statement = db.text(
+            f"SELECT id, rank FROM ("
+            f"SELECT rowid AS id, -rank AS rank FROM {table}_fts WHERE {table}_fts MATCH :text "
+            f"ORDER BY rowid DESC LIMIT :window) "
+            f"ORDER BY rank DESC, id DESC LIMIT :limit OFFSET :offset"
+        )
+    else:
+        raise NotImplementedError(f"No full-text search for the {dialect} dialect")
+    return statement.bindparams(text=text, window=RANK_WINDOW, limit=limit, offset=offset).columns(
+        id=db.Integer, rank=db.Float
+    )
+
+
+def search(kind, text, limit, offset=0):
+    """Up to `limit` posts or comments matching `text`, best first, with their authors."""
+    model = SEARCHABLE[kind]
+    matches = ranked_ids(model, text, limit, offset)
+    if matches is None:
+        return []
+    matches = matches.subquery()
+    query = model.with_author(model.query).join(matches, model.id == matches.c.id)
+    if model is BlogPost:
+        query = query.options(db.defer(BlogPost.content), db.undefer(BlogPost.excerpt_source))
+    return query.order_by(matches.c.rank.desc(), model.id.desc()).all()
+
+
+def matching_ids(model, text):
+    """Every id matching `text`, unranked, as a subquery for filters (the admin search)."""
+    table = model.__tablename__
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        statement = db.text(
+            f"SELECT id FROM {table} WHERE search_vector @@ websearch_to_tsquery('english', :text)"
+        ).bindparams(text=text)
+    elif dialect == "sqlite":
+        text = fts5_query(text)
+        if text is None:
+            return db.select(model.id).where(db.false()).subquery()
+        statement = db.text(
+            f"SELECT rowid AS id FROM {table}_fts WHERE {table}_fts MATCH :text"
+        ).bindparams(text=text)
+    else:
+        raise NotImplementedError(f"No full-text search for the {dialect} dialect")
+    return statement.columns(id=db.Integer).subquery()
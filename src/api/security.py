@@ -0,0 +1,76 @@
+"""
+Password hashing.
+
+Hashing is deliberately slow, so its cost is configured per deployment and it runs on a
+small bounded thread pool instead of the request thread:
+
+- PASSWORD_HASH_METHOD: a werkzeug method with its parameters spelled out, e.g.
+  "scrypt:32768:8:1" (the default) or "pbkdf2:sha256:600000". Stored hashes made with other
+  parameters keep working and are rehashed with the current ones on the user's next login.
+- PASSWORD_HASH_WORKERS: threads hashing at the same time, per process (default 2). hashlib
+  releases the GIL while it hashes, so with gunicorn --threads the worker's other threads
+  keep serving reads during a burst of logins.
+- PASSWORD_HASH_QUEUE: hashes allowed to wait for a free thread (default 8). Beyond that
+  logins and signups are answered 503 with a Retry-After header instead of piling up.
+
+"python -m bench hashing" measures logins per second per core for each method.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = "scrypt:32768:8:1"
+# Number of parameters each method needs after its name, see werkzeug.security
+METHOD_PARAMETERS = {"scrypt": 3, "pbkdf2": 2}
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def parse_method(method):
+    """Validate a PASSWORD_HASH_METHOD value, which must spell out every parameter."""
+    name, *parameters = method.split(":")
+    if name not in METHOD_PARAMETERS or len(parameters) != METHOD_PARAMETERS[name]:
+        raise ValueError(
+            f"Invalid password hash method {method!r}, expected e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'"
+        )
+    return method
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.method = DEFAULT_METHOD
+        self.executor = None
+        self.slots = None
+
+    def init_app(self, app):
+        self.method = parse_method(os.getenv("PASSWORD_HASH_METHOD", DEFAULT_METHOD))
+        workers = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+        queue = int(os.getenv("PASSWORD_HASH_QUEUE", 8))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        app.extensions["password_hasher"] = self
+
+    def run(self, function, *args):
+        if self.executor is None:
+            return function(*args)
+        if not self.slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            return self.executor.submit(function, *args).result()
+        finally:
+            self.slots.release()
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        return self.run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        return stored_hash.split("$", 1)[0] != self.method
+
+
+password_hasher = PasswordHasher()
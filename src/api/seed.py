@@ -0,0 +1,191 @@
+"""
+Bulk generator of realistic test data (see "flask seed" in commands.py).
+
+Rows are written with Core executemany inserts in batched transactions, bypassing the ORM,
+and the like/comment counters are computed while generating so no reconciliation pass is
+needed. Popularity follows a power law: a few authors write most posts and a few posts get
+most comments and likes. The same seed always produces the same data.
+"""
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from api.models import db, User, BlogPost, PostLike, Comment, CommentLike, hot_score, top_score
+from api.security import password_hasher
+
+SEED_PASSWORD = "password"
+START_DATE = datetime(2024, 1, 1)
+WORDS = (
+    "plant soil water light leaf root bloom seed pot garden green grow prune repot sun shade "
+    "fern cactus succulent monstera orchid basil compost humidity window season fertilizer"
+).split()
+
+
+class Seeder:
+    def __init__(self, users, posts, comments, post_likes, comment_likes,
+                 seed=0, batch_size=5000, skew=1.1, days=365, log=print):
+        self.counts = {
+            "users": users, "posts": posts, "comments": comments,
+            "post_likes": post_likes, "comment_likes": comment_likes,
+        }
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.batch_size = batch_size
+        self.skew = skew
+        self.span = timedelta(days=days)
+        self.log = log
+        # Generating text word by word for millions of rows dominates the run time,
+        # so rows draw from a pool of pre-generated sentences instead
+        self.sentences = [self.sentence(self.rng.randint(4, 14)) for _ in range(512)]
+
+    # ----------------------------- helpers -----------------------------
+
+    def next_id(self, model):
+        return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+    def power_law_weights(self, size):
+        # Zipf-like weights, shuffled so popularity is not tied to id or age
+        weights = [1 / (rank ** self.skew) for rank in range(1, size + 1)]
+        self.rng.shuffle(weights)
+        return weights
+
+    def allocate(self, total, size):
+        """Spread `total` events over `size` items following the power law."""
+        if not size:
+            return Counter()
+        return Counter(self.rng.choices(range(size), cum_weights=self.cumulative(size), k=total))
+
+    def cumulative(self, size):
+        total, cumulative = 0, []
+        for weight in self.power_law_weights(size):
+            total += weight
+            cumulative.append(total)
+        return cumulative
+
+    def sentence(self, words):
+        return " ".join(self.rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    def text(self, sentences):
+        return " ".join(self.rng.choices(self.sentences, k=sentences))
+
+    def insert(self, model, rows):
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+            db.session.commit()
+
+    def reactions(self, target_id, key, likes, first_user_id, user_count, rows):
+        """Append `likes` reactions from distinct users; returns (likes, dislikes)."""
+        liked = disliked = 0
+        for user_offset in self.rng.sample(range(user_count), min(likes, user_count)):
+            is_like = self.rng.random() < 0.8
+            liked += is_like
+            disliked += not is_like
+            rows.append({"user_id": first_user_id + user_offset, key: target_id, "is_like": is_like})
+        return liked, disliked
+
+    # ----------------------------- tables -----------------------------
+
+    def seed_users(self):
+        first_id = self.next_id(User)
+        # Hashing is deliberately slow, so every seeded user shares one hash
+        password = password_hasher.hash(SEED_PASSWORD)
+        rows = []
+        for offset in range(self.counts["users"]):
+            user_id = first_id + offset
+            rows.append({
+                "id": user_id,
+                "email": f"seed{self.seed}_user{user_id}@example.com",
+                "username": f"seed{self.seed}_user{user_id}",
+                "password": password,
+                "is_active": True,
+            })
+            if len(rows) >= self.batch_size:
+                self.insert(User, rows)
+                rows = []
+        self.insert(User, rows)
+        return first_id
+
+    def seed_posts(self, first_user_id):
+        user_count, post_count = self.counts["users"], self.counts["posts"]
+        first_id = self.next_id(BlogPost)
+        authors = self.cumulative(user_count)
+        comments_per_post = self.allocate(self.counts["comments"], post_count)
+        likes_per_post = self.allocate(self.counts["post_likes"], post_count)
+
+        posts, likes = [], []
+        for offset in range(post_count):
+            post_id = first_id + offset
+            created_at = START_DATE + self.span * (offset / max(post_count, 1))
+            liked, disliked = self.reactions(post_id, "post_id", likes_per_post[offset], first_user_id, user_count, likes)
+            posts.append({
+                "id": post_id,
+                "title": self.sentence(self.rng.randint(3, 8))[:-1],
+                "content": self.text(self.rng.randint(5, 50)),
+                "created_at": created_at,
+                "updated_at": created_at,
+                "author_id": first_user_id + self.rng.choices(range(user_count), cum_weights=authors)[0],
+                "likes_count": liked,
+                "dislikes_count": disliked,
+                "comments_count": comments_per_post[offset],
+                "hot_score": hot_score(liked, disliked, comments_per_post[offset], created_at),
+                "top_score": top_score(liked, disliked, comments_per_post[offset]),
+            })
+            if len(posts) >= self.batch_size or len(likes) >= self.batch_size:
+                self.insert(BlogPost, posts)
+                self.insert(PostLike, likes)
+                posts, likes = [], []
+        self.insert(BlogPost, posts)
+        self.insert(PostLike, likes)
+        return first_id, comments_per_post
+
+    def seed_comments(self, first_user_id, first_post_id, comments_per_post):
+        user_count, post_count = self.counts["users"], self.counts["posts"]
+        first_id = self.next_id(Comment)
+        likes_per_comment = self.allocate(self.counts["comment_likes"], self.counts["comments"])
+
+        comments, likes = [], []
+        offset = 0
+        for post_offset in range(post_count):
+            post_created_at = START_DATE + self.span * (post_offset / max(post_count, 1))
+            for _ in range(comments_per_post[post_offset]):
+                comment_id = first_id + offset
+                created_at = post_created_at + timedelta(seconds=self.rng.randint(1, 7 * 24 * 3600))
+                liked, disliked = self.reactions(comment_id, "comment_id", likes_per_comment[offset], first_user_id, user_count, likes)
+                comments.append({
+                    "id": comment_id,
+                    "content": self.text(self.rng.randint(1, 5)),
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                    "user_id": first_user_id + self.rng.randrange(user_count),
+                    "post_id": first_post_id + post_offset,
+                    "likes_count": liked,
+                    "dislikes_count": disliked,
+                })
+                offset += 1
+                if len(comments) >= self.batch_size or len(likes) >= self.batch_size:
+                    self.insert(Comment, comments)
+                    self.insert(CommentLike, likes)
+                    comments, likes = [], []
+        self.insert(Comment, comments)
+        self.insert(CommentLike, likes)
+
+    def reset_sequences(self):
+        # Explicit ids do not advance Postgres sequences, the API's next insert would collide
+        if db.engine.dialect.name != "postgresql":
+            return
+        for model in (User, BlogPost, Comment):
+            table = model.__tablename__
+            db.session.execute(db.text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+            ))
+        db.session.commit()
+
+    def run(self):
+        if not self.counts["users"]:
+            raise ValueError("Seeding needs at least one user")
+        self.log(f"Seeding {self.counts['users']} users")
+        first_user_id = self.seed_users()
+        self.log(f"Seeding {self.counts['posts']} posts with {self.counts['post_likes']} likes")
+        first_post_id, comments_per_post = self.seed_posts(first_user_id)
+        self.log(f"Seeding {self.counts['comments']} comments with {self.counts['comment_likes']} likes")
+        self.seed_comments(first_user_id, first_post_id, comments_per_post)
+        self.reset_sequences()
@@ -0,0 +1,67 @@
+"""
+JSON encoding of the API's responses.
+
+jsonify() goes through app.json, set here to:
+
+- OrjsonProvider when the `orjson` package is installed (pipenv install orjson). It encodes
+  several times faster than the standard library and writes bytes straight into the response.
+- IsoJSONProvider otherwise, Flask's own provider.
+
+Both write datetimes as ISO 8601 ("2024-05-01T10:20:30.123456"), so serialize() methods
+return datetime values as they are. Flask's default would write an HTTP date instead.
+
+"python -m bench json" measures both, and compression, per 1,000 posts.
+"""
+from datetime import date
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def iso_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class IsoJSONProvider(DefaultJSONProvider):
+    default = staticmethod(iso_default)
+
+
+def orjson_default(value):
+    # Types the standard provider knows and orjson does not
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    mimetype = "application/json"
+
+    def options(self, indent=False):
+        # Sorted keys like Flask's provider, and int keys allowed like the json module
+        options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=orjson_default, option=self.options(kwargs.get("indent"))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=orjson_default, option=self.options(indent=self._app.debug))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def setup_json(app):
+    app.json = OrjsonProvider(app) if orjson is not None else IsoJSONProvider(app)
@@ -0,0 +1,74 @@
+"""
+What src/app.py sets up, depending on the process it runs in.
+
+APP_ROLE says which process imports the app:
+- "web": the server workers. wsgi.py and asgi.py set it, so gunicorn and uvicorn workers
+  skip what only the flask command uses: Flask-Migrate (and alembic) and the CLI commands.
+- "all" (default): the flask command, "python src/app.py" and anything else. Everything is
+  set up. Do not set APP_ROLE=web in the environment of the release command, "flask db
+  upgrade" needs Flask-Migrate.
+
+The admin is built on the first request under /admin, in either role: Flask-Admin and its
+views cost a worker a fifth of its boot otherwise, for pages that are seldom opened.
+ADMIN_ENABLED=0 leaves it out completely.
+
+Each setup step of app.py is timed (startup.mark), "python -m bench startup" reports those times
+with the import time of each module app.py imports.
+"""
+import os
+import threading
+import time
+
+ROLES = ("web", "all")
+
+
+def process_role():
+    role = os.getenv("APP_ROLE", "all")
+    if role not in ROLES:
+        raise ValueError(f"APP_ROLE must be one of {', '.join(ROLES)}, not {role!r}")
+    return role
+
+
+def admin_enabled():
+    return os.getenv("ADMIN_ENABLED", "1") != "0"
+
+
+class StartupProfile:
+    """Milliseconds spent in each setup step, in order."""
+
+    def __init__(self):
+        self.steps = {}
+        self.last = time.perf_counter()
+
+    def mark(self, name):
+        """Close the step `name`: the time since the previous mark."""
+        now = time.perf_counter()
+        self.steps[name] = round((now - self.last) * 1000, 3)
+        self.last = now
+
+
+class LazyMount:
+    """
+    WSGI middleware sending the requests under `prefix` to the app built by `factory()`,
+    built on the first of them. Every other request goes to `wsgi_app`.
+    """
+
+    def __init__(self, wsgi_app, prefix, factory):
+        self.wsgi_app = wsgi_app
+        self.prefix = prefix.rstrip("/")
+        self.factory = factory
+        self.mounted = None
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path != self.prefix and not path.startswith(self.prefix + "/"):
+            return self.wsgi_app(environ, start_response)
+        if self.mounted is None:
+            with self.lock:
+                if self.mounted is None:
+                    self.mounted = self.factory()
+        return self.mounted(environ, start_response)
+
+
+startup = StartupProfile()
@@ -0,0 +1,131 @@
+"""
+Serving the front end build (public/) from Flask.
+
+The directory is indexed once at startup: each file's content hash (its ETag), type and
+precompressed variants, so a request is a dictionary lookup and paths that are not in the
+index fall back to index.html, as the React router expects. With FLASK_DEBUG=1 the index
+is rebuilt on every request, so a new "npm run build" shows up without a restart.
+
+Cache headers depend on the file:
+- names with a content hash (bundle.3f9a1c0e5b7d2468.js, written by webpack.prod.js) never
+  change, browsers keep them for a year without asking again.
+- index.html, which points to the current bundle, is revalidated on every visit
+  (answered 304 while it has not changed).
+- anything else is kept for STATIC_MAX_AGE seconds (default 3600).
+
+"flask precompress-static" writes .br and .gz next to the compressible files after a build.
+They are sent, with Content-Encoding, to clients that accept them.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from flask import request, send_file, abort
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Suffix of the precompressed copy for each Content-Encoding, best first
+VARIANTS = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".json", ".txt", ".map", ".ico", ".xml"}
+PRECOMPRESS_MIN_SIZE = 1024
+
+
+class StaticFile:
+    def __init__(self, path, name):
+        self.path = path
+        with open(path, "rb") as f:
+            self.etag = hashlib.sha1(f.read()).hexdigest()[:20]
+        self.last_modified = os.path.getmtime(path)
+        self.mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.immutable = HASHED_NAME.search(name) is not None
+        self.variants = {
+            encoding: path + suffix for encoding, suffix in VARIANTS.items() if os.path.isfile(path + suffix)
+        }
+
+
+class StaticFiles:
+    def __init__(self):
+        self.directory = None
+        self.files = {}
+        self.reload = False
+        self.max_age = 3600
+
+    def init_app(self, app, directory):
+        self.directory = directory
+        self.reload = app.debug
+        self.max_age = int(os.getenv("STATIC_MAX_AGE", 3600))
+        self.scan()
+        app.extensions["static_files"] = self
+
+    def scan(self):
+        files = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(tuple(VARIANTS.values())):
+                    continue
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, self.directory).replace(os.sep, "/")] = StaticFile(path, name)
+        self.files = files
+
+    def serve(self, path):
+        if self.reload:
+            self.scan()
+        entry = self.files.get(path) or self.files.get("index.html")
+        if entry is None:
+            abort(404)
+
+        encoding = request.accept_encodings.best_match(list(entry.variants)) if entry.variants else None
+        if entry.immutable:
+            max_age = IMMUTABLE_MAX_AGE
+        elif entry is self.files.get("index.html"):
+            max_age = None  # no-cache: revalidated on every visit
+        else:
+            max_age = self.max_age
+        response = send_file(
+            entry.variants[encoding] if encoding else entry.path,
+            mimetype=entry.mimetype,
+            etag=f"{entry.etag}-{encoding}" if encoding else entry.etag,
+            last_modified=entry.last_modified,
+            max_age=max_age,
+            conditional=True,
+        )
+        if entry.immutable:
+            response.cache_control.immutable = True
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if entry.variants:
+            response.vary.add("Accept-Encoding")
+        return response
+
+
+def precompress(directory):
+    """Write .br (when brotli is installed) and .gz copies of the compressible files. Returns the paths written."""
+    written = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1] not in COMPRESSIBLE or os.path.getsize(path) < PRECOMPRESS_MIN_SIZE:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            # Done once per build, so both run at their slowest, smallest setting
+            outputs = {".gz": lambda: gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                outputs[".br"] = lambda: brotli.compress(data, quality=11)
+            for suffix, compress in outputs.items():
+                target = path + suffix
+                if os.path.isfile(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                with open(target, "wb") as f:
+                    f.write(compress())
+                written.append(target)
+    return written
+
+
+static_files = StaticFiles()
@@ -1,3 +1,5 @@
+import base64
+import json
 from flask import jsonify, url_for
 
 class APIException(Exception):
@@ -15,6 +17,45 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(*values):
+    # Opaque keyset cursor: the sort key of the last row the client has seen
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise APIException("Invalid cursor", status_code=400)
+    if not isinstance(values, list) or len(values) != size:
+        raise APIException("Invalid cursor", status_code=400)
+    return values
+
+def parse_limit(value, default, maximum):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise APIException("limit must be an integer", status_code=400)
+    if limit < 1:
+        raise APIException("limit must be at least 1", status_code=400)
+    return min(limit, maximum)
+
+def parse_fields(value, allowed, presets=None):
+    # Returns None when the client did not ask for a sparse response
+    if not value:
+        return None
+    presets = presets or {}
+    if value in presets:
+        return presets[value]
+    fields = tuple(field.strip() for field in value.split(",") if field.strip())
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise APIException("Unknown fields: " + ", ".join(unknown), status_code=400)
+    return fields
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
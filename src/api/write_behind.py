@@ -0,0 +1,277 @@
+"""
+Write-behind buffer for the like routes, off unless REACTION_BUFFER_URL is set.
+
+A viral post turns every click into its own transaction on the same post_likes rows and
+blog_posts counters, and writers queue on their locks. With the buffer, the like routes
+answer 202 without writing: once a primary key lookup found the target (404 otherwise),
+the toggle is recorded under (type, user, target) and a background thread in every worker writes what is pending with
+flush_reactions() (api/reactions.py), all of it in one transaction.
+
+A user's repeated toggles collapse into one write. Toggles are recorded as their effect on
+whatever the stored reaction turns out to be, three letters giving the reaction after them
+for none, like and dislike ("n", "l", "d"): liking is "lnl", liking again makes it "nld",
+no change. The stored reactions are only read when flushing.
+
+REACTION_BUFFER_URL:
+- "memory": a buffer per worker process.
+- a redis:// URL: one buffer shared by every worker, updated atomically with Lua scripts.
+  Any worker's flusher may write it. Needs the `redis` package.
+
+The buffer is flushed every REACTION_FLUSH_INTERVAL seconds (default 1), and as soon as it
+holds REACTION_FLUSH_SIZE toggles (default 500). Reads catch up at the flush that follows
+a like: the flush invalidates the cached responses it changes. So a like shows up at most
+REACTION_FLUSH_INTERVAL seconds, plus the flush itself, after it was accepted, while the
+database is reachable. A failed flush puts its toggles back in front of the newer ones and
+is retried at the next interval. Workers flush on exit (atexit, which gunicorn and uvicorn
+run on a graceful shutdown). A worker that is killed loses what its memory buffer holds,
+and both buffers lose a flush in progress.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from functools import partial
+from api.models import db
+from api.reactions import flush_reactions
+from api.cache import response_cache
+
+logger = logging.getLogger("api.reactions")
+
+STATES = {"n": None, "l": True, "d": False}
+CODES = {state: code for code, state in STATES.items()}
+# No toggle: every reaction stays what it is
+UNCHANGED = "nld"
+
+
+def toggled(toggles, is_like):
+    """`toggles` followed by one more toggle of `is_like`."""
+    value = CODES[is_like]
+    return "".join("n" if state == value else value for state in toggles)
+
+
+def chained(first, then):
+    """The toggles `first` followed by the toggles `then`."""
+    return "".join(then[UNCHANGED.index(state)] for state in first)
+
+
+def after(toggles, old):
+    """The reaction after `toggles`, starting from the stored `old` one."""
+    return STATES[toggles[UNCHANGED.index(CODES[old])]]
+
+
+def field(target_type, user_id, target_id):
+    return f"{target_type}:{user_id}:{target_id}"
+
+
+def parse_field(name):
+    target_type, user_id, target_id = name.split(":")
+    return target_type, int(user_id), int(target_id)
+
+
+class MemoryBuffer:
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def toggle(self, name, is_like):
+        """Record a toggle, returns how many toggles are pending."""
+        with self.lock:
+            self.pending[name] = toggled(self.pending.get(name, UNCHANGED), is_like)
+            return len(self.pending)
+
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def restore(self, pending):
+        with self.lock:
+            for name, toggles in pending.items():
+                self.pending[name] = chained(toggles, self.pending.get(name, UNCHANGED))
+
+    def size(self):
+        return len(self.pending)
+
+
+# The same functions as above, in Lua so Redis applies them atomically
+LUA_FUNCTIONS = """
+local function toggled(toggles, value)
+    local result = ''
+    for i = 1, 3 do
+        if string.sub(toggles, i, i) == value then result = result .. 'n' else result = result .. value end
+    end
+    return result
+end
+local function chained(first, after)
+    local result = ''
+    for i = 1, 3 do
+        local index = string.find('nld', string.sub(first, i, i), 1, true)
+        result = result .. string.sub(after, index, index)
+    end
+    return result
+end
+"""
+
+TOGGLE_SCRIPT = LUA_FUNCTIONS + """
+local toggles = redis.call('HGET', KEYS[1], ARGV[1]) or 'nld'
+redis.call('HSET', KEYS[1], ARGV[1], toggled(toggles, ARGV[2]))
+return redis.call('HLEN', KEYS[1])
+"""
+
+RESTORE_SCRIPT = LUA_FUNCTIONS + """
+for i = 1, #ARGV, 2 do
+    local newer = redis.call('HGET', KEYS[1], ARGV[i]) or 'nld'
+    redis.call('HSET', KEYS[1], ARGV[i], chained(ARGV[i + 1], newer))
+end
+return 0
+"""
+
+
+class RedisBuffer:
+    """One buffer for every worker, a hash of field -> toggles. Needs the `redis` package."""
+    KEY = "reactions:pending"
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.no_such_key = redis.ResponseError
+        self.toggle_script = self.client.register_script(TOGGLE_SCRIPT)
+        self.restore_script = self.client.register_script(RESTORE_SCRIPT)
+
+    def toggle(self, name, is_like):
+        return self.toggle_script(keys=[self.KEY], args=[name, CODES[is_like]])
+
+    def take(self):
+        # Renamed first, so toggles arriving meanwhile start a new hash
+        taking = f"reactions:flushing:{uuid.uuid4().hex}"
+        try:
+            self.client.rename(self.KEY, taking)
+        except self.no_such_key:
+            return {}
+        pipeline = self.client.pipeline()
+        pipeline.hgetall(taking)
+        pipeline.delete(taking)
+        pending, _ = pipeline.execute()
+        return {name.decode(): toggles.decode() for name, toggles in pending.items()}
+
+    def restore(self, pending):
+        args = [value for item in pending.items() for value in item]
+        if args:
+            self.restore_script(keys=[self.KEY], args=args)
+
+    def size(self):
+        return self.client.hlen(self.KEY)
+
+
+class ReactionBuffer:
+    def __init__(self):
+        self.app = None
+        self.buffer = None
+        self.flush_interval = 1.0
+        self.flush_size = 500
+        self.flusher_pid = None
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.counts = {"accepted": 0, "flushes": 0, "written": 0, "errors": 0}
+        self.last_flush_ms = None
+
+    def init_app(self, app):
+        url = os.getenv("REACTION_BUFFER_URL", "off")
+        self.flush_interval = float(os.getenv("REACTION_FLUSH_INTERVAL", 1))
+        self.flush_size = int(os.getenv("REACTION_FLUSH_SIZE", 500))
+        if url == "off":
+            buffer = None
+        elif url == "memory":
+            buffer = MemoryBuffer()
+        else:
+            buffer = RedisBuffer(url)
+        self.app = app
+        self.buffer = buffer
+        app.extensions["reaction_buffer"] = self
+
+    @property
+    def enabled(self):
+        return self.buffer is not None
+
+    def toggle(self, target_type, user_id, target_id, is_like):
+        """Accept a like route's toggle, written by the next flush."""
+        self.ensure_flusher()
+        pending = self.buffer.toggle(field(target_type, user_id, target_id), is_like)
+        self.count("accepted")
+        if pending >= self.flush_size:
+            self.wake.set()
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+
+    # ----------------------------- flushing -----------------------------
+
+    def ensure_flusher(self):
+        # Started on first use rather than in init_app, so that every gunicorn worker
+        # (forked after the app was imported) runs its own
+        if self.flusher_pid == os.getpid():
+            return
+        with self.lock:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher_pid = os.getpid()
+            threading.Thread(target=self.flusher, name="reaction-flusher", daemon=True).start()
+            atexit.register(self.flush)
+
+    def flusher(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything pending in one transaction. Returns how many reactions changed."""
+        if self.buffer is None:
+            return 0
+        pending = self.buffer.take()
+        if not pending:
+            return 0
+        start = time.perf_counter()
+        toggles = {parse_field(name): partial(after, value) for name, value in pending.items() if value != UNCHANGED}
+        with self.app.app_context():
+            try:
+                written, namespaces = flush_reactions(toggles)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception("Flushing %d buffered reactions failed, retrying at the next flush", len(pending))
+                self.buffer.restore(pending)
+                self.count("errors")
+                return 0
+            # The toggles are committed: restoring them now would apply them twice
+            try:
+                response_cache.invalidate(*namespaces)
+            except Exception:
+                logger.exception("Invalidating the cache after flushing %d reactions failed", len(pending))
+                self.count("errors")
+        self.last_flush_ms = round((time.perf_counter() - start) * 1000, 3)
+        self.count("flushes")
+        self.count("written", written)
+        return written
+
+    def stop(self):
+        """Flush what is pending and go back to writing reactions directly."""
+        self.flush()
+        self.buffer = None
+
+    def stats(self):
+        if self.buffer is None:
+            return {"buffer": None}
+        return {
+            "buffer": type(self.buffer).__name__,
+            "pending": self.buffer.size(),
+            "flush_interval": self.flush_interval,
+            "last_flush_ms": self.last_flush_ms,
+            **self.counts,
+        }
+
+
+reaction_buffer = ReactionBuffer()
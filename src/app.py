@@ -2,17 +2,26 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for, send_from_directory
-from flask_migrate import Migrate
-from flask_swagger import swagger
+from flask import Flask, request, jsonify, url_for
+from api.startup import startup, process_role, admin_enabled, LazyMount
 from api.utils import APIException, generate_sitemap
 from api.models import db
+from api.database import configure_database, replica_router
 from api.routes import api
-from api.admin import setup_admin
-from api.commands import setup_commands
+from api.cache import response_cache
+from api.instrumentation import instrumentation
+from api.security import password_hasher
+from api.write_behind import reaction_buffer
+from api.auth import authentication
+from api.availability import availability_filter
+from api.serialization import setup_json
+from api.compression import response_compression
+from api.static_files import static_files
 
 from flask_jwt_extended import JWTManager
 
+startup.mark("imports")
+
 # from models import Person
 
 ENV = "development" if os.getenv("FLASK_DEBUG") == "1" else "production"
@@ -21,31 +30,81 @@ static_file_dir = os.path.join(os.path.dirname(
 app = Flask(__name__)
 app.url_map.strict_slashes = False
 
+# "web" in the gunicorn/uvicorn workers (wsgi.py, asgi.py), "all" for the flask command (see api/startup.py)
+ROLE = process_role()
+
 # app.config["JWT_ACCESS_TOKEN_EXPIRES"] = 7*24*60*60*52
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
-JWTManager(app)
-
+jwt = JWTManager(app)
+# GET /api/metrics exposes pool, cache and buffer internals, so it answers 404 unless enabled
+app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED") == "1"
+# cached user lookups and the token revocation list, see api/auth.py
+authentication.init_app(app, jwt)
+startup.mark("jwt")
 
-# database condiguration
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace(
-        "postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 
+# database condiguration: pool settings and the optional read replica, see api/database.py
+configure_database(app)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-MIGRATE = Migrate(app, db, compare_type=True)
+if ROLE == "all":
+    # migrations are only run through the flask command, alembic stays out of the workers
+    from flask_migrate import Migrate
+    MIGRATE = Migrate(app, db, compare_type=True)
 db.init_app(app)
+startup.mark("database")
+
+# cache for the public read endpoints, see api/cache.py
+response_cache.init_app(app)
+startup.mark("response_cache")
+
+# replica selection and read-your-writes pins, only active with DATABASE_REPLICA_URL (see api/database.py)
+replica_router.init_app(app)
+startup.mark("replica_router")
+
+# per-request SQL statistics, only when SQL_INSTRUMENTATION=1 (see api/instrumentation.py)
+instrumentation.init_app(app)
+startup.mark("instrumentation")
+
+# password hashing parameters and its thread pool, see api/security.py
+password_hasher.init_app(app)
+startup.mark("password_hasher")
+
+# Bloom filter of the taken emails and usernames for the signup form, see api/availability.py
+availability_filter.init_app(app)
+startup.mark("availability_filter")
+
+# write-behind buffer for the like routes, only with REACTION_BUFFER_URL (see api/write_behind.py)
+reaction_buffer.init_app(app)
+startup.mark("reaction_buffer")
+
+# orjson for jsonify() when installed, ISO 8601 datetimes either way (see api/serialization.py)
+setup_json(app)
+startup.mark("json")
+
+# gzip/brotli for large JSON responses, see api/compression.py
+response_compression.init_app(app)
+startup.mark("compression")
+
+# index of the front end build served below, see api/static_files.py
+static_files.init_app(app, static_file_dir)
+startup.mark("static_files")
 
-# add the admin
-setup_admin(app)
+# add the admin, a separate app built on the first request under /admin (see api/admin.py)
+if admin_enabled():
+    def create_admin():
+        from api.admin import create_admin_app
+        return create_admin_app(app.config)
+    app.wsgi_app = LazyMount(app.wsgi_app, '/admin', create_admin)
 
-# add the admin
-setup_commands(app)
+# add the commands, only the flask command can run them
+if ROLE == "all":
+    from api.commands import setup_commands
+    setup_commands(app)
+startup.mark("admin_and_commands")
 
 # Add all endpoints form the API with a "api" prefix
 app.register_blueprint(api, url_prefix='/api')
+startup.mark("blueprint")
 
 # Handle/serialize errors like a JSON object
 
@@ -61,16 +120,12 @@ def handle_invalid_usage(error):
 def sitemap():
     if ENV == "development":
         return generate_sitemap(app)
-    return send_from_directory(static_file_dir, 'index.html')
+    return static_files.serve('index.html')
 
-# any other endpoint will try to serve it like a static file
+# any other endpoint will try to serve it like a static file, index.html otherwise
 @app.route('/<path:path>', methods=['GET'])
 def serve_any_other_file(path):
-    if not os.path.isfile(os.path.join(static_file_dir, path)):
-        path = 'index.html'
-    response = send_from_directory(static_file_dir, path)
-    response.cache_control.max_age = 0  # avoid cache memory
-    return response
+    return static_files.serve(path)
 
 
 # this only runs if `$ python src/main.py` is executed
@@ -0,0 +1,11 @@
+# ASGI entry point, an alternative to wsgi.py: the read-only routes run on an event loop with
+# an async database driver, see api/async_mode.py.
+#   uvicorn asgi:application --app-dir src --workers 2
+
+import os
+os.environ.setdefault("APP_ROLE", "web")  # no migrations or CLI commands in the workers, see api/startup.py
+
+from app import app
+from api.async_mode import AsyncAPI
+
+application = AsyncAPI(app)
@@ -17,9 +17,6 @@ const BlogDetails = () => {
 
     useEffect(() => {
         actions.fetchBlogAndComments(id);
-        if (store.token) {
-            actions.fetchUserLikeStatus(id);
-        }
     }, [id, store.token]);
 
     useEffect(() => {
@@ -264,6 +261,13 @@ const BlogDetails = () => {
                                 </div>
                             ))}
                         </div>
+                        {store.blogHasMoreComments && (
+                            <div className="d-flex justify-content-center mt-3">
+                                <button className="btn btn-outline-dark rounded-pill" onClick={() => actions.fetchMoreComments(id)}>
+                                    Show more comments ({store.blogComments.length} of {store.blogCommentsCount})
+                                </button>
+                            </div>
+                        )}
                     </div>
                 </div>
             </div>
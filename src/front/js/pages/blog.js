@@ -144,9 +144,7 @@ const Blog = () => {
                                                 By {blog.author} on {new Date(blog.created_at).toLocaleDateString()}
                                             </p>
                                             <p className="card-text">
-                                                {blog.content.length > 150
-                                                    ? `${blog.content.substring(0, 150)}...`
-                                                    : blog.content}
+                                                {blog.excerpt}
                                             </p>
                                             <div className="d-flex justify-content-between align-items-center mt-3">
                                                 <div className="btn-group">
@@ -181,6 +179,13 @@ const Blog = () => {
                             ))}
                         </div>
                     )}
+                    {store.blogsNextCursor && (
+                        <div className="d-flex justify-content-center mt-4">
+                            <button className="btn btn-outline-dark rounded-pill" onClick={actions.fetchMoreBlogs}>
+                                Load More Posts
+                            </button>
+                        </div>
+                    )}
                 </div>
             </div>
         </div>
@@ -9,10 +9,13 @@ const getState = ({ getStore, getActions, setStore }) => {
 			token: sessionStorage.getItem("token") || null,
 
 			blogs: [],
+			blogsNextCursor: null,
 			blogError: null,
 			currentBlog: null,
 			blogComments: [],
-			userLikeStatus: null,
+			blogCommentsCount: 0,
+			blogHasMoreComments: false,
+			blogCommentsCursor: null,
 		},
 		actions: {
 			// ------------------------- START: authorization -------------------------
@@ -88,6 +91,14 @@ const getState = ({ getStore, getActions, setStore }) => {
 			},
 
 			logout: () => {
+				// Revokes the token on the server, the session is cleared here without waiting
+				const token = getStore().token;
+				if (token) {
+					fetch(process.env.BACKEND_URL + "/api/logout", {
+						method: "POST",
+						headers: { Authorization: `Bearer ${token}` }
+					}).catch(error => console.error("Error logging out:", error));
+				}
 				sessionStorage.removeItem("token");
 				sessionStorage.removeItem("currentUser");
 				setStore({ currentUser: null, token: null });
@@ -99,16 +110,31 @@ const getState = ({ getStore, getActions, setStore }) => {
 			// ------------------------- START: plant blog actions -------------------------
 			fetchBlogs: async () => {
 				try {
-					const resp = await fetch(process.env.BACKEND_URL + "/api/blog_posts");
+					const resp = await fetch(process.env.BACKEND_URL + "/api/blog_posts?fields=summary");
 					const data = await resp.json();
-					setStore({ blogs: data, blogError: null });
-					return data;
+					setStore({ blogs: data.posts, blogsNextCursor: data.next_cursor, blogError: null });
+					return data.posts;
 				} catch (error) {
 					// setStore({ blogError: "Failed to load blog posts" });
 					alert("Failed to load blog posts");
 					console.error(error);
 				}
 			},
+
+			fetchMoreBlogs: async () => {
+				const store = getStore();
+				if (!store.blogsNextCursor) return;
+				try {
+					const resp = await fetch(
+						`${process.env.BACKEND_URL}/api/blog_posts?fields=summary&cursor=${encodeURIComponent(store.blogsNextCursor)}`
+					);
+					const data = await resp.json();
+					setStore({ blogs: [...store.blogs, ...data.posts], blogsNextCursor: data.next_cursor });
+				} catch (error) {
+					alert("Failed to load more blog posts");
+					console.error(error);
+				}
+			},
 			
 			createBlogPost: async (postData) => {
 				const store = getStore();
@@ -118,11 +144,9 @@ const getState = ({ getStore, getActions, setStore }) => {
 						method: "POST",
 						headers: {
 							"Content-Type": "application/json",
+							Authorization: `Bearer ${store.token}`
 						},
-						body: JSON.stringify({
-							...postData,
-							author_id: store.currentUser.id,
-						})
+						body: JSON.stringify(postData)
 					});
 
 					if (resp.ok) {
@@ -147,7 +171,7 @@ const getState = ({ getStore, getActions, setStore }) => {
 						method: "PUT",
 						headers: {
 							"Content-Type": "application/json",
-							userId: getStore().currentUser.id
+							Authorization: `Bearer ${getStore().token}`
 						},
 						body: JSON.stringify(editedData)
 					});
@@ -173,7 +197,7 @@ const getState = ({ getStore, getActions, setStore }) => {
 				try {
 					const resp = await fetch(`${process.env.BACKEND_URL}/api/delete_blog/${blogId}`, {
 						method: "DELETE",
-						headers: { userId: getStore().currentUser.id }
+						headers: { Authorization: `Bearer ${getStore().token}` }
 					});
 
 					const data = await resp.json();
@@ -203,7 +227,7 @@ const getState = ({ getStore, getActions, setStore }) => {
 						method: "POST",
 						headers: {
 							"Content-Type": "application/json",
-							userId: store.currentUser.id
+							Authorization: `Bearer ${store.token}`
 						},
 						body: JSON.stringify({ is_like: isLike })
 					});
@@ -217,33 +241,41 @@ const getState = ({ getStore, getActions, setStore }) => {
 				}
 			},
 
+			// One request for the post, its first comments and the logged in user's likes/dislikes
 			fetchBlogAndComments: async (blogId) => {
+				const store = getStore();
+				const headers = store.token ? { Authorization: `Bearer ${store.token}` } : {};
 				try {
-					const blogResp = await fetch(`${process.env.BACKEND_URL}/api/blog_posts/${blogId}`);
-					const blogData = await blogResp.json();
-					setStore({ currentBlog: blogData });
-					
-					const commentsResp  = await fetch(`${process.env.BACKEND_URL}/api/blog_posts/${blogId}/comments`);
-					const commentsData = await commentsResp.json();
-					setStore({ blogComments: commentsData });
+					const resp = await fetch(`${process.env.BACKEND_URL}/api/blog_posts/${blogId}/detail`, { headers });
+					const data = await resp.json();
+					setStore({
+						currentBlog: data.post,
+						blogComments: data.comments,
+						blogCommentsCount: data.comments_count,
+						blogHasMoreComments: data.has_more_comments,
+						blogCommentsCursor: data.comments_next_cursor
+					});
 				} catch (error) {
 					console.error("Error fetching data", error);
 				}
 			},
-			
-			fetchUserLikeStatus: async (blogId) => {
-				if (!getStore().currentUser.id) {
-					setStore({ userLikeStatus: null });
-					return;
-				}
+
+			// The next page of comments, after the ones already shown
+			fetchMoreComments: async (blogId) => {
+				const store = getStore();
+				const headers = store.token ? { Authorization: `Bearer ${store.token}` } : {};
+				const cursor = encodeURIComponent(store.blogCommentsCursor);
 				try {
-					const resp = await fetch(`${process.env.BACKEND_URL}/api/blog_posts/${blogId}/like_status`, {
-						headers: { userId: getStore().currentUser.id }
-					});
+					const resp = await fetch(`${process.env.BACKEND_URL}/api/blog_posts/${blogId}/comments?limit=50&cursor=${cursor}`, { headers });
 					const data = await resp.json();
-					setStore({ userLikeStatus: data.status });
+					setStore({
+						blogComments: [...store.blogComments, ...data.comments],
+						blogCommentsCount: data.comments_count,
+						blogHasMoreComments: data.next_cursor !== null,
+						blogCommentsCursor: data.next_cursor
+					});
 				} catch (error) {
-					console.error("Error fetching like status:", error);
+					console.error("Error fetching comments", error);
 				}
 			},
 
@@ -257,7 +289,7 @@ const getState = ({ getStore, getActions, setStore }) => {
 						method: "POST",
 						headers: {
 							"Content-Type": "application/json",
-							userId: getStore().currentUser.id
+							Authorization: `Bearer ${getStore().token}`
 						},
 						body: JSON.stringify({ content })
 					});
@@ -277,7 +309,7 @@ const getState = ({ getStore, getActions, setStore }) => {
 				try {
 					const resp = await fetch(`${process.env.BACKEND_URL}/api/comments/${commentId}`, {
 						method: "DELETE",
-						headers: { userId: getStore().currentUser.id }
+						headers: { Authorization: `Bearer ${getStore().token}` }
 					});
 			
 					if (resp.ok) {
@@ -302,7 +334,7 @@ const getState = ({ getStore, getActions, setStore }) => {
 						method: "POST",
 						headers: {
 							"Content-Type": "application/json",
-							userId: getStore().currentUser.id
+							Authorization: `Bearer ${getStore().token}`
 						},
 						body: JSON.stringify({ is_like: isLike })
 					});
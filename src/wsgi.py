@@ -1,6 +1,9 @@
 # This file was created to run the application on heroku using gunicorn.
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
 
+import os
+os.environ.setdefault("APP_ROLE", "web")  # no migrations or CLI commands in the workers, see api/startup.py
+
 from app import app as application
 
 if __name__ == "__main__":
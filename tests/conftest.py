@@ -0,0 +1,67 @@
+"""
+The app under test, on a scratch SQLite database migrated with the real migrations.
+
+src/app.py builds its app when imported and reads its settings from the environment, so
+they are set here, before the first import. Run the suite from the repository root:
+$ pipenv run test
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = tempfile.mkdtemp(prefix="api-tests-")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{DATA_DIR}/test.db",
+    "JWT_SECRET_KEY": "test-secret-long-enough-for-hs256",
+    # Budgets are asserted on the statements the views run, not on cache hits
+    "RESPONSE_CACHE_URL": "off",
+    "SQL_INSTRUMENTATION": "1",
+    "SQL_QUERY_BUDGET_STRICT": "1",
+    "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+    "ADMIN_ENABLED": "0",
+})
+for name in ("DATABASE_REPLICA_URL", "REACTION_BUFFER_URL", "TOKEN_REVOCATION_URL", "APP_ROLE"):
+    os.environ.pop(name, None)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import pytest
+from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app
+    app.config["TESTING"] = True
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope="session")
+def data(app):
+    """A few users, posts, comments and likes. Returns their ids."""
+    from api.seed import Seeder
+    from api.models import db, User, BlogPost, Comment
+    with app.app_context():
+        Seeder(users=5, posts=10, comments=30, post_likes=10, comment_likes=10, seed=1, log=lambda message: None).run()
+        return {
+            "users": [user_id for user_id, in db.session.query(User.id).order_by(User.id)],
+            "posts": [post_id for post_id, in db.session.query(BlogPost.id).order_by(BlogPost.id)],
+            "comments": [comment_id for comment_id, in db.session.query(Comment.id).order_by(Comment.id)],
+        }
+
+
+@pytest.fixture
+def token_for(app):
+    def token_for(user_id):
+        with app.app_context():
+            return create_access_token(identity=str(user_id))
+    return token_for
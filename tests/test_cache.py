@@ -0,0 +1,61 @@
+"""
+The memory backend's namespace versions stay bounded without ever going back, and the
+response cache does not keep what a lagging replica read right after a write.
+"""
+from flask import Flask, g, jsonify
+from api.cache import MemoryBackend, ResponseCache
+
+
+def test_counters_are_bounded():
+    backend = MemoryBackend(max_entries=10)
+    for post_id in range(1000):
+        backend.incr(f"version:post:{post_id}")
+    assert len(backend.counters) == 10
+
+
+def test_evicted_counters_never_reuse_a_version():
+    backend = MemoryBackend(max_entries=2)
+    seen = {}
+    for step in range(200):
+        key = f"version:post:{step % 7}"
+        before = backend.counter(key)
+        after = backend.incr(key)
+        assert after > before
+        # Every version a namespace reads is one it never had before, or the current one
+        assert after not in seen.setdefault(key, set())
+        assert all(version <= before for version in seen[key])
+        seen[key].update({before, after})
+
+
+def test_keys_keep_escaped_arguments_apart(app):
+    cache = ResponseCache()
+    cache.backend = MemoryBackend()
+    with app.test_request_context("/api/blog_posts?cursor=X&fields=summary&limit=20"):
+        plain = cache.key(["feed"])
+    with app.test_request_context("/api/blog_posts?cursor=X&fields%3Dsummary%26limit=20"):
+        escaped = cache.key(["feed"])
+    assert plain != escaped
+
+
+def test_replica_bodies_are_not_stored_right_after_an_invalidation():
+    cache = ResponseCache()
+    cache.backend = MemoryBackend()
+    cache.replica_lag_seconds = 5
+    app = Flask(__name__)
+    source = {"bind": "replica0", "posts": ["old"]}
+
+    @app.route("/feed")
+    @cache.cached("feed")
+    def feed():
+        g.replica_bind = source["bind"]
+        return jsonify(source["posts"])
+
+    client = app.test_client()
+    cache.invalidate("feed")
+    # The replica has not seen the write yet
+    assert client.get("/feed").get_json() == ["old"]
+    source.update(bind=None, posts=["new", "old"])
+    assert client.get("/feed").get_json() == ["new", "old"]
+    # The primary's body was stored, later replica reads are served from it
+    source.update(bind="replica0", posts=["old"])
+    assert client.get("/feed").get_json() == ["new", "old"]
@@ -0,0 +1,67 @@
+"""
+Adding a comment keeps the post's comments_count in step, and refuses what it cannot count.
+A comment page shows the user's reactions, so its ETag is only fresh for the same user,
+and a token that no longer verifies reads it as an anonymous request.
+"""
+from datetime import timedelta
+import pytest
+from flask_jwt_extended import create_access_token
+from api.models import db, BlogPost, Comment
+
+
+def test_add_comment_counts_it(app, client, data, token_for):
+    post_id = data["posts"][3]
+    headers = {"Authorization": f"Bearer {token_for(data['users'][0])}"}
+    response = client.post(f"/api/blog_posts/{post_id}/comments", json={"content": "Counted"}, headers=headers)
+    assert response.status_code == 201
+    with app.app_context():
+        stored = db.session.get(BlogPost, post_id).comments_count
+        assert stored == db.session.query(Comment).filter_by(post_id=post_id).count()
+
+
+def test_add_comment_to_missing_post(app, client, data, token_for):
+    post_id = data["posts"][-1] + 1000
+    headers = {"Authorization": f"Bearer {token_for(data['users'][0])}"}
+    response = client.post(f"/api/blog_posts/{post_id}/comments", json={"content": "Orphan"}, headers=headers)
+    assert response.status_code == 404
+    with app.app_context():
+        assert db.session.query(Comment).filter_by(post_id=post_id).count() == 0
+
+
+def test_add_comment_without_content(client, data, token_for):
+    headers = {"Authorization": f"Bearer {token_for(data['users'][0])}"}
+    for body in ({}, {"content": "  "}, {"content": 12}):
+        response = client.post(f"/api/blog_posts/{data['posts'][3]}/comments", json=body, headers=headers)
+        assert response.status_code == 400
+
+
+def test_comment_etags_are_per_user(client, data, token_for):
+    path = f"/api/blog_posts/{data['posts'][0]}/comments"
+    first = client.get(path, headers={"Authorization": f"Bearer {token_for(data['users'][0])}"})
+    assert "Authorization" in first.headers["Vary"]
+    etag = first.headers["ETag"]
+    same_user = client.get(path, headers={"Authorization": f"Bearer {token_for(data['users'][0])}", "If-None-Match": etag})
+    assert same_user.status_code == 304
+    for headers in ({"Authorization": f"Bearer {token_for(data['users'][1])}"}, {}):
+        response = client.get(path, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert "Authorization" in response.headers["Vary"]
+
+
+@pytest.fixture
+def rejected_tokens(app, client, data, token_for):
+    with app.app_context():
+        expired = create_access_token(identity=str(data["users"][0]), expires_delta=timedelta(seconds=-10))
+    revoked = token_for(data["users"][1])
+    assert client.post("/api/logout", headers={"Authorization": f"Bearer {revoked}"}).status_code == 200
+    return {"expired": expired, "revoked": revoked}
+
+
+@pytest.mark.parametrize("path", ["/api/blog_posts/{post_id}/comments", "/api/blog_posts/{post_id}/detail"])
+@pytest.mark.parametrize("kind", ["expired", "revoked"])
+def test_public_reads_ignore_rejected_tokens(client, data, rejected_tokens, path, kind):
+    path = path.format(post_id=data["posts"][0])
+    anonymous = client.get(path)
+    response = client.get(path, headers={"Authorization": f"Bearer {rejected_tokens[kind]}"})
+    assert response.status_code == 200
+    assert response.get_json() == anonymous.get_json()
@@ -0,0 +1,24 @@
+"""
+Keyset cursors that were not issued by the API are refused with 400.
+"""
+import pytest
+from api.utils import encode_cursor
+
+BAD_CURSORS = [
+    encode_cursor("2024-05-01T00:00:00", {"a": 1}),
+    encode_cursor("2024-05-01T00:00:00", "12"),
+    encode_cursor("2024-05-01T00:00:00", True),
+    encode_cursor({"a": 1}, 12),
+    "not a cursor",
+]
+
+
+@pytest.mark.parametrize("cursor", BAD_CURSORS)
+def test_feed_refuses_bad_cursors(client, data, cursor):
+    assert client.get("/api/blog_posts", query_string={"cursor": cursor}).status_code == 400
+
+
+@pytest.mark.parametrize("cursor", BAD_CURSORS)
+def test_comments_refuse_bad_cursors(client, data, cursor):
+    response = client.get(f"/api/blog_posts/{data['posts'][0]}/comments", query_string={"cursor": cursor})
+    assert response.status_code == 400
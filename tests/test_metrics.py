@@ -0,0 +1,14 @@
+"""
+GET /api/metrics shows the app's internals, so it is off unless METRICS_ENABLED=1.
+"""
+
+
+def test_metrics_off_by_default(client):
+    assert client.get("/api/metrics").status_code == 404
+
+
+def test_metrics_enabled(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_ENABLED", True)
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert "response_cache" in response.get_json()
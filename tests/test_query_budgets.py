@@ -0,0 +1,74 @@
+"""
+The read and write routes stay within the @query_budget they declare.
+
+The suite runs with SQL_QUERY_BUDGET_STRICT=1, so a route going over its budget raises
+QueryBudgetExceeded and fails the test by itself. The counts are also compared here, so the
+failure names the route. The user cache is emptied before each request: the budgets allow for
+the lookup a token costs when its user is not cached (see api/auth.py).
+"""
+import pytest
+from api.auth import authentication
+
+
+def request_counted(app, client, method, path, token=None, **kwargs):
+    authentication.users.clear()
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    response = client.open(path, method=method, headers=headers, **kwargs)
+    endpoint, _ = app.url_map.bind("localhost").match(path.split("?")[0], method=method)
+    return response, int(response.headers["X-Query-Count"]), app.view_functions[endpoint].query_budget
+
+
+def assert_within_budget(app, client, method, path, token=None, status=200, **kwargs):
+    response, queries, budget = request_counted(app, client, method, path, token, **kwargs)
+    assert response.status_code == status, response.get_data(as_text=True)
+    assert queries <= budget, f"{method} {path} ran {queries} queries, its budget is {budget}"
+    return response
+
+
+@pytest.mark.parametrize("query", ["", "?sort=hot", "?sort=top", "?fields=summary&limit=5"])
+def test_feed(app, client, data, query):
+    response = assert_within_budget(app, client, "GET", f"/api/blog_posts{query}")
+    cursor = response.get_json()["next_cursor"]
+    if cursor:
+        separator = "&" if query else "?"
+        assert_within_budget(app, client, "GET", f"/api/blog_posts{query}{separator}cursor={cursor}")
+
+
+def test_post(app, client, data):
+    assert_within_budget(app, client, "GET", f"/api/blog_posts/{data['posts'][0]}")
+
+
+@pytest.mark.parametrize("authenticated", [False, True])
+def test_post_detail(app, client, data, token_for, authenticated):
+    token = token_for(data["users"][0]) if authenticated else None
+    assert_within_budget(app, client, "GET", f"/api/blog_posts/{data['posts'][0]}/detail", token)
+
+
+@pytest.mark.parametrize("sort", ["old", "new", "top"])
+@pytest.mark.parametrize("authenticated", [False, True])
+def test_comments(app, client, data, token_for, sort, authenticated):
+    token = token_for(data["users"][0]) if authenticated else None
+    assert_within_budget(app, client, "GET", f"/api/blog_posts/{data['posts'][0]}/comments?sort={sort}&limit=5", token)
+
+
+def test_like_post(app, client, data, token_for):
+    token = token_for(data["users"][1])
+    path = f"/api/blog_posts/{data['posts'][1]}/like"
+    # Adding, switching and removing the reaction take different paths through the toggle
+    for is_like in (True, False, False):
+        assert_within_budget(app, client, "POST", path, token, json={"is_like": is_like})
+
+
+def test_like_comment(app, client, data, token_for):
+    token = token_for(data["users"][1])
+    path = f"/api/comments/{data['comments'][0]}/like"
+    for is_like in (True, False, False):
+        assert_within_budget(app, client, "POST", path, token, json={"is_like": is_like})
+
+
+def test_add_comment(app, client, data, token_for):
+    token = token_for(data["users"][2])
+    assert_within_budget(
+        app, client, "POST", f"/api/blog_posts/{data['posts'][2]}/comments", token,
+        status=201, json={"content": "Within budget"},
+    )
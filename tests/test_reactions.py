@@ -0,0 +1,132 @@
+"""
+Like toggles keep the posts' counters equal to their like rows, even when they race.
+"""
+import random
+import threading
+import pytest
+from api.models import db, BlogPost, PostLike
+from api.write_behind import reaction_buffer, MemoryBuffer
+
+THREADS = 8
+TOGGLES = 25
+
+
+def counters(app, post_id):
+    """({"likes_count": stored, ...}, {"likes_count": counted from the like rows, ...})"""
+    with app.app_context():
+        post = db.session.get(BlogPost, post_id)
+        rows = dict(
+            db.session.query(PostLike.is_like, db.func.count())
+            .filter(PostLike.post_id == post_id).group_by(PostLike.is_like).all()
+        )
+        stored = {"likes_count": post.likes_count, "dislikes_count": post.dislikes_count}
+        counted = {"likes_count": rows.get(True, 0), "dislikes_count": rows.get(False, 0)}
+        return stored, counted
+
+
+def test_toggle_sequence(app, client, data, token_for):
+    post_id, user_id = data["posts"][-2], data["users"][3]
+    headers = {"Authorization": f"Bearer {token_for(user_id)}"}
+    with app.app_context():
+        seeded = db.session.query(PostLike.is_like).filter_by(post_id=post_id, user_id=user_id).scalar()
+    if seeded is not None:
+        # The same value again removes the seeded reaction
+        client.post(f"/api/blog_posts/{post_id}/like", json={"is_like": seeded}, headers=headers)
+    before, _ = counters(app, post_id)
+    # none -> like -> dislike -> none
+    for is_like, likes, dislikes in ((True, 1, 0), (False, 0, 1), (False, 0, 0)):
+        response = client.post(f"/api/blog_posts/{post_id}/like", json={"is_like": is_like}, headers=headers)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        stored, counted = counters(app, post_id)
+        assert stored == counted
+        assert stored == {
+            "likes_count": before["likes_count"] + likes,
+            "dislikes_count": before["dislikes_count"] + dislikes,
+        }
+
+
+def test_concurrent_toggles_keep_counters_exact(app, data, token_for):
+    post_id = data["posts"][-1]
+    # Few users, so the same user's toggles race each other as well as the counter updates
+    headers = [{"Authorization": f"Bearer {token_for(user_id)}"} for user_id in data["users"][:3]]
+    barrier = threading.Barrier(THREADS)
+    statuses, errors = [], []
+
+    def toggle(index):
+        rng = random.Random(index)
+        client = app.test_client()
+        barrier.wait()
+        try:
+            for _ in range(TOGGLES):
+                response = client.post(
+                    f"/api/blog_posts/{post_id}/like", json={"is_like": rng.random() < 0.5}, headers=rng.choice(headers)
+                )
+                statuses.append(response.status_code)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=toggle, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert statuses == [200] * (THREADS * TOGGLES)
+    stored, counted = counters(app, post_id)
+    assert stored == counted
+
+
+def test_batch_rejects_booleans_as_ids(client, data, token_for):
+    headers = {"Authorization": f"Bearer {token_for(data['users'][4])}"}
+    response = client.post("/api/reactions/batch", headers=headers, json={
+        "reactions": [{"type": "post", "id": True, "is_like": True}, {"type": "post", "id": data["posts"][0], "is_like": 1}],
+        "comments": [{"post_id": True, "content": "Not on post 1"}],
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [result["status"] for result in body["reactions"]] == ["invalid", "invalid"]
+    assert [result["status"] for result in body["comments"]] == ["invalid"]
+
+
+@pytest.mark.parametrize("buffered", [False, True])
+def test_like_missing_post(client, data, token_for, monkeypatch, buffered):
+    if buffered:
+        monkeypatch.setattr(reaction_buffer, "buffer", MemoryBuffer())
+    headers = {"Authorization": f"Bearer {token_for(data['users'][0])}"}
+    response = client.post(f"/api/blog_posts/{data['posts'][-1] + 1000}/like", json={"is_like": True}, headers=headers)
+    assert response.status_code == 404
+    if buffered:
+        assert reaction_buffer.buffer.size() == 0
+
+
+def test_batch_rejects_bodies_and_items_that_are_not_objects(client, data, token_for):
+    headers = {"Authorization": f"Bearer {token_for(data['users'][4])}"}
+    response = client.post("/api/reactions/batch", headers=headers, json=[{"type": "post"}])
+    assert response.status_code == 400
+    response = client.post("/api/reactions/batch", headers=headers, json={"reactions": [1, "post"], "comments": [None]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [result["status"] for result in body["reactions"]] == ["invalid", "invalid"]
+    assert [result["status"] for result in body["comments"]] == ["invalid"]
+
+
+def test_flush_keeps_committed_toggles_when_invalidation_fails(app, client, data, token_for, monkeypatch):
+    from api.cache import response_cache
+    monkeypatch.setattr(reaction_buffer, "buffer", MemoryBuffer())
+    post_id, user_id = data["posts"][-3], data["users"][2]
+    headers = {"Authorization": f"Bearer {token_for(user_id)}"}
+    with app.app_context():
+        seeded = db.session.query(PostLike.is_like).filter_by(post_id=post_id, user_id=user_id).scalar()
+    is_like = not seeded if seeded is not None else True
+    response = client.post(f"/api/blog_posts/{post_id}/like", json={"is_like": is_like}, headers=headers)
+    assert response.status_code == 202
+
+    def unreachable(*namespaces):
+        raise ConnectionError("cache unreachable")
+    monkeypatch.setattr(response_cache, "invalidate", unreachable)
+    assert reaction_buffer.flush() == 1
+    # Nothing is put back to be applied a second time
+    assert reaction_buffer.buffer.size() == 0
+    with app.app_context():
+        assert db.session.query(PostLike.is_like).filter_by(post_id=post_id, user_id=user_id).scalar() is is_like
@@ -4,7 +4,10 @@ const Dotenv = require('dotenv-webpack');
 module.exports = merge(common, {
     mode: 'production',
     output: {
-        publicPath: '/'
+        publicPath: '/',
+        // Content hashed names let src/api/static_files.py cache the bundle for a year
+        filename: 'bundle.[contenthash].js',
+        clean: true
     },
     plugins: [
         new Dotenv({